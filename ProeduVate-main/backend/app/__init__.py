@@ -1,5 +1,6 @@
 # lms_portal_backend/app/__init__.py
-from flask import Flask, send_from_directory, jsonify
+from flask import Flask, jsonify
+from werkzeug.utils import secure_filename
 from flask_cors import CORS
 import os
 
@@ -10,6 +11,14 @@ def create_app():
         template_folder=os.path.join(backend_root, 'templates'),
         static_folder=os.path.join(backend_root, 'static')
     )
+
+    # jsonify encodes ObjectId/datetime directly (orjson when installed)
+    from .serialization import BSONJSONProvider
+    app.json = BSONJSONProvider(app)
+
+    # Per-route latency, Mongo query counts and /metrics
+    from .instrumentation import init_app as init_instrumentation
+    init_instrumentation(app)
     
     # Configure CORS to allow requests from localhost and Netlify
     CORS(app, 
@@ -21,7 +30,8 @@ def create_app():
                  "https://*.netlify.app"
              ],
              "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-             "allow_headers": ["Content-Type", "Authorization"],
+             "allow_headers": ["Content-Type", "Authorization", "Content-Range", "Idempotency-Key"],
+             "expose_headers": ["Idempotent-Replayed"],
              "supports_credentials": True
          }})
 
@@ -29,6 +39,11 @@ def create_app():
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+    # Reject oversized bodies before they are read; per-type caps are checked while streaming
+    from .services.upload_service import MAX_REQUEST_BYTES, init_app as init_uploads
+    app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+    init_uploads(app)
+
     # blueprints
     from .routes.admin_routes import admin_bp
     from .routes.teacher_routes import teacher_bp
@@ -50,9 +65,33 @@ def create_app():
     app.register_blueprint(aptitude_bp)
     app.register_blueprint(gd_bp)
 
+    # Verify the bearer token once per request; claims are cached until expiry
+    from .auth import load_request_claims
+    app.before_request(load_request_claims)
+
+    # Content-hash ETags, fingerprinted /static URLs, optional X-Accel-Redirect/X-Sendfile
+    from .file_serving import init_app as init_file_serving
+    init_file_serving(app)
+
+    # Route-scoped sampling for /api/admin/profile (no-op unless PROFILER_ENABLED)
+    from .profiling import init_app as init_profiling
+    init_profiling(app)
+
+    # Downloads go through storage_service: files on local disk are sent from here,
+    # files in a bucket are redirected to a presigned URL
     @app.route('/resumes/<filename>')
     def uploaded_file(filename):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        from .services.storage_service import send_stored
+        return send_stored(f"resumes/{secure_filename(filename)}")
+
+    @app.route('/files/<sha256>/<path:filename>')
+    def stored_file(sha256, filename):
+        """Serve a content-addressed upload under its original filename"""
+        from .services.storage_service import send_stored
+        from .services.upload_service import object_key
+        if len(sha256) != 64 or not all(c in '0123456789abcdef' for c in sha256):
+            return jsonify({"error": "File not found"}), 404
+        return send_stored(object_key(sha256), filename, sha256=sha256)
 
     @app.route('/health')
     def health_check():
@@ -60,7 +99,22 @@ def create_app():
     
     @app.route('/api/health')
     def api_health_check():
-        return jsonify({"status": "ok", "message": "API is running"}), 200
+        from .database import ping_database, pool_metrics
+        db_ok, latency_ms, error = ping_database()
+        body = {
+            "status": "ok" if db_ok else "degraded",
+            "message": "API is running",
+            "database": {
+                "ok": db_ok,
+                "latency_ms": latency_ms,
+                "pool": pool_metrics.snapshot()
+            }
+        }
+        if error:
+            # The driver's message can name hosts and replica sets: log it, don't return it
+            print(f"Health check: database ping failed: {error}")
+            body["database"]["error"] = "Database unavailable"
+        return jsonify(body), 200 if db_ok else 503
 
     return app
 
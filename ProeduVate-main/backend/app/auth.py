@@ -0,0 +1,114 @@
+# lms_portal_backend/app/auth.py
+
+import hashlib
+import os
+import time
+from functools import wraps
+
+import jwt
+from bson import ObjectId
+from flask import g, jsonify, request
+
+from .cache import LRUCache
+from .database import users_collection
+
+# Secret key for JWT (should be in environment variable in production)
+JWT_SECRET = os.getenv('JWT_SECRET', 'your-secret-key-change-in-production')
+JWT_ALGORITHM = 'HS256'
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 4096))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 4096))
+USER_CACHE_TTL_SECONDS = int(os.getenv('USER_CACHE_TTL_SECONDS', 60))
+
+# Fields never kept in the profile cache
+USER_CACHE_PROJECTION = {'password': 0, 'aptitude_history': 0}
+
+_token_cache = LRUCache(TOKEN_CACHE_SIZE)
+_user_cache = LRUCache(USER_CACHE_SIZE)
+
+def _token_key(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def verify_jwt_token(token):
+    """
+    Verify and decode a JWT token.
+    Decoded claims are memoized by token hash until the token's own expiry,
+    so repeated requests with the same token skip the HS256 verification.
+    """
+    if not token:
+        return None
+
+    key = _token_key(token)
+    payload = _token_cache.get(key)
+    if payload is not None:
+        return payload
+
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        return None
+    except jwt.InvalidTokenError:
+        return None
+
+    _token_cache.set(key, payload, payload.get('exp', time.time()))
+    return payload
+
+def get_request_token():
+    """Extract the bearer token from the Authorization header"""
+    return request.headers.get('Authorization', '').replace('Bearer ', '').strip()
+
+def load_request_claims():
+    """before_request hook: verify the token once and keep the claims on flask.g"""
+    token = get_request_token()
+    g.jwt_claims = verify_jwt_token(token) if token else None
+
+def get_current_claims():
+    """Claims of the token sent with the current request, or None"""
+    if 'jwt_claims' not in g:
+        load_request_claims()
+    return g.jwt_claims
+
+def get_cached_user(user_id):
+    """
+    Fetch a user profile (without password) through a short-TTL cache.
+    The cache is per process, so other workers may serve a stale profile
+    for up to USER_CACHE_TTL_SECONDS after an update.
+    """
+    user_id = str(user_id)
+    user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    try:
+        user = users_collection.find_one({'_id': ObjectId(user_id)}, USER_CACHE_PROJECTION)
+    except Exception:
+        return None
+
+    if user:
+        _user_cache.set(user_id, user, time.time() + USER_CACHE_TTL_SECONDS)
+    return user
+
+def get_current_user():
+    """Profile of the authenticated user for the current request, or None"""
+    claims = get_current_claims()
+    if not claims:
+        return None
+    return get_cached_user(claims['user_id'])
+
+def invalidate_user_cache(user_id):
+    """Drop a cached profile after the user document changes"""
+    _user_cache.delete(str(user_id))
+
+def login_required(*roles):
+    """Reject requests without a valid token (or with a role outside roles, if given)"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            claims = get_current_claims()
+            if not claims:
+                return jsonify({'success': False, 'message': 'Invalid or expired token'}), 401
+            if roles and claims.get('role') not in roles:
+                return jsonify({'success': False, 'message': 'Forbidden'}), 403
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
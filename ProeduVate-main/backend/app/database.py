@@ -1,8 +1,12 @@
 # lms_portal_backend/app/database.py
 
 import os
-from pymongo import MongoClient
+import threading
+import time
+from pymongo import MongoClient, monitoring
+from pymongo.errors import ConnectionFailure
 from dotenv import load_dotenv
+from .instrumentation import command_metrics
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,28 +17,280 @@ MONGO_URI = os.getenv("MONGO_URI")
 if not MONGO_URI:
     raise ValueError("No MONGO_URI found in environment variables. Please create a .env file.")
 
-try:
-    # Initialize the MongoDB client
-    client = MongoClient(MONGO_URI)
-    
-    # Get the database instance
-    db = client['lms_portal']
-    
-    # Test the connection
-    client.admin.command('ping')
-    print("Connected to MongoDB Atlas successfully")
-    
-except Exception as e:
-    print(f"MongoDB connection failed: {e}")
-    raise
+DATABASE_NAME = 'lms_portal'
+
+# Pool sizing. Each worker process gets its own pool, so the cluster sees up to
+# (gunicorn workers x MONGO_MAX_POOL_SIZE) connections. Request threads hold at most
+# one connection at a time; the extra headroom covers background jobs.
+WORKER_THREADS = int(os.getenv('GUNICORN_THREADS', os.getenv('WEB_THREADS', 1)))
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', WORKER_THREADS + 4))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', min(WORKER_THREADS, MONGO_MAX_POOL_SIZE)))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 300000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+INDEX_RETRY_SECONDS = int(os.getenv('INDEX_RETRY_SECONDS', 60))  # wait before retrying a failed index build
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Counts connection checkouts and the time requests spend waiting for one"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+            self.connections_created = 0
+            self.connections_closed = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+                "connections_created": self.connections_created,
+                "connections_closed": self.connections_closed,
+                "max_pool_size": MONGO_MAX_POOL_SIZE,
+                "min_pool_size": MONGO_MIN_POOL_SIZE
+            }
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait_ms = (time.perf_counter() - getattr(self._local, 'started', time.perf_counter())) * 1000
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+pool_metrics = PoolMetricsListener()
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Create the MongoDB client on first use in each process.
+    Nothing connects at import time, so app start-up never waits on Atlas, and a
+    client inherited across a fork (e.g. gunicorn --preload) is replaced, since
+    MongoClient is not fork-safe.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = MongoClient(
+                    MONGO_URI,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    event_listeners=[pool_metrics, command_metrics]
+                )
+                _client_pid = os.getpid()
+    return _client
+
+def reset_client():
+    """Forget the current client (called from gunicorn's post_fork hook)"""
+    global _client, _client_pid
+    with _client_lock:
+        _client = None
+        _client_pid = None
+    pool_metrics.reset()
+
+def ping_database():
+    """
+    Ping the cluster for health checks.
+
+    Returns:
+        (ok, latency_ms, error_message)
+    """
+    start = time.perf_counter()
+    try:
+        get_client().admin.command('ping')
+        return True, round((time.perf_counter() - start) * 1000, 2), None
+    except Exception as e:
+        return False, round((time.perf_counter() - start) * 1000, 2), str(e)
+
+# Index specs per collection: (keys, options). Created at startup or on first use, see ensure_indexes.
+INDEXES = {
+    'aptitude_tests': [
+        ([('expires_at', 1)], {'expireAfterSeconds': 0}),
+    ],
+    'aptitude_questions': [
+        ([('topic', 1), ('rating', 1)], {}),
+    ],
+    'submissions': [
+        ([('student_id', 1), ('type', 1), ('submitted_at', -1)], {}),
+        # One submission per student and assignment (aptitude submissions have no assignment_id).
+        # Existing duplicates block it: run migrations/dedupe_submissions.py first.
+        ([('assignment_id', 1), ('student_id', 1)],
+         {'unique': True, 'partialFilterExpression': {'assignment_id': {'$exists': True}}}),
+    ],
+    'upload_sessions': [
+        ([('expires_at', 1)], {'expireAfterSeconds': 0}),
+    ],
+    'generated_quizzes': [
+        ([('expires_at', 1)], {'expireAfterSeconds': 0}),
+    ],
+    'quiz_jobs': [
+        ([('expires_at', 1)], {'expireAfterSeconds': 0}),
+        ([('key', 1), ('status', 1)], {}),
+    ],
+    'interview_sessions': [
+        ([('expires_at', 1)], {'expireAfterSeconds': 0}),
+    ],
+    'interview_question_pools': [
+        ([('expires_at', 1)], {'expireAfterSeconds': 0}),
+    ],
+}
+
+_indexes_ready = False
+_indexes_retry_at = 0
+_indexes_lock = threading.Lock()
+
+def ensure_indexes(db):
+    """
+    Create the indexes in INDEXES (idempotent) and return True once they all exist.
+    Indexes live on the server, so after one success no process builds them again;
+    gunicorn does it in the master at startup (gunicorn.conf.py). Failures are logged
+    and retried after INDEX_RETRY_SECONDS. Only one thread builds at a time: the others
+    carry on without waiting.
+    """
+    global _indexes_ready, _indexes_retry_at
+    if _indexes_ready:
+        return True
+    if not _indexes_lock.acquire(blocking=False):
+        return False
+    try:
+        if _indexes_ready:
+            return True
+        failed = False
+        for collection, keys, options in [(c, k, o) for c, specs in INDEXES.items() for k, o in specs]:
+            try:
+                db[collection].create_index(keys, **options)
+            except ConnectionFailure as e:
+                print(f"Warning: could not create indexes, MongoDB is unreachable: {e}")
+                failed = True
+                break
+            except Exception as e:
+                print(f"Warning: could not create index {keys} on {collection}: {e}")
+                failed = True
+        if failed:
+            _indexes_retry_at = time.time() + INDEX_RETRY_SECONDS
+            return False
+        _indexes_ready = True
+        return True
+    finally:
+        _indexes_lock.release()
+
+_unique_indexes_verified = set()
+
+def missing_unique_indexes(collection):
+    """
+    Keys of the unique indexes INDEXES lists for collection that don't exist.
+    Once all are found that's remembered for the process, so a healthy
+    deployment checks once; a missing index is looked up again on every call.
+    """
+    if (os.getpid(), collection) in _unique_indexes_verified:
+        return []
+    existing = [
+        [(field, int(direction)) for field, direction in info['key']]
+        for info in get_db()[collection].index_information().values()
+        if info.get('unique')
+    ]
+    missing = [keys for keys, options in INDEXES.get(collection, []) if options.get('unique') and keys not in existing]
+    if not missing:
+        _unique_indexes_verified.add((os.getpid(), collection))
+    return missing
+
+def get_db():
+    """Get the database instance"""
+    db = get_client()[DATABASE_NAME]
+    if not _indexes_ready and time.time() >= _indexes_retry_at:
+        ensure_indexes(db)
+    return db
+
+class LazyCollection:
+    """
+    Stand-in for a pymongo Collection that resolves it on first attribute access.
+    Lets routes keep `from ..database import users_collection` without touching the network.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self._name], attr)
+
+    def __repr__(self):
+        return f"LazyCollection({self._name!r})"
 
 # Create collections
-users_collection = db.users
-assignments_collection = db.assignments
-submissions_collection = db.submissions
-teacher_assignments_collection = db.teacher_assignments  # For teacher-created assignments
+users_collection = LazyCollection('users')
+assignments_collection = LazyCollection('assignments')
+submissions_collection = LazyCollection('submissions')
+teacher_assignments_collection = LazyCollection('teacher_assignments')  # For teacher-created assignments
+
+aptitude_tests_collection = LazyCollection('aptitude_tests')  # Generated tests (question ids), expire via TTL
+aptitude_questions_collection = LazyCollection('aptitude_questions')  # Question bank incl. answer keys
+aptitude_stats_collection = LazyCollection('aptitude_stats')  # Per-student totals, updated on submit
+aptitude_mastery_collection = LazyCollection('aptitude_mastery')  # Per-student, per-topic ability ratings
+
+upload_sessions_collection = LazyCollection('upload_sessions')  # Resumable uploads in progress, expire via TTL
+cache_versions_collection = LazyCollection('cache_versions')  # Version stamps that tell workers to drop cached data
+generated_quizzes_collection = LazyCollection('generated_quizzes')  # AI quizzes keyed by normalized request, reusable
+quiz_jobs_collection = LazyCollection('quiz_jobs')  # Background quiz generation requests
+interview_sessions_collection = LazyCollection('interview_sessions')  # Mock interviews: questions, answers, per-answer evaluations
+interview_question_pools_collection = LazyCollection('interview_question_pools')  # Questions per (resume profile, difficulty)
 
 # GD (Group Discussion) collections
-gd_rounds_collection = db.gd_rounds  # Stores scheduled GD rounds
-gd_results_collection = db.gd_results  # Stores GD results and evaluations
-gd_notifications_collection = db.gd_notifications  # Stores GD notifications for students
\ No newline at end of file
+gd_rounds_collection = LazyCollection('gd_rounds')  # Stores scheduled GD rounds
+gd_results_collection = LazyCollection('gd_results')  # Stores GD results and evaluations
+gd_notifications_collection = LazyCollection('gd_notifications')  # Stores GD notifications for students
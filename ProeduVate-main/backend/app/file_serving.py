@@ -0,0 +1,150 @@
+# lms_portal_backend/app/file_serving.py
+#
+# Sending files from local disk: strong ETags from content hashes, Cache-Control
+# per kind of file, Range requests, and optionally handing the bytes off to the
+# reverse proxy.
+#
+# FILE_SERVING_MODE:
+#   app         Flask streams the file (default; handles Range and If-None-Match itself)
+#   x-sendfile  Apache mod_xsendfile / lighttpd: the proxy reads the X-Sendfile path
+#   x-accel     nginx: X-Accel-Redirect to FILE_ACCEL_PREFIX + the path under the
+#               served folder, with an internal location such as
+#                   location /protected-files/ { internal; alias /srv/proeduvate/backend/; }
+#               (FILE_ACCEL_ROOT is the folder the alias points at; default: backend/)
+# In the proxy modes the app still answers If-None-Match with 304 before handing off.
+
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
+from flask import request, send_file, current_app, jsonify, make_response
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FILE_SERVING_MODE = os.getenv('FILE_SERVING_MODE', 'app').lower()
+FILE_ACCEL_PREFIX = os.getenv('FILE_ACCEL_PREFIX', '/protected-files').rstrip('/')
+FILE_ACCEL_ROOT = os.path.abspath(os.getenv('FILE_ACCEL_ROOT', BACKEND_ROOT))
+
+# Content-addressed uploads and fingerprinted static URLs never change
+IMMUTABLE_CACHE = 'max-age=31536000, immutable'
+# Everything else may be replaced in place (e.g. a re-uploaded resume): revalidate via ETag
+REVALIDATE_CACHE = 'no-cache'
+
+HASH_CACHE_SIZE = int(os.getenv('FILE_HASH_CACHE_SIZE', 4096))
+FINGERPRINT_LENGTH = 12
+
+class HashCache:
+    """SHA-256 per file path, recomputed only when the file's mtime or size changes"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # path -> (mtime_ns, size, sha256)
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                self._entries.move_to_end(path)
+                return entry[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+
+        with self._lock:
+            self._entries[path] = (stat.st_mtime_ns, stat.st_size, sha256)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return sha256
+
+file_hashes = HashCache(HASH_CACHE_SIZE)
+
+def _proxy_header(path):
+    """(header, value) handing this file to the proxy, or None to send it from the app"""
+    if FILE_SERVING_MODE == 'x-sendfile':
+        return 'X-Sendfile', path
+    if FILE_SERVING_MODE == 'x-accel':
+        relative = os.path.relpath(path, FILE_ACCEL_ROOT)
+        if relative.startswith('..'):
+            print(f"Warning: {path} is outside FILE_ACCEL_ROOT; sending it from the app")
+            return None
+        return 'X-Accel-Redirect', quote(f"{FILE_ACCEL_PREFIX}/{relative.replace(os.sep, '/')}")
+    return None
+
+def _proxy_response(header, download_name, mimetype, etag):
+    """Empty response telling the proxy which file to send"""
+    response = make_response('')
+    response.headers[header[0]] = header[1]
+    response.headers['Content-Disposition'] = f"inline; filename*=UTF-8''{quote(download_name)}"
+    if mimetype:
+        response.mimetype = mimetype
+    response.set_etag(etag)
+    return response
+
+def send_path(path, download_name=None, etag=None, immutable=False, public=False):
+    """
+    Send a local file with a strong content-hash ETag and Cache-Control.
+
+    Args:
+        etag: content hash if the caller already knows it (content-addressed files)
+        immutable: the URL always names the same bytes, so clients may cache for a year
+        public: shared caches may store it too (static assets), otherwise private
+    """
+    if not os.path.isfile(path):
+        return jsonify({"error": "File not found"}), 404
+    download_name = download_name or os.path.basename(path)
+    etag = etag or file_hashes.get(path)
+
+    header = _proxy_header(path)
+    if header:
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+            response.set_etag(etag)
+        else:
+            response = _proxy_response(header, download_name, mimetypes.guess_type(download_name)[0], etag)
+    else:
+        # conditional=True: If-None-Match/If-Modified-Since -> 304, Range/If-Range -> 206
+        response = send_file(path, download_name=download_name, etag=etag, conditional=True,
+                             last_modified=os.path.getmtime(path))
+
+    response.headers['Cache-Control'] = (
+        f"{'public' if public else 'private'}, {IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE}"
+    )
+    return response
+
+# --- Static assets ----------------------------------------------------------
+
+def static_url(filename):
+    """
+    URL for a file in the static folder, fingerprinted with its content hash
+    (/static/logo.png?v=3f9a0c...), so it can be cached as immutable and still
+    change on deploy. Available in templates as {{ static_url('logo.png') }}.
+    """
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        return f"/static/{quote(filename)}?v={file_hashes.get(path)[:FINGERPRINT_LENGTH]}"
+    except OSError:
+        return f"/static/{quote(filename)}"
+
+def serve_static(filename):
+    """Static files: immutable when requested through a current fingerprint, revalidated otherwise"""
+    from werkzeug.security import safe_join
+    path = safe_join(current_app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return jsonify({"error": "File not found"}), 404
+    sha256 = file_hashes.get(path)
+    fingerprinted = request.args.get('v') == sha256[:FINGERPRINT_LENGTH]
+    return send_path(path, etag=sha256, immutable=fingerprinted, public=True)
+
+def init_app(app):
+    """Serve /static through serve_static and expose static_url() to templates"""
+    app.view_functions['static'] = serve_static
+    app.jinja_env.globals['static_url'] = static_url
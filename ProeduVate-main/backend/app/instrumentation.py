@@ -0,0 +1,260 @@
+# lms_portal_backend/app/instrumentation.py
+
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from pymongo import monitoring
+
+# Requests slower than this, or issuing more queries than N_PLUS_ONE_QUERIES, are logged
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 1000))
+N_PLUS_ONE_QUERIES = int(os.getenv('N_PLUS_ONE_QUERIES', 20))
+SLOW_REQUEST_TOP_QUERIES = 3
+
+# Histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+class Registry:
+    """Thread-safe store of every metric this process exposes on /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_latency = {}    # (method, route, status) -> Histogram
+        self.request_db_queries = {}  # (method, route) -> Histogram of queries per request
+        self.db_commands = {}        # (collection, command) -> [count, seconds, errors]
+        self.external_latency = {}   # (kind, name) -> Histogram
+        self.external_calls = {}     # (kind, name) -> [calls, errors, tokens]
+
+    def observe_request(self, method, route, status, seconds, queries):
+        with self._lock:
+            self.request_latency.setdefault((method, route, str(status)), Histogram()).observe(seconds)
+            self.request_db_queries.setdefault(
+                (method, route), Histogram(buckets=(0, 1, 2, 5, 10, 20, 50, 100, 500))
+            ).observe(queries)
+
+    def observe_db_command(self, collection, command, seconds, failed):
+        with self._lock:
+            stats = self.db_commands.setdefault((collection, command), [0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += seconds
+            if failed:
+                stats[2] += 1
+
+    def observe_external_call(self, kind, name, seconds, tokens, failed):
+        with self._lock:
+            self.external_latency.setdefault((kind, name), Histogram()).observe(seconds)
+            stats = self.external_calls.setdefault((kind, name), [0, 0, 0])
+            stats[0] += 1
+            if failed:
+                stats[1] += 1
+            stats[2] += tokens or 0
+
+registry = Registry()
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Counts Mongo commands and their time, globally and for the current request"""
+
+    def __init__(self):
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ''
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = collection
+
+        if has_request_context() and 'db_queries' in g:
+            g.db_queries += 1
+            g.db_query_shapes[(collection, event.command_name)] += 1
+
+    def _finished(self, event, failed):
+        with self._lock:
+            collection = self._started.pop((event.connection_id, event.request_id), '')
+        seconds = event.duration_micros / 1e6
+        registry.observe_db_command(collection, event.command_name, seconds, failed)
+
+        if has_request_context() and 'db_time' in g:
+            g.db_time += seconds
+
+    def succeeded(self, event):
+        self._finished(event, False)
+
+    def failed(self, event):
+        self._finished(event, True)
+
+command_metrics = CommandMetricsListener()
+
+class CallRecord:
+    """Handle yielded by track_call so callers can attach token usage"""
+
+    def __init__(self):
+        self.tokens = 0
+
+@contextmanager
+def track_call(kind, name):
+    """
+    Time an outbound LLM / Lambda call and count its errors and tokens.
+
+    Usage:
+        with track_call('llm', 'gemini') as call:
+            response = model.generate_content(prompt)
+            call.tokens = ...
+    """
+    record = CallRecord()
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield record
+    except Exception:
+        failed = True
+        raise
+    finally:
+        registry.observe_external_call(kind, name, time.perf_counter() - start, record.tokens, failed)
+
+def mark_call_failed(kind, name):
+    """Count an error for calls that report failure without raising"""
+    with registry._lock:
+        stats = registry.external_calls.setdefault((kind, name), [0, 0, 0])
+        stats[1] += 1
+
+def start_request_timer():
+    """before_request hook"""
+    g.request_start = time.perf_counter()
+    g.db_queries = 0
+    g.db_time = 0.0
+    g.db_query_shapes = Counter()
+
+def record_request(response):
+    """after_request hook: per-route latency histogram and the slow / N+1 request log"""
+    start = g.get('request_start')
+    if start is None:
+        return response
+
+    seconds = time.perf_counter() - start
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    queries = g.get('db_queries', 0)
+    registry.observe_request(request.method, route, response.status_code, seconds, queries)
+
+    if seconds * 1000 >= SLOW_REQUEST_MS or queries >= N_PLUS_ONE_QUERIES:
+        top = ", ".join(
+            f"{command} {collection} x{count}"
+            for (collection, command), count in g.db_query_shapes.most_common(SLOW_REQUEST_TOP_QUERIES)
+        )
+        print(f"[SLOW] {request.method} {route} {seconds * 1000:.0f} ms, "
+              f"{queries} queries ({g.db_time * 1000:.0f} ms in Mongo); top: {top or 'none'}")
+
+    return response
+
+def _labels(**labels):
+    return "{" + ",".join(
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in labels.items()
+    ) + "}"
+
+def _render_histogram(lines, metric, histogram, **labels):
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        lines.append(f"{metric}_bucket{_labels(**labels, le=bound)} {count}")
+    lines.append(f"{metric}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+    lines.append(f"{metric}_sum{_labels(**labels)} {histogram.sum}")
+    lines.append(f"{metric}_count{_labels(**labels)} {histogram.count}")
+
+def render_prometheus():
+    """Everything this worker has recorded, in Prometheus text exposition format"""
+    from .database import pool_metrics
+    from .services.prompt_builder import get_prompt_metrics
+    from .services.structured_output import get_parse_metrics
+
+    lines = []
+    with registry._lock:
+        lines.append("# HELP http_request_duration_seconds Request latency per route")
+        lines.append("# TYPE http_request_duration_seconds histogram")
+        for (method, route, status), histogram in sorted(registry.request_latency.items()):
+            _render_histogram(lines, "http_request_duration_seconds", histogram,
+                              method=method, route=route, status=status)
+
+        lines.append("# HELP http_request_db_queries Mongo commands issued per request")
+        lines.append("# TYPE http_request_db_queries histogram")
+        for (method, route), histogram in sorted(registry.request_db_queries.items()):
+            _render_histogram(lines, "http_request_db_queries", histogram, method=method, route=route)
+
+        lines.append("# HELP mongo_commands_total Mongo commands by collection and command")
+        lines.append("# TYPE mongo_commands_total counter")
+        for (collection, command), (count, _, _) in sorted(registry.db_commands.items()):
+            lines.append(f"mongo_commands_total{_labels(collection=collection, command=command)} {count}")
+        lines.append("# TYPE mongo_command_seconds_total counter")
+        for (collection, command), (_, seconds, _) in sorted(registry.db_commands.items()):
+            lines.append(f"mongo_command_seconds_total{_labels(collection=collection, command=command)} {seconds}")
+        lines.append("# TYPE mongo_command_errors_total counter")
+        for (collection, command), (_, _, errors) in sorted(registry.db_commands.items()):
+            lines.append(f"mongo_command_errors_total{_labels(collection=collection, command=command)} {errors}")
+
+        lines.append("# HELP external_call_duration_seconds Latency of LLM and Lambda calls")
+        lines.append("# TYPE external_call_duration_seconds histogram")
+        for (kind, name), histogram in sorted(registry.external_latency.items()):
+            _render_histogram(lines, "external_call_duration_seconds", histogram, kind=kind, name=name)
+        lines.append("# TYPE external_call_errors_total counter")
+        for (kind, name), (_, errors, _) in sorted(registry.external_calls.items()):
+            lines.append(f"external_call_errors_total{_labels(kind=kind, name=name)} {errors}")
+        lines.append("# TYPE external_call_tokens_total counter")
+        for (kind, name), (_, _, tokens) in sorted(registry.external_calls.items()):
+            lines.append(f"external_call_tokens_total{_labels(kind=kind, name=name)} {tokens}")
+
+    pool = pool_metrics.snapshot()
+    lines.append("# TYPE mongo_pool_checkouts_total counter")
+    lines.append(f"mongo_pool_checkouts_total {pool['checkouts']}")
+    lines.append("# TYPE mongo_pool_checkout_failures_total counter")
+    lines.append(f"mongo_pool_checkout_failures_total {pool['checkout_failures']}")
+    lines.append("# TYPE mongo_pool_checked_out gauge")
+    lines.append(f"mongo_pool_checked_out {pool['checked_out']}")
+    lines.append("# TYPE mongo_pool_max_wait_ms gauge")
+    lines.append(f"mongo_pool_max_wait_ms {pool['max_wait_ms']}")
+
+    prompts = get_prompt_metrics()
+    lines.append("# HELP llm_prompt_tokens_total Estimated prompt tokens per call site")
+    lines.append("# TYPE llm_prompt_tokens_total counter")
+    for call_site, stats in sorted(prompts.items()):
+        lines.append(f"llm_prompt_tokens_total{_labels(call_site=call_site)} {stats['total_tokens']}")
+    lines.append("# TYPE llm_prompts_total counter")
+    for call_site, stats in sorted(prompts.items()):
+        lines.append(f"llm_prompts_total{_labels(call_site=call_site)} {stats['calls']}")
+
+    lines.append("# HELP llm_json_parse_total JSON responses per call site by outcome (ok, repaired, reasked, failed)")
+    lines.append("# TYPE llm_json_parse_total counter")
+    for call_site, outcomes in sorted(get_parse_metrics().items()):
+        for outcome, count in outcomes.items():
+            lines.append(f"llm_json_parse_total{_labels(call_site=call_site, outcome=outcome)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+def init_app(app):
+    """Register the timing hooks and the /metrics endpoint"""
+    app.before_request(start_request_timer)
+    app.after_request(record_request)
+
+    @app.route('/metrics')
+    def metrics():
+        token = os.getenv('METRICS_TOKEN')
+        if token and request.headers.get('Authorization', '') != f"Bearer {token}":
+            return "Forbidden\n", 403, {'Content-Type': 'text/plain'}
+        return render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
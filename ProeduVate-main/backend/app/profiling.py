@@ -0,0 +1,172 @@
+# lms_portal_backend/app/profiling.py
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import request
+
+# Off unless explicitly enabled; when off no hooks are installed and the endpoints 404
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', '').lower() in ('1', 'true', 'yes')
+PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', 10))
+PROFILER_MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', 60))
+PROFILER_MAX_DEPTH = 128
+
+class ProfilerBusy(Exception):
+    pass
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _collapse(frame):
+    """Root-first 'a;b;c' stack for one thread, in the collapsed format flamegraph.pl reads"""
+    stack = []
+    while frame is not None and len(stack) < PROFILER_MAX_DEPTH:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+class SamplingProfiler:
+    """
+    Wall-clock sampler: a background thread reads sys._current_frames() every
+    interval and counts identical stacks. Nothing is traced, so the threads being
+    profiled pay no per-call overhead.
+
+    Either every thread is sampled for a fixed duration, or only threads that are
+    serving requests for one route, until a number of those requests complete.
+
+    Sessions are kept in this process's memory and are not shared: under several
+    gunicorn workers, arming a route session, polling it and reading the result can
+    each land on a different worker. Use route-scoped profiling with a single worker
+    (gunicorn -w 1); duration profiling returns its result in the same request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+
+    def busy(self):
+        return self._session is not None and not self._session['done'].is_set()
+
+    def _start(self, session):
+        with self._lock:
+            if self.busy():
+                raise ProfilerBusy("A profiling session is already running")
+            self._session = session
+        threading.Thread(target=self._sample, args=(session,), name='profiler', daemon=True).start()
+
+    def _new_session(self, mode, interval_ms, deadline, route=None, max_requests=None):
+        return {
+            'mode': mode,
+            'route': route,
+            'max_requests': max_requests,
+            'completed_requests': 0,
+            'threads': set(),
+            'interval': max(1.0, interval_ms) / 1000,
+            'started_at': time.time(),
+            'deadline': deadline,
+            'samples': 0,
+            'stacks': Counter(),
+            'done': threading.Event()
+        }
+
+    def _sample(self, session):
+        own_ident = threading.get_ident()
+        while not session['done'].is_set() and time.monotonic() < session['deadline']:
+            frames = sys._current_frames()
+            if session['mode'] == 'requests':
+                with self._lock:
+                    idents = set(session['threads'])
+            else:
+                idents = set(frames) - {own_ident}
+
+            stacks = []
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is not None:
+                    stacks.append(_collapse(frame))
+            del frames
+            # Counter isn't safe to read while it's updated: readers copy it under the same lock
+            with self._lock:
+                session['stacks'].update(stacks)
+                session['samples'] += 1
+            session['done'].wait(session['interval'])
+        session['done'].set()
+
+    def profile_for(self, seconds, interval_ms=PROFILER_INTERVAL_MS):
+        """Sample every thread in this worker for `seconds`; blocks and returns collapsed stacks"""
+        seconds = min(max(seconds, 0.1), PROFILER_MAX_SECONDS)
+        session = self._new_session('duration', interval_ms, time.monotonic() + seconds)
+        self._start(session)
+        session['done'].wait(seconds + 5)
+        return self.collapsed(session)
+
+    def profile_requests(self, route, max_requests, timeout, interval_ms=PROFILER_INTERVAL_MS):
+        """Arm sampling of the next `max_requests` requests to `route` (a Flask rule string)"""
+        timeout = min(max(timeout, 1), PROFILER_MAX_SECONDS)
+        session = self._new_session('requests', interval_ms, time.monotonic() + timeout,
+                                    route=route, max_requests=max(1, max_requests))
+        self._start(session)
+        return self.status()
+
+    def status(self):
+        session = self._session
+        if session is None:
+            return {"running": False}
+        return {
+            "running": not session['done'].is_set(),
+            "mode": session['mode'],
+            "route": session['route'],
+            "max_requests": session['max_requests'],
+            "completed_requests": session['completed_requests'],
+            "samples": session['samples'],
+            "started_at": session['started_at']
+        }
+
+    def collapsed(self, session=None):
+        session = session or self._session
+        if session is None:
+            return ""
+        with self._lock:
+            stacks = session['stacks'].copy()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def stop(self):
+        session = self._session
+        if session is not None:
+            session['done'].set()
+
+    # --- request hooks (only registered when the profiler is enabled) ---
+
+    def before_request(self):
+        session = self._session
+        if session is None or session['mode'] != 'requests' or session['done'].is_set():
+            return
+        if request.url_rule is not None and request.url_rule.rule == session['route']:
+            with self._lock:
+                session['threads'].add(threading.get_ident())
+
+    def teardown_request(self, exc=None):
+        session = self._session
+        if session is None or session['mode'] != 'requests':
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            if ident not in session['threads']:
+                return
+            session['threads'].discard(ident)
+            session['completed_requests'] += 1
+            if session['completed_requests'] >= session['max_requests']:
+                session['done'].set()
+
+profiler = SamplingProfiler()
+
+def init_app(app):
+    """Install the request hooks that route-scoped profiling needs"""
+    if not PROFILER_ENABLED:
+        return
+    app.before_request(profiler.before_request)
+    app.teardown_request(profiler.teardown_request)
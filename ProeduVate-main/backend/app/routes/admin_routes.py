@@ -3,6 +3,9 @@
 from flask import Blueprint, request, jsonify
 from ..database import users_collection, assignments_collection
 from ..models.user import user_helper, generate_student_scores
+from ..services.prompt_builder import get_prompt_metrics
+from ..auth import invalidate_user_cache, login_required
+from ..profiling import profiler, ProfilerBusy, PROFILER_ENABLED, PROFILER_INTERVAL_MS, PROFILER_MAX_SECONDS
 from bson import ObjectId
 import datetime
 
@@ -66,6 +69,7 @@ def get_all_users():
 @admin_bp.route('/users/<user_id>', methods=['DELETE'])
 def delete_user(user_id):
     result = users_collection.delete_one({"_id": ObjectId(user_id)})
+    invalidate_user_cache(user_id)
     if result.deleted_count == 1:
         return jsonify({"success": True, "message": "User deleted"}), 200
     return jsonify({"error": "User not found"}), 404
@@ -99,6 +103,7 @@ def assign_students_to_teacher():
                     "assignedAt": datetime.datetime.utcnow()
                 }}
             )
+            invalidate_user_cache(student_id)
             if result.modified_count > 0 or result.matched_count > 0:
                 updated_count += 1
         
@@ -188,6 +193,81 @@ def get_system_status():
         print(f"Error fetching system status: {e}")
         return jsonify({"error": "Failed to fetch status"}), 500
 
+@admin_bp.route('/prompt-metrics', methods=['GET'])
+def get_prompt_size_metrics():
+    """Get estimated prompt sizes sent to the AI models, per call site"""
+    return jsonify(get_prompt_metrics()), 200
+
+# --- On-demand profiling (PROFILER_ENABLED=1) ---
+# Output is in collapsed-stack format: feed it to flamegraph.pl or speedscope.
+# Each gunicorn worker profiles itself only, so repeat the call to sample others.
+# Sessions live in one worker's memory: run with a single worker (-w 1) to use
+# /profile/requests, since the follow-up GET may otherwise reach another worker.
+def _profiler_disabled():
+    return jsonify({"error": "Profiler is disabled"}), 404
+
+@admin_bp.route('/profile', methods=['POST'])
+@login_required('admin')
+def profile_worker():
+    """Sample every thread in this worker for N seconds and return collapsed stacks"""
+    if not PROFILER_ENABLED:
+        return _profiler_disabled()
+
+    data = request.get_json(silent=True) or {}
+    try:
+        seconds = float(data.get('seconds', 10))
+        interval_ms = float(data.get('interval_ms', PROFILER_INTERVAL_MS))
+    except (TypeError, ValueError):
+        return jsonify({"error": "seconds and interval_ms must be numbers"}), 400
+
+    try:
+        collapsed = profiler.profile_for(seconds, interval_ms)
+    except ProfilerBusy as e:
+        return jsonify({"error": str(e)}), 409
+    return collapsed, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+@admin_bp.route('/profile/requests', methods=['POST'])
+@login_required('admin')
+def profile_route_requests():
+    """Profile the next `count` requests to `route` (e.g. "/api/teacher/students/progress")"""
+    if not PROFILER_ENABLED:
+        return _profiler_disabled()
+
+    data = request.get_json(silent=True) or {}
+    if not data.get('route'):
+        return jsonify({"error": "route is required"}), 400
+    try:
+        count = int(data.get('count', 10))
+        timeout = float(data.get('timeout', PROFILER_MAX_SECONDS))
+        interval_ms = float(data.get('interval_ms', PROFILER_INTERVAL_MS))
+    except (TypeError, ValueError):
+        return jsonify({"error": "count, timeout and interval_ms must be numbers"}), 400
+
+    try:
+        status = profiler.profile_requests(data['route'], count, timeout, interval_ms)
+    except ProfilerBusy as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify(status), 202
+
+@admin_bp.route('/profile', methods=['GET'])
+@login_required('admin')
+def get_profile():
+    """Status of the last session, or its collapsed stacks with ?format=collapsed"""
+    if not PROFILER_ENABLED:
+        return _profiler_disabled()
+    if request.args.get('format') == 'collapsed':
+        return profiler.collapsed(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    return jsonify(profiler.status()), 200
+
+@admin_bp.route('/profile', methods=['DELETE'])
+@login_required('admin')
+def stop_profile():
+    """Stop the running session early; its samples stay available"""
+    if not PROFILER_ENABLED:
+        return _profiler_disabled()
+    profiler.stop()
+    return jsonify(profiler.status()), 200
+
 @admin_bp.route('/tasks', methods=['GET'])
 def get_admin_tasks():
     """Get admin tasks (assignments created by admin)"""
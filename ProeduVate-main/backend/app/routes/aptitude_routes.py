@@ -1,16 +1,35 @@
 # aptitude_routes.py
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from ..services.aptitude_service import (
     generate_aptitude_questions,
+    iter_aptitude_questions,
     generate_practice_questions,
     evaluate_aptitude_test,
+    public_questions,
+    match_topic,
     get_topic_concepts,
     get_topics_list
 )
-from ..database import users_collection, submissions_collection
+from ..services.aptitude_storage import (
+    store_questions,
+    load_questions,
+    compact_submission_fields,
+    history_push
+)
+from ..services.aptitude_stats import record_attempt, get_student_stats, format_statistics
+from ..services.grading_service import regrade_aptitude, aptitude_answer_key
+from ..auth import login_required
+from ..services.adaptive_service import select_questions, update_mastery, rating_to_difficulty, get_mastery
+from ..database import users_collection, submissions_collection, aptitude_tests_collection
+from ..serialization import dumps_bytes
 from bson import ObjectId
-from datetime import datetime
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
+import os
+
+# How long a generated test (and its answer key) can still be submitted
+APTITUDE_TEST_TTL_HOURS = float(os.getenv('APTITUDE_TEST_TTL_HOURS', 24))
 
 aptitude_bp = Blueprint('aptitude_bp', __name__, url_prefix='/api/aptitude')
 
@@ -88,14 +107,69 @@ def get_practice(topic):
             'message': f'Failed to generate practice questions: {str(e)}'
         }), 500
 
+def _wants_stream():
+    return request.args.get('stream') in ('1', 'true') or \
+        'application/x-ndjson' in request.headers.get('Accept', '')
+
+def _stream_test(test, bank_questions, topic, difficulty, missing):
+    """
+    NDJSON events for a test whose generated questions arrive shard by shard:
+        {"type": "test", ...}                            test id and metadata, straight away
+        {"type": "questions", "offset": n, ...}          questions n, n+1, ... (answer keys "n", "n+1", ...)
+        {"type": "done", "num_questions": n}             or {"type": "error", "message": ...}
+    Each batch is added to the stored test before it is sent, so answers to
+    questions already shown can be submitted at any time.
+    """
+    test_id = test['_id']
+    yield dumps_bytes({
+        'type': 'test',
+        'success': True,
+        'test_id': str(test_id),
+        'topic': test['topic'],
+        'difficulty': difficulty,
+        'adaptive': test['adaptive'],
+        'num_questions': len(bank_questions) + missing,
+        'duration_minutes': 60
+    }) + b'\n'
+
+    count = 0
+    if bank_questions:
+        yield dumps_bytes({'type': 'questions', 'offset': 0, 'questions': public_questions(bank_questions)}) + b'\n'
+        count = len(bank_questions)
+
+    try:
+        for shard in iter_aptitude_questions(topic, difficulty, missing) if missing > 0 else ():
+            ids = store_questions(shard, test['topic'], test.get('target_rating'))
+            aptitude_tests_collection.update_one({'_id': test_id}, {'$push': {'question_ids': {'$each': ids}}})
+            yield dumps_bytes({'type': 'questions', 'offset': count, 'questions': public_questions(shard)}) + b'\n'
+            count += len(shard)
+    except Exception as e:
+        print(f"Error streaming test {test_id}: {e}")
+
+    if not count:
+        aptitude_tests_collection.delete_one({'_id': test_id})
+        yield dumps_bytes({
+            'type': 'error',
+            'success': False,
+            'message': f'Topic "{topic}" not found or failed to generate questions'
+        }) + b'\n'
+        return
+    aptitude_tests_collection.update_one({'_id': test_id}, {'$set': {'status': 'ready'}})
+    print(f"Test streamed successfully with {count} questions")
+    yield dumps_bytes({'type': 'done', 'num_questions': count}) + b'\n'
+
 @aptitude_bp.route('/test/generate', methods=['POST'])
 def generate_test():
-    """Generate a new aptitude test"""
+    """
+    Generate a new aptitude test.
+    With ?stream=1 (or Accept: application/x-ndjson) the test is sent as NDJSON
+    events as soon as each shard of questions is ready; see _stream_test.
+    """
     try:
         data = request.get_json()
         topic = data.get('topic')
         difficulty = data.get('difficulty', 'medium')
-        num_questions = data.get('num_questions', 50)
+        num_questions = int(data.get('num_questions', 50))
         
         print(f"Generating test for topic: '{topic}', difficulty: {difficulty}, questions: {num_questions}")
         
@@ -105,28 +179,92 @@ def generate_test():
                 'message': 'Topic is required'
             }), 400
         
-        questions = generate_aptitude_questions(topic, difficulty, num_questions)
+        canonical_topic = match_topic(topic)
+        student_id = data.get('student_id')
+        adaptive = difficulty == 'adaptive'
+        if adaptive and not student_id:
+            return jsonify({
+                'success': False,
+                'message': 'student_id is required for adaptive tests'
+            }), 400
+        
+        # Adaptive tests come from the bank around the student's rating; the model
+        # only generates whatever the bank can't cover yet
+        bank_questions, target_rating = [], None
+        if adaptive and canonical_topic:
+            bank_questions, target_rating = select_questions(student_id, canonical_topic, num_questions)
+            difficulty = rating_to_difficulty(target_rating)
+            print(f"Adaptive test at rating {target_rating:.0f}: {len(bank_questions)} questions from the bank")
+        
+        missing = num_questions - len(bank_questions)
+        if _wants_stream():
+            if not canonical_topic:
+                return jsonify({
+                    'success': False,
+                    'message': f'Topic "{topic}" not found or failed to generate questions'
+                }), 404
+            now = datetime.utcnow()
+            test = {
+                'topic': canonical_topic,
+                'difficulty': difficulty,
+                'adaptive': adaptive,
+                'question_ids': [q['_id'] for q in bank_questions],
+                'status': 'generating',
+                'created_at': now,
+                'expires_at': now + timedelta(hours=APTITUDE_TEST_TTL_HOURS)
+            }
+            if target_rating is not None:
+                test['target_rating'] = target_rating
+            if student_id:
+                test['student_id'] = student_id
+            test['_id'] = aptitude_tests_collection.insert_one(test).inserted_id
+            events = _stream_test(test, bank_questions, canonical_topic, difficulty, missing)
+            return Response(stream_with_context(events), mimetype='application/x-ndjson', headers={
+                # Let nginx pass each batch through as soon as it is produced
+                'X-Accel-Buffering': 'no'
+            })
+        
+        generated = []
+        if missing > 0:
+            questions = generate_aptitude_questions(topic, difficulty, missing)
+            generated = (questions or {}).get('questions', [])
         
-        if not questions:
+        if not bank_questions and not generated:
             print(f"Failed to generate test questions for topic: '{topic}'")
             return jsonify({
                 'success': False,
                 'message': f'Topic "{topic}" not found or failed to generate questions'
             }), 404
         
-        # Generate test ID
-        test_id = str(ObjectId())
+        # Keep the test server-side (questions in the bank); submit grades against it
+        now = datetime.utcnow()
+        test_questions = bank_questions + generated
+        question_ids = [q['_id'] for q in bank_questions] + store_questions(generated, canonical_topic, target_rating)
+        test = {
+            'topic': canonical_topic or topic,
+            'difficulty': difficulty,
+            'adaptive': adaptive,
+            'question_ids': question_ids,
+            'created_at': now,
+            'expires_at': now + timedelta(hours=APTITUDE_TEST_TTL_HOURS)
+        }
+        if target_rating is not None:
+            test['target_rating'] = target_rating
+        if student_id:
+            test['student_id'] = student_id
+        test_id = str(aptitude_tests_collection.insert_one(test).inserted_id)
         
-        print(f"Test generated successfully with {len(questions.get('questions', []))} questions")
+        print(f"Test generated successfully with {len(test_questions)} questions")
         
         return jsonify({
             'success': True,
             'test_id': test_id,
-            'topic': topic,
+            'topic': test['topic'],
             'difficulty': difficulty,
-            'num_questions': num_questions,
+            'adaptive': adaptive,
+            'num_questions': len(test_questions),
             'duration_minutes': 60,
-            'questions': questions.get('questions', [])
+            'questions': public_questions(test_questions)
         }), 200
     except Exception as e:
         print(f"Error generating test: {str(e)}")
@@ -137,63 +275,111 @@ def generate_test():
             'message': f'Failed to generate test: {str(e)}'
         }), 500
 
+def _release_claim(oid, student_id):
+    """Undo submit_test's claim on a test it could not grade"""
+    aptitude_tests_collection.update_one(
+        {'_id': oid, 'submitted_by': student_id},
+        {'$unset': {'submitted_at': '', 'submitted_by': ''}}
+    )
+
 @aptitude_bp.route('/test/submit', methods=['POST'])
 def submit_test():
-    """Submit aptitude test answers for evaluation"""
+    """Submit aptitude test answers; they are graded against the stored answer key"""
     try:
         data = request.get_json()
         student_id = data.get('student_id')
         test_id = data.get('test_id')
-        topic = data.get('topic')
-        questions = data.get('questions')
         answers = data.get('answers')
         time_taken = data.get('time_taken', 0)
         
-        if not all([student_id, test_id, topic, questions, answers]):
+        if not all([student_id, test_id, answers]) or not isinstance(answers, dict):
             return jsonify({
                 'success': False,
                 'message': 'Missing required fields'
             }), 400
         
-        # Evaluate the test
-        evaluation = evaluate_aptitude_test(questions, answers)
-        
-        # Save submission to database
-        submission = {
-            'student_id': student_id,
-            'test_id': test_id,
-            'type': 'aptitude',
-            'topic': topic,
-            'total_questions': evaluation['total_questions'],
-            'correct_answers': evaluation['correct_answers'],
-            'incorrect_answers': evaluation['incorrect_answers'],
-            'unanswered': evaluation['unanswered'],
-            'score': evaluation['score'],
-            'time_taken': time_taken,
-            'submitted_at': datetime.utcnow(),
-            'answers': answers,
-            'evaluation': evaluation
-        }
-        
-        submissions_collection.insert_one(submission)
+        try:
+            oid = ObjectId(test_id)
+        except InvalidId:
+            oid = None
+        # Claim the test atomically: the evaluation below reveals the answer key,
+        # so each test can be graded only once
+        test = aptitude_tests_collection.find_one_and_update(
+            {'_id': oid, 'submitted_at': {'$exists': False},
+             '$or': [{'student_id': {'$exists': False}}, {'student_id': student_id}]},
+            {'$set': {'submitted_at': datetime.utcnow(), 'submitted_by': student_id}}
+        ) if oid else None
+        if not test:
+            existing = aptitude_tests_collection.find_one({'_id': oid}, {'student_id': 1, 'submitted_at': 1}) if oid else None
+            if not existing:
+                return jsonify({
+                    'success': False,
+                    'message': 'Test not found or expired'
+                }), 404
+            if existing.get('student_id') and existing['student_id'] != student_id:
+                return jsonify({
+                    'success': False,
+                    'message': 'This test belongs to another student'
+                }), 403
+            return jsonify({
+                'success': False,
+                'message': 'This test has already been submitted'
+            }), 409
         
+        # Until the submission is stored, a failure hands the test back so it can be submitted again
+        try:
+            # Evaluate the test
+            test_questions = load_questions(test['question_ids'])
+            if len(test_questions) != len(test['question_ids']):
+                # Answers are keyed by position; grading a shorter list would shift them
+                _release_claim(oid, student_id)
+                return jsonify({
+                    'success': False,
+                    'message': 'Some questions of this test are no longer available'
+                }), 410
+            evaluation = evaluate_aptitude_test(test_questions, answers)
+            topic = test['topic']
+
+            # Save a compact submission: question ids, chosen options and a correctness bitset
+            submission = {
+                'student_id': student_id,
+                'test_id': test_id,
+                'type': 'aptitude',
+                'topic': topic,
+                'total_questions': evaluation['total_questions'],
+                'correct_answers': evaluation['correct_answers'],
+                'incorrect_answers': evaluation['incorrect_answers'],
+                'unanswered': evaluation['unanswered'],
+                'score': evaluation['score'],
+                'time_taken': time_taken,
+                'submitted_at': datetime.utcnow(),
+                **compact_submission_fields(test['question_ids'], evaluation)
+            }
+
+            submissions_collection.insert_one(submission)
+        except Exception:
+            _release_claim(oid, student_id)
+            raise
+
         # Update student's aptitude progress
         users_collection.update_one(
             {'_id': ObjectId(student_id)},
-            {
-                '$push': {
-                    'aptitude_history': {
-                        'topic': topic,
-                        'score': evaluation['score'],
-                        'date': datetime.utcnow()
-                    }
-                }
-            }
+            {'$push': history_push(topic, evaluation['score'], datetime.utcnow())}
+        )
+        record_attempt(student_id, topic, evaluation['score'])
+        new_rating, rating_change = update_mastery(
+            student_id, topic, test_questions,
+            [r['status'] == 'correct' for r in evaluation['results']]
         )
         
         return jsonify({
             'success': True,
-            'evaluation': evaluation
+            'evaluation': evaluation,
+            'mastery': {
+                'rating': round(new_rating),
+                'change': round(rating_change, 1),
+                'level': rating_to_difficulty(new_rating)
+            }
         }), 200
     except Exception as e:
         print(f"Error submitting test: {str(e)}")
@@ -202,68 +388,93 @@ def submit_test():
             'message': 'Failed to submit test'
         }), 500
 
+@aptitude_bp.route('/test/<test_id>/regrade', methods=['POST'])
+@login_required('teacher', 'admin')
+def regrade_test(test_id):
+    """
+    Fix answer keys and re-grade stored submissions.
+    answer_key is either a list aligned with the test's questions (null = unchanged)
+    or a {question_id: answer} object; answers are option text or option index.
+    Every submission containing a corrected question is re-graded, not only this test's.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        answer_key = data.get('answer_key')
+        
+        if isinstance(answer_key, list):
+            try:
+                test = aptitude_tests_collection.find_one({'_id': ObjectId(test_id)}, {'question_ids': 1})
+            except InvalidId:
+                test = None
+            # Tests expire; their submissions still carry the question ids
+            test = test or submissions_collection.find_one({'test_id': test_id, 'type': 'aptitude'}, {'question_ids': 1})
+            if not test:
+                return jsonify({
+                    'success': False,
+                    'message': 'Test not found'
+                }), 404
+            answer_key = aptitude_answer_key(test.get('question_ids') or [], answer_key)
+        elif not isinstance(answer_key, dict):
+            return jsonify({
+                'success': False,
+                'message': 'answer_key must be a list or an object'
+            }), 400
+        
+        summary = regrade_aptitude(answer_key)
+        return jsonify({
+            'success': True,
+            **summary
+        }), 200
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        print(f"Error re-grading test: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to re-grade test'
+        }), 500
+
+@aptitude_bp.route('/mastery/<student_id>', methods=['GET'])
+def get_student_mastery(student_id):
+    """Get the student's ability rating per topic"""
+    try:
+        return jsonify({
+            'success': True,
+            'mastery': get_mastery(student_id)
+        }), 200
+    except Exception as e:
+        print(f"Error fetching mastery: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to fetch mastery'
+        }), 500
+
 @aptitude_bp.route('/progress/<student_id>', methods=['GET'])
 def get_progress(student_id):
-    """Get student's aptitude progress"""
+    """Get student's aptitude progress from the stats document and the last 10 tests"""
     try:
-        # Get all aptitude submissions for the student
-        submissions = list(submissions_collection.find({
-            'student_id': student_id,
-            'type': 'aptitude'
-        }).sort('submitted_at', -1))
+        stats = get_student_stats(student_id)
+        recent = submissions_collection.find(
+            {'student_id': student_id, 'type': 'aptitude'},
+            {'_id': 0, 'topic': 1, 'score': 1, 'submitted_at': 1, 'time_taken': 1}
+        ).sort('submitted_at', -1).limit(10)
         
-        # Calculate overall statistics
-        if submissions:
-            total_tests = len(submissions)
-            avg_score = sum(s['score'] for s in submissions) / total_tests
-            best_score = max(s['score'] for s in submissions)
-            
-            # Topic-wise performance
-            topic_performance = {}
-            for sub in submissions:
-                topic = sub['topic']
-                if topic not in topic_performance:
-                    topic_performance[topic] = []
-                topic_performance[topic].append(sub['score'])
-            
-            topic_stats = {
-                topic: {
-                    'avg_score': sum(scores) / len(scores),
-                    'attempts': len(scores),
-                    'best_score': max(scores)
+        return jsonify({
+            'success': True,
+            'statistics': format_statistics(stats),
+            'recent_tests': [
+                {
+                    'topic': s['topic'],
+                    'score': s['score'],
+                    'date': s['submitted_at'],
+                    'time_taken': s.get('time_taken', 0)
                 }
-                for topic, scores in topic_performance.items()
-            }
-            
-            return jsonify({
-                'success': True,
-                'statistics': {
-                    'total_tests': total_tests,
-                    'average_score': round(avg_score, 2),
-                    'best_score': round(best_score, 2),
-                    'topic_performance': topic_stats
-                },
-                'recent_tests': [
-                    {
-                        'topic': s['topic'],
-                        'score': s['score'],
-                        'date': s['submitted_at'].isoformat(),
-                        'time_taken': s.get('time_taken', 0)
-                    }
-                    for s in submissions[:10]
-                ]
-            }), 200
-        else:
-            return jsonify({
-                'success': True,
-                'statistics': {
-                    'total_tests': 0,
-                    'average_score': 0,
-                    'best_score': 0,
-                    'topic_performance': {}
-                },
-                'recent_tests': []
-            }), 200
+                for s in recent
+            ]
+        }), 200
     except Exception as e:
         print(f"Error fetching progress: {str(e)}")
         return jsonify({
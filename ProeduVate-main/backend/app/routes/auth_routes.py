@@ -1,18 +1,15 @@
 # auth_routes.py
 
 from flask import Blueprint, jsonify, request
-from werkzeug.security import generate_password_hash, check_password_hash
 from ..database import users_collection
+from ..services.password_service import hash_password, verify_and_upgrade
+from ..auth import JWT_SECRET, JWT_ALGORITHM, get_current_claims, get_current_user
 from bson import ObjectId
 import jwt
 import datetime
-import os
 
 auth_bp = Blueprint('auth_bp', __name__, url_prefix='/api/auth')
 
-# Secret key for JWT (should be in environment variable in production)
-JWT_SECRET = os.getenv('JWT_SECRET', 'your-secret-key-change-in-production')
-JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
 def generate_jwt_token(user_id, email, role):
@@ -27,16 +24,6 @@ def generate_jwt_token(user_id, email, role):
     token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return token
 
-def verify_jwt_token(token):
-    """Verify and decode JWT token"""
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
-        return None
-
 @auth_bp.route('/register', methods=['POST', 'OPTIONS'])
 def register_student():
     """Register a new student user"""
@@ -72,7 +59,7 @@ def register_student():
             }), 409
         
         # Hash the password
-        hashed_password = generate_password_hash(data['password'])
+        hashed_password = hash_password(data['password'])
         
         # Create new student user
         new_user = {
@@ -147,17 +134,21 @@ def login_student():
                 'message': 'Invalid email or password'
             }), 401
         
-        # Verify password
-        if not check_password_hash(user['password'], password):
+        # Verify password (rehashing it if the hash parameters have changed)
+        is_valid, upgraded_hash = verify_and_upgrade(user.get('password', ''), password)
+        if not is_valid:
             return jsonify({
                 'success': False,
                 'message': 'Invalid email or password'
             }), 401
         
         # Update last login
+        update_fields = {'lastLogin': datetime.datetime.utcnow()}
+        if upgraded_hash:
+            update_fields['password'] = upgraded_hash
         users_collection.update_one(
             {'_id': user['_id']},
-            {'$set': {'lastLogin': datetime.datetime.utcnow()}}
+            {'$set': update_fields}
         )
         
         # Generate JWT token
@@ -193,16 +184,30 @@ def verify_token():
         if not token:
             return jsonify({'success': False, 'message': 'No token provided'}), 401
         
-        payload = verify_jwt_token(token)
+        # Already verified (or served from the token cache) by the before_request hook
+        payload = get_current_claims()
         
         if not payload:
             return jsonify({'success': False, 'message': 'Invalid or expired token'}), 401
         
+        # A deleted account keeps a valid token until it expires
+        user = get_current_user()
+        if not user:
+            return jsonify({'success': False, 'message': 'User not found'}), 401
+        
         return jsonify({
             'success': True,
             'user_id': payload['user_id'],
             'email': payload['email'],
-            'role': payload['role']
+            'role': payload['role'],
+            'user': {
+                'id': str(user['_id']),
+                'name': user.get('name', ''),
+                'email': user.get('email', ''),
+                'registerNumber': user.get('registerNumber', ''),
+                'department': user.get('department', ''),
+                'role': user.get('role')
+            }
         }), 200
         
     except Exception as e:
@@ -3,11 +3,14 @@
 from flask import Blueprint, jsonify, request
 from datetime import datetime, timedelta
 from ..database import gd_rounds_collection, gd_results_collection, users_collection, gd_notifications_collection
+from ..services.gd_service import GDService
 from bson import ObjectId
 import random
 
 gd_bp = Blueprint('gd_bp', __name__, url_prefix='/api/gd')
 
+gd_service = GDService()
+
 # Default GD topics
 DEFAULT_GD_TOPICS = [
     "Impact of Artificial Intelligence on Employment",
@@ -82,7 +85,6 @@ def schedule_gd_round():
         }
         
         result = gd_rounds_collection.insert_one(gd_round)
-        gd_round['_id'] = str(result.inserted_id)
         
         # Create notifications for assigned students
         for student_id in gd_round['assigned_students']:
@@ -110,8 +112,6 @@ def get_gd_rounds():
     """Get all GD rounds"""
     try:
         rounds = list(gd_rounds_collection.find())
-        for round in rounds:
-            round['_id'] = str(round['_id'])
         
         return jsonify({
             "rounds": rounds,
@@ -128,9 +128,6 @@ def get_student_gd_rounds(student_id):
             "assigned_students": student_id
         }))
         
-        for round in rounds:
-            round['_id'] = str(round['_id'])
-        
         return jsonify({
             "rounds": rounds,
             "success": True
@@ -146,9 +143,6 @@ def get_student_notifications(student_id):
             "student_id": student_id
         }).sort("created_at", -1))
         
-        for notif in notifications:
-            notif['_id'] = str(notif['_id'])
-        
         return jsonify({
             "notifications": notifications,
             "success": True
@@ -181,8 +175,6 @@ def get_gd_round_details(round_id):
         if not round:
             return jsonify({"error": "GD round not found", "success": False}), 404
         
-        round['_id'] = str(round['_id'])
-        
         return jsonify({
             "round": round,
             "success": True
@@ -278,19 +270,26 @@ def evaluate_gd_round(round_id):
     try:
         data = request.get_json()
         
-        # In a real implementation, this would use AI to analyze the responses
-        # For now, we'll use mock evaluation
-        
         responses = data.get("responses", [])
         evaluation_criteria = data.get("evaluation_criteria", DEFAULT_EVALUATION_CRITERIA)
         
-        # Mock evaluation scores
+        topic = data.get("topic")
+        if not topic:
+            round = gd_rounds_collection.find_one({"_id": ObjectId(round_id)}, {"topic": 1})
+            topic = round.get("topic", "") if round else ""
+        
+        # Score the whole transcript in a few batched AI calls (cached by transcript hash)
+        batch_scores = gd_service.evaluate_round_batch(topic, responses, evaluation_criteria)
+        
         participants = []
         student_id = data.get("student_id")
         num_ai_agents = data.get("num_ai_agents", 7)
         
         # Evaluate student
-        student_score = evaluate_participant(responses, evaluation_criteria, is_student=True)
+        if "user" in batch_scores:
+            student_score = build_participant_score(batch_scores["user"], evaluation_criteria)
+        else:
+            student_score = evaluate_participant(responses, evaluation_criteria, is_student=True)
         participants.append({
             "id": student_id,
             "name": "You",
@@ -302,9 +301,13 @@ def evaluate_gd_round(round_id):
         
         # Generate AI agent scores
         for i in range(num_ai_agents):
-            ai_score = generate_ai_agent_score(evaluation_criteria)
+            agent_id = f"ai_agent_{i+1}"
+            if agent_id in batch_scores:
+                ai_score = build_participant_score(batch_scores[agent_id], evaluation_criteria)
+            else:
+                ai_score = generate_ai_agent_score(evaluation_criteria)
             participants.append({
-                "id": f"ai_agent_{i+1}",
+                "id": agent_id,
                 "name": f"AI Agent {i+1}",
                 "type": "ai",
                 "scores": ai_score["scores"],
@@ -342,8 +345,6 @@ def evaluate_gd_round(round_id):
             }}
         )
         
-        result['_id'] = str(result['_id'])
-        
         return jsonify({
             "message": "GD round evaluated successfully",
             "results": result,
@@ -360,9 +361,6 @@ def get_student_results(student_id):
             "student_id": student_id
         }).sort("completed_at", -1))
         
-        for result in results:
-            result['_id'] = str(result['_id'])
-        
         return jsonify({
             "results": results,
             "success": True
@@ -399,6 +397,26 @@ def evaluate_participant(responses, criteria, is_student=False):
         "total_score": round(total_score, 2)
     }
 
+def build_participant_score(raw_scores, criteria):
+    """Attach criterion weights to AI-assigned scores and compute the weighted total"""
+    scores = {
+        criterion_key: {
+            "score": raw_scores.get(criterion_key, 0),
+            "weight": criterion_data["weight"]
+        }
+        for criterion_key, criterion_data in criteria.items()
+    }
+    
+    total_score = sum(
+        (scores[k]["score"] * scores[k]["weight"]) / 100 
+        for k in scores
+    )
+    
+    return {
+        "scores": scores,
+        "total_score": round(total_score, 2)
+    }
+
 def generate_ai_agent_score(criteria):
     """Generate scores for AI agents"""
     scores = {}
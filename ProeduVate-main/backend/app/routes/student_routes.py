@@ -2,30 +2,31 @@
 
 from flask import Blueprint, jsonify, request, current_app
 from datetime import datetime
-from ..database import assignments_collection, users_collection, teacher_assignments_collection, submissions_collection
+from ..database import assignments_collection, users_collection, teacher_assignments_collection, submissions_collection, missing_unique_indexes
 from ..models.assignment import assignment_helper
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from werkzeug.utils import secure_filename
-from werkzeug.security import check_password_hash, generate_password_hash
 import os
+import json
 from ..services.ai_service import extract_text_from_pdf, get_ats_analysis
 from ..services.lambda_service import execute_python_code_lambda
+from ..auth import get_cached_user, invalidate_user_cache
+from ..services.password_service import hash_password, verify_password
+from ..services import upload_service, storage_service, quiz_service, interview_service
+from ..services.upload_service import UploadError
 
 student_bp = Blueprint('student_bp', __name__, url_prefix='/api/student')
 
-# Storage for quiz submissions (can be moved to DB later)
-quiz_submissions = {}
 student_notifications = []
 
+# Idempotency keys remembered per submission; older retries are treated as new submits
+IDEMPOTENCY_KEYS_KEPT = 20
+
 def allowed_file(filename):
     # Allowed extensions for resume uploads
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'pdf'}
 
-def allowed_assignment_file(filename):
-    # Broader allowed extensions for general assignment uploads
-    allowed_extensions = {'pdf', 'doc', 'docx', 'ppt', 'pptx', 'txt', 'zip', 'rar'}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
-
 @student_bp.route('/assignments', methods=['GET'])
 def get_student_assignments():
     """Get all assignments available to students"""
@@ -92,7 +93,7 @@ def get_student_assignments_by_id(user_id):
                 "type": a.get("type", "manual"),
                 "createdBy": "teacher",
                 "submitted": submission is not None,
-                "submittedAt": submission.get("submitted_at").isoformat() if submission and submission.get("submitted_at") else None,
+                "submittedAt": submission.get("submitted_at") if submission else None,
                 "status": "submitted" if submission else "pending"
             }
             
@@ -119,7 +120,8 @@ def get_student_progress(user_id):
         # Try to find user by _id as ObjectId or by integer id field
         student = None
         try:
-            student = users_collection.find_one({"_id": ObjectId(user_id)})
+            ObjectId(user_id)
+            student = get_cached_user(user_id)
         except:
             # If ObjectId conversion fails, try finding by integer id
             try:
@@ -178,10 +180,10 @@ def upload_resume(user_id):
         return jsonify({"error": "Invalid or no file selected"}), 400
 
     filename = secure_filename(f"{user_id}_{file.filename}")
-    save_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-    file.save(save_path)
+    storage_service.save_stream(f"resumes/{filename}", file.stream, 'application/pdf')
 
-    resume_text = extract_text_from_pdf(save_path)
+    with storage_service.get_storage().local_copy(f"resumes/{filename}") as resume_path:
+        resume_text = extract_text_from_pdf(resume_path)
     if not resume_text:
         return jsonify({"error": "Could not read text from PDF"}), 500
 
@@ -219,110 +221,235 @@ def upload_resume(user_id):
             "resumeSummary": summary
         }}
     )
+    invalidate_user_cache(user_id)
+    # Interviews start from a skill profile of the resume, not the resume itself
+    interview_service.refresh_profile_async(user_id, filename, resume_text)
     
     return jsonify(ats_analysis), 200
 
+def read_quiz_answers(path, filename):
+    """Answers list from the quiz_answers.json the quiz page uploads, if that's what this is"""
+    if not filename.endswith('.json'):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            answers = json.load(f).get('answers')
+    except (OSError, ValueError, AttributeError):
+        return None
+    if not isinstance(answers, list):
+        return None
+    return [a if isinstance(a, str) else None for a in answers]
+
+@student_bp.route('/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable upload for a large assignment file"""
+    data = request.get_json() or {}
+    student_id = data.get('student_id')
+    filename = secure_filename(data.get('filename') or '')
+    if not student_id or not filename:
+        return jsonify({"error": "student_id and filename are required"}), 400
+    try:
+        session = upload_service.create_session(filename, data.get('size'), student_id)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    return jsonify(upload_service.session_status(session)), 201
+
+def _owned_upload(upload_id):
+    """The upload session, if it belongs to the student_id query parameter"""
+    session = upload_service.get_session(upload_id)
+    if not session or session.get('owner_id') != request.args.get('student_id'):
+        return None
+    return session
+
+@student_bp.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Bytes received so far, so an interrupted upload can resume from there"""
+    session = _owned_upload(upload_id)
+    if not session:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(upload_service.session_status(session)), 200
+
+@student_bp.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """
+    Append the raw request body at the offset given by
+    Content-Range: bytes <start>-<end>/<size> (or ?offset=<start>).
+    Only the student who started the upload (?student_id=) can add to it.
+    The body is streamed to disk, never buffered whole.
+    """
+    session = _owned_upload(upload_id)
+    if not session:
+        return jsonify({"error": "Upload not found"}), 404
+
+    content_range = request.headers.get('Content-Range', '')
+    try:
+        if content_range:
+            start = int(content_range.split()[1].split('-')[0])
+        else:
+            start = int(request.args.get('offset', 0))
+    except (IndexError, ValueError):
+        return jsonify({"error": "Invalid Content-Range"}), 400
+
+    try:
+        session = upload_service.append_chunk(session, start, request.stream, request.content_length)
+    except UploadError as e:
+        body = {"error": str(e)}
+        if e.status == 409:
+            body["received"] = upload_service.get_session(upload_id)["received"]
+        return jsonify(body), e.status
+    return jsonify(upload_service.session_status(session)), 200
+
+def _submission_replay(assignment_id, student_id, idempotency_key):
+    """The response to a repeated submit request, built from what the first one stored"""
+    stored = submissions_collection.find_one(
+        {"assignment_id": assignment_id, "student_id": student_id, "idempotency_keys": idempotency_key},
+        {"filename": 1, "submitted_at": 1, "quiz_score": 1}
+    )
+    if not stored:
+        # Only seen if the submission was deleted between the write and this read
+        return jsonify({"error": "Submission changed while replaying the request; please retry"}), 409
+    response = jsonify({
+        "message": "Assignment submitted successfully!",
+        "filename": stored["filename"],
+        "submission": {
+            "assignment_id": assignment_id,
+            "student_id": student_id,
+            "filename": stored["filename"],
+            "submitted_at": stored["submitted_at"],
+            "quiz_score": stored.get("quiz_score")
+        }
+    })
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response, 200
+
 # --- [FIXED CODE] ---
 # This entire route has been rewritten to handle file uploads for assignments.
 @student_bp.route('/assignments/<assignment_id>/submit', methods=['POST'])
 def submit_assignment(assignment_id):
     """Submit an assignment file"""
     try:
-        # 1. Check if the file is part of the request
-        if 'assignment_file' not in request.files:
-            return jsonify({"error": "No assignment_file part in the request"}), 400
-
-        file = request.files['assignment_file']
-        student_id = request.form.get('student_id')
-        notes = request.form.get('notes', '') # Get notes, default to empty string
-        quiz_score = request.form.get('quiz_score')  # Get quiz score if provided
-
-        # 2. Validate the file and student ID
-        if file.filename == '':
-            return jsonify({"error": "No selected file"}), 400
-        
+        # File parts are hashed and size-checked while the body is parsed, not spooled first
+        form, files = upload_service.parse_upload_form(request, current_app.config['MAX_CONTENT_LENGTH'])
+        student_id = form.get('student_id')
+        notes = form.get('notes', '') # Get notes, default to empty string
+        quiz_score = form.get('quiz_score')  # Get quiz score if provided
+        upload_id = form.get('upload_id')  # Set when the file was sent via /uploads
+
         if not student_id:
             return jsonify({"error": "Missing student_id"}), 400
 
-        if file and (allowed_assignment_file(file.filename) or file.filename.endswith('.json')):
-            # 3. Create a secure filename and define a save path
+        # The upsert below relies on the unique (assignment_id, student_id) index;
+        # without it concurrent submits would store duplicates, so refuse instead
+        missing = missing_unique_indexes('submissions')
+        if missing:
+            print(f"Error: unique index {missing} on submissions is missing, refusing submits. "
+                  f"Run migrations/dedupe_submissions.py to create it.")
+            return jsonify({"error": "Submissions are temporarily unavailable"}), 503
+
+        # 1. Get the file into content-addressed storage, either from a finished
+        #    resumable upload or from the multipart file part parsed above
+        if upload_id:
+            upload = upload_service.get_session(upload_id)
+            if not upload or upload.get('owner_id') != student_id:
+                return jsonify({"error": "Upload not found"}), 404
+            if upload['status'] != 'complete':
+                return jsonify({"error": "Upload is not complete"}), 409
+            filename = secure_filename(upload['filename'])
+            stored = {
+                "sha256": upload['sha256'],
+                "size": upload['size'],
+                "key": upload_service.object_key(upload['sha256'])
+            }
+        else:
+            if 'assignment_file' not in files:
+                return jsonify({"error": "No assignment_file part in the request"}), 400
+            file = files['assignment_file']
+            if file.filename == '':
+                return jsonify({"error": "No selected file"}), 400
             filename = secure_filename(file.filename)
-            
-            # Create a dedicated folder for submissions if it doesn't exist
-            # The path will be something like: uploads/submissions/<assignment_id>/
-            submission_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'submissions', assignment_id)
-            os.makedirs(submission_folder, exist_ok=True)
-            
-            # Define the final path to save the file
-            save_path = os.path.join(submission_folder, f"{student_id}_{filename}")
-            
-            # 4. Save the file to the server's file system
-            file.save(save_path)
-
-            # 5. Save the submission record to MongoDB
-            submission_record = {
-                "assignment_id": assignment_id,
+            stored = upload_service.store_upload(file)
+
+        # 2. Save the submission record to MongoDB
+        submission_record = {
+            "assignment_id": assignment_id,
+            "student_id": student_id,
+            "filename": filename,
+            "file_path": f"/files/{stored['sha256']}/{filename}",
+            "file_sha256": stored['sha256'],
+            "file_size": stored['size'],
+            "notes": notes,
+            "submitted_at": datetime.now()
+        }
+        
+        # Add quiz score if provided
+        if quiz_score:
+            submission_record["quiz_score"] = float(quiz_score)
+            # Keep the answers too, so the quiz can be re-graded if its key changes
+            with storage_service.get_storage().local_copy(stored['key']) as path:
+                quiz_answers = read_quiz_answers(path, filename)
+            if quiz_answers is not None:
+                submission_record["quiz_answers"] = quiz_answers
+        
+        # One write whatever the state: the unique (assignment_id, student_id) index
+        # makes a resubmission replace the earlier one, and a double-click can't
+        # create a second document. A request repeating an Idempotency-Key this
+        # submission has already seen matches nothing here, hits the unique index
+        # and is answered as a replay instead of overwriting newer work.
+        idempotency_key = request.headers.get('Idempotency-Key')
+        query = {"assignment_id": assignment_id, "student_id": student_id}
+        update = {"$set": submission_record}
+        if idempotency_key:
+            query["idempotency_keys"] = {"$ne": idempotency_key}
+            update["$push"] = {"idempotency_keys": {"$each": [idempotency_key], "$slice": -IDEMPOTENCY_KEYS_KEPT}}
+        try:
+            result = submissions_collection.update_one(query, update, upsert=True)
+        except DuplicateKeyError:
+            # Lost the insert race to a concurrent submit of the same pair, or the
+            # key was seen before: the document exists now, so update it in place
+            result = submissions_collection.update_one(query, update)
+            if result.matched_count == 0:
+                return _submission_replay(assignment_id, student_id, idempotency_key)
+        
+        # Update student's submission count and quiz scores in users collection;
+        # replacing an earlier submission leaves the count as it was
+        update_data = {}
+        if result.upserted_id is not None:
+            update_data["submittedAssignments"] = submissions_collection.count_documents({"student_id": student_id})
+        
+        # If this is a quiz submission, update quiz-related scores
+        if quiz_score:
+            # Calculate average quiz score from all quiz submissions
+            quiz_submissions_list = list(submissions_collection.find({
                 "student_id": student_id,
-                "filename": filename,
-                "file_path": f"/uploads/submissions/{assignment_id}/{student_id}_{filename}",
-                "notes": notes,
-                "submitted_at": datetime.now()
-            }
-            
-            # Add quiz score if provided
-            if quiz_score:
-                submission_record["quiz_score"] = float(quiz_score)
-            
-            # Check if student already submitted this assignment, update if exists
-            existing = submissions_collection.find_one({
-                "assignment_id": assignment_id,
-                "student_id": student_id
-            })
-            
-            if existing:
-                submissions_collection.update_one(
-                    {"_id": existing["_id"]},
-                    {"$set": submission_record}
-                )
-            else:
-                submissions_collection.insert_one(submission_record)
-            
-            # Update student's submission count and quiz scores in users collection
-            total_submissions = submissions_collection.count_documents({"student_id": student_id})
-            update_data = {"submittedAssignments": total_submissions}
-            
-            # If this is a quiz submission, update quiz-related scores
-            if quiz_score:
-                # Calculate average quiz score from all quiz submissions
-                quiz_submissions_list = list(submissions_collection.find({
-                    "student_id": student_id,
-                    "quiz_score": {"$exists": True}
-                }))
-                
-                if quiz_submissions_list:
-                    avg_quiz_score = sum(sub.get("quiz_score", 0) for sub in quiz_submissions_list) / len(quiz_submissions_list)
-                    update_data["quizScore"] = avg_quiz_score
-                    update_data["averageQuizScore"] = avg_quiz_score
+                "quiz_score": {"$exists": True}
+            }))
             
+            if quiz_submissions_list:
+                avg_quiz_score = sum(sub.get("quiz_score", 0) for sub in quiz_submissions_list) / len(quiz_submissions_list)
+                update_data["quizScore"] = avg_quiz_score
+                update_data["averageQuizScore"] = avg_quiz_score
+        
+        if update_data:
             users_collection.update_one(
                 {"_id": ObjectId(student_id)},
                 {"$set": update_data}
             )
+            invalidate_user_cache(student_id)
 
-            return jsonify({
-                "message": "Assignment submitted successfully!",
+        return jsonify({
+            "message": "Assignment submitted successfully!",
+            "filename": filename,
+            "submission": {
+                "assignment_id": assignment_id,
+                "student_id": student_id,
                 "filename": filename,
-                "submission": {
-                    "assignment_id": assignment_id,
-                    "student_id": student_id,
-                    "filename": filename,
-                    "submitted_at": submission_record["submitted_at"].isoformat(),
-                    "quiz_score": quiz_score
-                }
-            }), 200
-        else:
-            return jsonify({"error": "File type not allowed"}), 400
+                "submitted_at": submission_record["submitted_at"],
+                "quiz_score": quiz_score
+            }
+        }), 200
 
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
         # Use a more accurate error message
         print(f"Error submitting assignment: {e}")
@@ -333,11 +460,10 @@ def submit_assignment(assignment_id):
 def get_assignment_quiz(assignment_id):
     """Get quiz questions for a specific assignment"""
     try:
-        # Try to find in teacher assignments collection
-        assignment = teacher_assignments_collection.find_one({"_id": ObjectId(assignment_id)})
+        questions = quiz_service.get_quiz_questions(assignment_id)
         
-        if assignment and assignment.get('questions'):
-            return jsonify({"questions": assignment['questions']}), 200
+        if questions:
+            return jsonify({"questions": questions}), 200
         else:
             return jsonify({"error": "Quiz not found"}), 404
     except Exception as e:
@@ -375,7 +501,7 @@ def get_last_login_time():
 def get_student_submissions(student_id):
     """Get all submissions for a specific student"""
     try:
-        submissions = list(submissions_collection.find({"student_id": student_id}))
+        submissions = list(submissions_collection.find({"student_id": student_id, "assignment_id": {"$exists": True}}))
         student_submissions = []
         for sub in submissions:
             student_submissions.append({
@@ -385,7 +511,7 @@ def get_student_submissions(student_id):
                 "filename": sub["filename"],
                 "file_path": sub["file_path"],
                 "notes": sub.get("notes", ""),
-                "submitted_at": sub["submitted_at"].isoformat()
+                "submitted_at": sub["submitted_at"]
             })
         return jsonify(student_submissions), 200
     except Exception as e:
@@ -404,9 +530,6 @@ def execute_code():
         stdin_input = data.get('stdin', '')
         base64_encoded = data.get('base64_encoded', False)
         
-        # Debug: Print what we received
-        print(f"Received stdin (base64): {stdin_input[:50] if stdin_input else 'EMPTY'}")
-        
         # Use AWS Lambda service to execute code
         result = execute_python_code_lambda(source_code, stdin_input, base64_encoded)
         
@@ -443,17 +566,18 @@ def change_password():
             return jsonify({'message': 'Student not found'}), 404
 
         # Verify current password
-        if not check_password_hash(student.get('password', ''), current_password):
+        if not verify_password(student.get('password', ''), current_password):
             return jsonify({'message': 'Current password is incorrect'}), 401
 
         # Hash the new password
-        hashed_password = generate_password_hash(new_password)
+        hashed_password = hash_password(new_password)
 
         # Update the password
         users_collection.update_one(
             {'_id': ObjectId(student_id)},
             {'$set': {'password': hashed_password}}
         )
+        invalidate_user_cache(student_id)
 
         return jsonify({'message': 'Password changed successfully'}), 200
 
@@ -492,6 +616,7 @@ def update_profile():
                 'department': department
             }}
         )
+        invalidate_user_cache(student_id)
 
         return jsonify({'message': 'Profile updated successfully'}), 200
 
@@ -523,6 +648,7 @@ def update_notifications():
                 }
             }}
         )
+        invalidate_user_cache(student_id)
 
         return jsonify({'message': 'Notification preferences updated successfully'}), 200
 
@@ -1,18 +1,20 @@
 # lms_portal_backend/app/routes/teacher_routes.py
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from ..database import users_collection, assignments_collection, teacher_assignments_collection, submissions_collection
 from ..models.user import user_helper
-from ..services.ai_service import get_ai_response
+from ..serialization import stream_json_array
+from ..services.grading_service import regrade_quiz
+from ..services.export_service import export_submissions
+from ..services import quiz_service
+from ..services.quiz_generation_service import normalize_request, submit_job, get_job, get_generated_quiz
+from ..auth import login_required, get_current_claims
 from bson import ObjectId
 import uuid
 from datetime import datetime
 
 teacher_bp = Blueprint('teacher_bp', __name__, url_prefix='/api/teacher')
 
-# In-memory storage for quiz questions (can be moved to DB later if needed)
-quiz_questions_storage = {}
-
 @teacher_bp.route('/students/progress', methods=['GET'])
 def get_student_progress():
     students = users_collection.find({"role": "student"})
@@ -43,10 +45,17 @@ def create_assignment():
         due_date = data.get('dueDate', datetime.now().isoformat())
         assignment_type = data.get('type', 'Assignment')
         quiz_questions = data.get('quizQuestions')
+        generated_quiz_id = data.get('generatedQuizId')
         
         if not all([title, description]):
             return jsonify({"error": "Missing required fields"}), 400
         
+        # Reuse a quiz from /api/chatbot/generate_quiz or a generation job
+        if generated_quiz_id and not quiz_questions:
+            quiz_questions = get_generated_quiz(generated_quiz_id)
+            if not quiz_questions:
+                return jsonify({"error": "Generated quiz not found or expired"}), 404
+        
         assignment = {
             "title": title,
             "description": description,
@@ -64,9 +73,9 @@ def create_assignment():
         result = teacher_assignments_collection.insert_one(assignment)
         assignment_id = str(result.inserted_id)
         
-        # Also store in memory for backward compatibility
+        # Workers may have cached "no quiz" for this id
         if quiz_questions:
-            quiz_questions_storage[assignment_id] = quiz_questions
+            quiz_service.invalidate(assignment_id)
         
         return jsonify({
             "message": "Assignment created successfully",
@@ -77,24 +86,29 @@ def create_assignment():
         print(f"Error creating assignment: {e}")
         return jsonify({"error": "Failed to create assignment"}), 500
 
-def generate_quiz_questions(title, description):
+@teacher_bp.route('/quiz-jobs', methods=['POST'])
+@login_required('teacher', 'admin')
+def create_quiz_job():
+    """Queue AI quiz generation; poll GET /quiz-jobs/<job_id> for the preview"""
+    data = request.get_json(silent=True) or {}
     try:
-        topic = f"{title}. {description}"
-        prompt = f"""
-        Create a quiz based on this topic: {topic}
-        Generate exactly 5 multiple-choice questions.
-        IMPORTANT: Your entire response must be a single, raw JSON object.
-        The JSON object must have a single key "questions".
-        The value of "questions" must be a list of exactly 5 question objects.
-        Each question object must have: "question", "options" (list of 4), "correct_answer".
-        """
-        ai_response = get_ai_response(prompt)
-        if ai_response and "questions" in ai_response:
-            return ai_response["questions"]
-        return None
-    except Exception as e:
-        print(f"Error generating quiz questions: {e}")
-        return None
+        topic, num_questions, audience = normalize_request(
+            data.get('topic'), data.get('num_questions', 10), data.get('audience', 'students')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    job = submit_job(topic, num_questions, audience, requested_by=get_current_claims().get('user_id'))
+    return jsonify(get_job(job['_id'])), 200 if job['status'] == 'done' else 202
+
+@teacher_bp.route('/quiz-jobs/<job_id>', methods=['GET'])
+@login_required('teacher', 'admin')
+def get_quiz_job(job_id):
+    """Job status; includes quiz_id and the questions once generation is done"""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
 
 @teacher_bp.route('/assignments', methods=['GET'])
 def get_teacher_assignments():
@@ -121,14 +135,58 @@ def get_teacher_assignments():
 @teacher_bp.route('/assignments/<assignment_id>/questions', methods=['GET'])
 def get_quiz_questions(assignment_id):
     try:
-        if assignment_id in quiz_questions_storage:
-            return jsonify({"questions": quiz_questions_storage[assignment_id]}), 200
+        questions = quiz_service.get_quiz_questions(assignment_id)
+        if questions:
+            return jsonify({"questions": questions}), 200
         else:
             return jsonify({"error": "Quiz questions not found"}), 404
     except Exception as e:
         print(f"Error fetching quiz questions: {e}")
         return jsonify({"error": "Failed to fetch quiz questions"}), 500
 
+@teacher_bp.route('/assignments/<assignment_id>/regrade', methods=['POST'])
+@login_required('teacher', 'admin')
+def regrade_quiz_submissions(assignment_id):
+    """Fix a quiz's answer key and re-grade every stored submission for it"""
+    try:
+        data = request.get_json(silent=True) or {}
+        answer_key = data.get('answer_key')
+        if not isinstance(answer_key, list):
+            return jsonify({"error": "answer_key must be a list with one entry per question (null = unchanged)"}), 400
+        
+        summary = regrade_quiz(assignment_id, answer_key)
+        return jsonify({"message": "Quiz re-graded", **summary}), 200
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error re-grading quiz: {e}")
+        return jsonify({"error": "Failed to re-grade quiz"}), 500
+
+@teacher_bp.route('/assignments/<assignment_id>/submissions/export', methods=['GET'])
+@login_required('teacher', 'admin')
+def export_assignment_submissions(assignment_id):
+    """
+    Download every submission for an assignment as one ZIP (plus manifest.csv),
+    streamed as it is built. ?student_ids=a,b,c limits it to those students.
+    """
+    try:
+        student_ids = [s for s in request.args.get('student_ids', '').split(',') if s.strip()]
+        filename, count, chunks = export_submissions(assignment_id, [s.strip() for s in student_ids] or None)
+        if not count:
+            return jsonify({"error": "No submissions found"}), 404
+    except Exception as e:
+        print(f"Error exporting submissions: {e}")
+        return jsonify({"error": "Failed to export submissions"}), 500
+
+    return Response(stream_with_context(chunks), mimetype='application/zip', headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Submission-Count': str(count),
+        # Let nginx pass chunks through as they are produced
+        'X-Accel-Buffering': 'no'
+    })
+
 @teacher_bp.route('/admin-assignments/<teacher_id>', methods=['GET'])
 def get_admin_assignments(teacher_id):
     try:
@@ -231,24 +289,28 @@ def get_all_submissions():
     """Get all student submissions organized by student"""
     try:
         # Get all students
-        students = list(users_collection.find({"role": "student"}))
+        students = list(users_collection.find({"role": "student"}, {"name": 1, "email": 1}))
         
         # Get all teacher assignments
         assignments = list(teacher_assignments_collection.find({"createdBy": "teacher"}))
         
-        # Get all submissions
-        submissions = list(submissions_collection.find())
+        # Get all assignment submissions (aptitude tests live in the same collection)
+        submissions = submissions_collection.find(
+            {"assignment_id": {"$exists": True}},
+            {"student_id": 1, "assignment_id": 1, "filename": 1, "file_path": 1,
+             "notes": 1, "submitted_at": 1, "quiz_score": 1}
+        )
         
         # Create a lookup for submissions by student_id and assignment_id
         submission_lookup = {}
         for sub in submissions:
             key = f"{sub['student_id']}_{sub['assignment_id']}"
             submission_data = {
-                "id": str(sub["_id"]),
+                "id": sub["_id"],
                 "filename": sub["filename"],
                 "file_path": sub["file_path"],
                 "notes": sub.get("notes", ""),
-                "submitted_at": sub["submitted_at"].isoformat()
+                "submitted_at": sub["submitted_at"]
             }
             
             # Include quiz score if available
@@ -257,36 +319,36 @@ def get_all_submissions():
             
             submission_lookup[key] = submission_data
         
-        # Build student data with assignment statuses
-        student_submissions = []
-        for student in students:
-            student_id = str(student["_id"])
-            student_data = {
-                "student_id": student_id,
-                "student_name": student["name"],
-                "student_email": student.get("email", ""),
-                "assignments": []
-            }
-            
-            # Check each assignment for this student
-            for assignment in assignments:
-                assignment_id = str(assignment["_id"])
-                submission_key = f"{student_id}_{assignment_id}"
-                
-                assignment_status = {
-                    "assignment_id": assignment_id,
-                    "assignment_title": assignment["title"],
-                    "assignment_type": assignment.get("type", "Assignment"),
-                    "due_date": assignment.get("dueDate", ""),
-                    "submitted": submission_key in submission_lookup,
-                    "submission": submission_lookup.get(submission_key)
+        # Build student data with assignment statuses, streamed one student at a time
+        def student_submissions():
+            for student in students:
+                student_id = str(student["_id"])
+                student_data = {
+                    "student_id": student_id,
+                    "student_name": student["name"],
+                    "student_email": student.get("email", ""),
+                    "assignments": []
                 }
                 
-                student_data["assignments"].append(assignment_status)
-            
-            student_submissions.append(student_data)
+                # Check each assignment for this student
+                for assignment in assignments:
+                    assignment_id = str(assignment["_id"])
+                    submission_key = f"{student_id}_{assignment_id}"
+                    
+                    assignment_status = {
+                        "assignment_id": assignment_id,
+                        "assignment_title": assignment["title"],
+                        "assignment_type": assignment.get("type", "Assignment"),
+                        "due_date": assignment.get("dueDate", ""),
+                        "submitted": submission_key in submission_lookup,
+                        "submission": submission_lookup.get(submission_key)
+                    }
+                    
+                    student_data["assignments"].append(assignment_status)
+                
+                yield student_data
         
-        return jsonify(student_submissions), 200
+        return stream_json_array(student_submissions())
     except Exception as e:
         print(f"Error fetching submissions: {e}")
-        return jsonify({"error": "Failed to fetch submissions"}), 500
\ No newline at end of file
+        return jsonify({"error": "Failed to fetch submissions"}), 500
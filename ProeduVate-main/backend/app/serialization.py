@@ -0,0 +1,92 @@
+# lms_portal_backend/app/serialization.py
+
+import datetime
+import decimal
+import json
+import uuid
+
+from bson import ObjectId, Decimal128
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder produces the same output, only slower
+    orjson = None
+
+# Items encoded per chunk when streaming a JSON array
+STREAM_BATCH_SIZE = 500
+
+def bson_default(o):
+    """Encode the BSON / Python types Mongo documents contain"""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, (datetime.datetime, datetime.date)):
+        return o.isoformat()
+    if isinstance(o, Decimal128):
+        return str(o.to_decimal())
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if isinstance(o, bytes):
+        return o.decode('utf-8', errors='replace')
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj):
+        """Serialize to UTF-8 JSON bytes"""
+        return orjson.dumps(obj, default=bson_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps_bytes(obj):
+        """Serialize to UTF-8 JSON bytes"""
+        return json.dumps(obj, default=bson_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class BSONJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes ObjectId/datetime directly, so routes can
+    jsonify Mongo documents without converting fields by hand first.
+    Dates are emitted as ISO 8601 strings, matching what routes used to produce.
+    """
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault('default', bson_default)
+            return json.dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+
+def iter_json_array(items, batch_size=STREAM_BATCH_SIZE):
+    """Yield a JSON array chunk by chunk without building the full string in memory"""
+    yield b'['
+    first = True
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield (b'' if first else b',') + dumps_bytes(batch)[1:-1]
+            first = False
+            batch = []
+    if batch:
+        yield (b'' if first else b',') + dumps_bytes(batch)[1:-1]
+    yield b']'
+
+def stream_json_array(items, status=200):
+    """
+    Build a streamed JSON array response from any iterable (e.g. a pymongo cursor).
+    Errors raised while iterating can no longer change the status code, so callers
+    should validate input before returning this.
+    """
+    from flask import Response
+    return Response(iter_json_array(items), status=status, mimetype='application/json')
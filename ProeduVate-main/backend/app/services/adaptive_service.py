@@ -0,0 +1,158 @@
+# adaptive_service.py - Elo-style mastery tracking and adaptive test assembly
+#
+# Every student has an ability rating per topic and every bank question a
+# difficulty rating on the same scale. After each graded test both move by the
+# usual Elo rule: rating += K * (actual - expected), with
+#   expected = 1 / (1 + 10 ** ((question_rating - student_rating) / 400))
+# A test is one rating event for the student, so their K * surprise terms are
+# summed and divided by sqrt(number of questions): a 50-question test moves the
+# rating about 7x one question's worth, not 50x, whatever the test length.
+#
+# Mastery is one small document per student, storing each topic's rating as an
+# offset from DEFAULT_RATING so concurrent submits can apply it with $inc:
+#   {_id: student_id, topics: {<topic key>: {offset, tests}}}
+#
+# Tests are assembled with range queries on the (topic, rating) index, so picking
+# questions costs O(log n) index seeks per difficulty band, not a scan of the bank.
+
+import math
+import os
+import random
+from datetime import datetime
+from pymongo import UpdateOne
+from ..database import aptitude_mastery_collection, aptitude_questions_collection, submissions_collection
+from .aptitude_stats import topic_key, topic_name
+from .aptitude_storage import DEFAULT_RATING
+
+ADAPTIVE_STUDENT_K = float(os.getenv('ADAPTIVE_STUDENT_K', 8))
+ADAPTIVE_QUESTION_K = float(os.getenv('ADAPTIVE_QUESTION_K', 4))
+
+# The first few tests in a topic move the rating faster, so new students converge quickly
+PROVISIONAL_TESTS = 3
+
+# Share of a test drawn from each band around the student's rating: slightly
+# easier, on target, slightly harder
+DIFFICULTY_BANDS = ((-300, -100, 0.25), (-100, 100, 0.5), (100, 300, 0.25))
+
+# Questions from this many recent submissions are not repeated
+RECENT_TESTS_EXCLUDED = 5
+
+def expected_score(student_rating, question_rating):
+    return 1 / (1 + 10 ** ((question_rating - student_rating) / 400))
+
+def rating_to_difficulty(rating):
+    """Difficulty label the question generator understands, for a given rating"""
+    if rating < 1100:
+        return 'easy'
+    if rating < 1300:
+        return 'medium'
+    return 'hard'
+
+def get_rating(student_id, topic):
+    """(rating, tests taken) for one student and topic"""
+    key = topic_key(topic)
+    doc = aptitude_mastery_collection.find_one({'_id': student_id}, {f'topics.{key}': 1}) or {}
+    entry = doc.get('topics', {}).get(key, {})
+    return DEFAULT_RATING + entry.get('offset', 0), entry.get('tests', 0)
+
+def get_mastery(student_id):
+    """Every topic rating for a student, keyed by topic name"""
+    doc = aptitude_mastery_collection.find_one({'_id': student_id}) or {}
+    return {
+        topic_name(key): {
+            'rating': round(DEFAULT_RATING + entry.get('offset', 0)),
+            'tests': entry.get('tests', 0),
+            'level': rating_to_difficulty(DEFAULT_RATING + entry.get('offset', 0))
+        }
+        for key, entry in doc.get('topics', {}).items()
+    }
+
+def update_mastery(student_id, topic, questions, correct_flags):
+    """
+    Apply one graded test to the student's rating and to each question's rating.
+
+    Args:
+        questions: bank documents (need `_id` and `rating`), in test order
+        correct_flags: True/False per question; unanswered counts as incorrect
+
+    Returns:
+        (new_rating, change)
+    """
+    rating, tests = get_rating(student_id, topic)
+    k = ADAPTIVE_STUDENT_K * (2 if tests < PROVISIONAL_TESTS else 1)
+
+    total_surprise = 0.0
+    question_updates = []
+    for question, correct in zip(questions, correct_flags):
+        question_rating = question.get('rating', DEFAULT_RATING)
+        surprise = (1.0 if correct else 0.0) - expected_score(rating, question_rating)
+        total_surprise += surprise
+        question_updates.append(UpdateOne(
+            {'_id': question['_id']},
+            {'$inc': {'rating': -ADAPTIVE_QUESTION_K * surprise, 'attempts': 1}}
+        ))
+    student_change = k * total_surprise / math.sqrt(len(question_updates)) if question_updates else 0.0
+
+    key = topic_key(topic)
+    aptitude_mastery_collection.update_one(
+        {'_id': student_id},
+        {
+            '$inc': {f'topics.{key}.offset': student_change, f'topics.{key}.tests': 1},
+            '$set': {'updated_at': datetime.utcnow()}
+        },
+        upsert=True
+    )
+    if question_updates:
+        aptitude_questions_collection.bulk_write(question_updates, ordered=False)
+
+    return rating + student_change, student_change
+
+def _recently_seen(student_id):
+    seen = set()
+    recent = submissions_collection.find(
+        {'student_id': student_id, 'type': 'aptitude'}, {'_id': 0, 'question_ids': 1}
+    ).sort('submitted_at', -1).limit(RECENT_TESTS_EXCLUDED)
+    for submission in recent:
+        seen.update(submission.get('question_ids') or [])
+    return seen
+
+def select_questions(student_id, topic, count, target=None):
+    """
+    Pick up to `count` bank questions around the student's rating.
+
+    Returns:
+        (questions, target_rating); fewer than `count` questions means the bank
+        doesn't have enough for this topic yet and the caller should generate more
+    """
+    if target is None:
+        target, _ = get_rating(student_id, topic)
+    exclude = _recently_seen(student_id)
+    rng = random.Random()
+    chosen = {}
+
+    def take(query, limit, sort=None):
+        if limit <= 0:
+            return []
+        query = dict(query, topic=topic, _id={'$nin': list(exclude | set(chosen))})
+        cursor = aptitude_questions_collection.find(query)
+        if sort:
+            cursor = cursor.sort(*sort)
+        return list(cursor.limit(limit))
+
+    for low, high, share in DIFFICULTY_BANDS:
+        wanted = round(count * share)
+        band = take({'rating': {'$gte': target + low, '$lt': target + high}}, wanted * 4)
+        for question in rng.sample(band, min(wanted, len(band))):
+            chosen[question['_id']] = question
+
+    # Fill gaps from the nearest ratings on either side of the target
+    missing = count - len(chosen)
+    if missing > 0:
+        above = take({'rating': {'$gte': target}}, missing, ('rating', 1))
+        below = take({'rating': {'$lt': target}}, missing, ('rating', -1))
+        nearest = sorted(above + below, key=lambda q: abs(q.get('rating', DEFAULT_RATING) - target))
+        for question in nearest[:missing]:
+            chosen[question['_id']] = question
+
+    questions = sorted(chosen.values(), key=lambda q: q.get('rating', DEFAULT_RATING))
+    return questions, target
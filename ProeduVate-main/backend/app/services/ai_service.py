@@ -1,22 +1,24 @@
 # lms_portal_backend/app/services/ai_service.py
 
-import json
-import fitz  # PyMuPDF
 import os
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
+import threading
 from dotenv import load_dotenv
+from .prompt_builder import compact_resume, estimate_tokens, record_prompt_size
+from .structured_output import SCHEMAS, gemini_schema, request_json
+from ..instrumentation import track_call
 
 # Load environment variables
 load_dotenv()
 
-# Configure Google Gemini
+# Google Gemini is configured on first use (see get_genai) to keep cold starts fast
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
 if not GOOGLE_API_KEY:
     print("Warning: GOOGLE_API_KEY not found in .env file.")
-else:
-    genai.configure(api_key=GOOGLE_API_KEY)
+
+# Ask Gemini for JSON mode (and the call site's response schema) on JSON calls.
+# SDKs or models that reject it are remembered and asked with the prompt alone.
+AI_JSON_MODE = os.getenv('AI_JSON_MODE', 'true').lower() == 'true'
 
 # List of models to try, in order of preference.
 MODEL_CANDIDATES = [
@@ -26,23 +28,84 @@ MODEL_CANDIDATES = [
     'models/gemini-pro-latest'
 ]
 
-# Configure safety settings to prevent blocking harmless educational content
-SAFETY_SETTINGS = {
-    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-}
+_genai = None
+_safety_settings = None
+_genai_lock = threading.Lock()
+_json_mode_unsupported = set()  # model names, or '*' when the installed SDK lacks JSON mode
 
-def get_working_model_response(prompt, is_json=False):
+def get_genai():
+    """
+    Import and configure the Gemini SDK on first use.
+    The SDK takes seconds to import, so routes that never call the AI don't pay for it.
+    """
+    global _genai, _safety_settings
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                from google.generativeai.types import HarmCategory, HarmBlockThreshold
+
+                if GOOGLE_API_KEY:
+                    genai.configure(api_key=GOOGLE_API_KEY)
+
+                # Configure safety settings to prevent blocking harmless educational content
+                _safety_settings = {
+                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+                }
+                _genai = genai
+    return _genai
+
+def _json_generation_config(model_name, schema_name):
+    if not AI_JSON_MODE or '*' in _json_mode_unsupported or model_name in _json_mode_unsupported:
+        return None
+    config = {'response_mime_type': 'application/json'}
+    if schema_name in SCHEMAS:
+        config['response_schema'] = gemini_schema(SCHEMAS[schema_name])
+    return config
+
+def _rejects_json_mode(error):
+    message = str(error)
+    return 'response_mime_type' in message or 'response_schema' in message or 'Unknown field' in message
+
+def _generate(model, model_name, prompt, generation_config):
+    """One generate_content call, retried without JSON mode if the SDK or model rejects it"""
+    kwargs = {'safety_settings': _safety_settings}
+    if generation_config:
+        kwargs['generation_config'] = generation_config
+    try:
+        with track_call('llm', model_name) as call:
+            response = model.generate_content(prompt, **kwargs)
+            usage = getattr(response, 'usage_metadata', None)
+            call.tokens = getattr(usage, 'total_token_count', 0) or (
+                estimate_tokens(prompt) + estimate_tokens(response.text)
+            )
+        return response
+    except Exception as e:
+        if not (generation_config and _rejects_json_mode(e)):
+            raise
+        if isinstance(e, (TypeError, ValueError, KeyError)):
+            # Raised before any request is made: the installed SDK has no JSON mode
+            print(f"JSON mode not supported by the installed SDK ({e}); using prompt instructions only")
+            _json_mode_unsupported.add('*')
+        else:
+            print(f"Model '{model_name}' rejected JSON mode; using prompt instructions only")
+            _json_mode_unsupported.add(model_name)
+    return _generate(model, model_name, prompt, None)
+
+def get_working_model_response(prompt, is_json=False, schema_name=None):
     """
     Tries to get a response from the available models.
     If the top model fails (404), it falls back to the next one automatically.
+    JSON calls use the model's JSON mode, with schema_name's response schema, where available.
     """
     if not GOOGLE_API_KEY:
         return None if is_json else "Error: AI service is not configured (Missing API Key)."
 
     last_error = None
+    genai = get_genai()
 
     for model_name in MODEL_CANDIDATES:
         try:
@@ -54,10 +117,8 @@ def get_working_model_response(prompt, is_json=False):
                 full_prompt += "\n\nIMPORTANT: Output ONLY a raw JSON object. Do not include markdown formatting like ```json."
 
             # Generate content with safety settings applied
-            response = model.generate_content(
-                full_prompt, 
-                safety_settings=SAFETY_SETTINGS
-            )
+            generation_config = _json_generation_config(model_name, schema_name) if is_json else None
+            response = _generate(model, model_name, full_prompt, generation_config)
             
             return response.text  # If successful, return text immediately
             
@@ -80,6 +141,7 @@ def get_working_model_response(prompt, is_json=False):
 def extract_text_from_pdf(pdf_path):
     """Extracts text content from a given PDF file."""
     try:
+        import fitz  # PyMuPDF, imported lazily since only resume routes need it
         doc = fitz.open(pdf_path)
         text = ""
         for page in doc:
@@ -89,32 +151,24 @@ def extract_text_from_pdf(pdf_path):
         print(f"Error reading PDF file: {e}")
         return None
 
-def get_ai_response(prompt):
+def get_ai_response(prompt, schema=None, call_site=None, expected=None):
     """
     Generic function to get a JSON response from the Google Gemini API.
     Used for structured data like Quizzes and ATS analysis.
-    """
-    response_text = get_working_model_response(prompt, is_json=True)
-
-    if not response_text:
-        return None
-
-    # Clean up the response if Gemini adds markdown formatting
-    cleaned_text = response_text
-    if "```json" in response_text:
-        start = response_text.find("```json") + 7
-        end = response_text.rfind("```")
-        cleaned_text = response_text[start:end].strip()
-    elif "```" in response_text:
-        start = response_text.find("```") + 3
-        end = response_text.rfind("```")
-        cleaned_text = response_text[start:end].strip()
 
-    try:
-        return json.loads(cleaned_text)
-    except json.JSONDecodeError as e:
-        print(f"Failed to parse JSON response: {e}")
-        return None
+    Args:
+        schema: name in structured_output.SCHEMAS the answer must match; invalid
+            list items are dropped and missing parts are asked for again
+        call_site: label for the parse metrics (defaults to the schema name)
+        expected: {list key: item count} the prompt asked for
+    Returns:
+        The parsed (and conformed) JSON, or None if no usable answer came back
+    """
+    response_text = get_working_model_response(prompt, is_json=True, schema_name=schema)
+    return request_json(
+        prompt, response_text, schema_name=schema, call_site=call_site, expected=expected,
+        ask=lambda reask_prompt: get_working_model_response(reask_prompt, is_json=True, schema_name=schema)
+    )
 
 def get_general_chat_response(user_prompt):
     """Gets a conversational, plain-text response from Google Gemini."""
@@ -171,7 +225,8 @@ def get_ats_analysis(resume_text, job_description):
     
     Resume Text:
     ---
-    {resume_text}
+    {compact_resume(resume_text)}
     ---
     """
-    return get_ai_response(prompt)
\ No newline at end of file
+    record_prompt_size('ats_analysis', prompt)
+    return get_ai_response(prompt, schema='ats', call_site='ats_analysis')
\ No newline at end of file
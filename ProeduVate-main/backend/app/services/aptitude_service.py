@@ -1,33 +1,45 @@
 # aptitude_service.py
+import os
 import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from .ai_service import get_ai_response
 from .aptitude_config import APTITUDE_TOPICS, SAMPLE_QUESTIONS, VIDEO_RESOURCES
 
-def generate_aptitude_questions(topic, difficulty="medium", num_questions=50):
-    """Generate aptitude questions using AI based on topic and difficulty"""
-    
-    print(f"[DEBUG] generate_aptitude_questions called with topic: '{topic}'")
-    print(f"[DEBUG] Available topics: {list(APTITUDE_TOPICS.keys())}")
-    
-    # Normalize topic name for matching
-    matched_topic = None
+# Large tests are generated as parallel shards of this many questions, so the
+# whole test takes about as long as one shard and arrives shard by shard
+APTITUDE_SHARD_SIZE = int(os.getenv('APTITUDE_SHARD_SIZE', 10))
+APTITUDE_SHARD_WORKERS = int(os.getenv('APTITUDE_SHARD_WORKERS', 8))
+
+# One per shard, so parallel shards don't all write the same textbook questions
+SHARD_FOCUSES = [
+    "direct application of the core formulas and definitions",
+    "word problems set in everyday situations (shopping, travel, work)",
+    "multi-step problems that combine two or more concepts",
+    "tricky cases, edge cases and common mistakes students make",
+    "comparison and data-interpretation style questions",
+    "questions best solved with shortcuts and mental math",
+    "reverse problems where the answer is given and an input must be found",
+    "questions in the style of campus placement and competitive exams"
+]
+
+def match_topic(topic):
+    """Canonical APTITUDE_TOPICS name for a case-insensitive topic, or None"""
     for key in APTITUDE_TOPICS.keys():
-        if key.lower() == topic.lower():
-            matched_topic = key
-            print(f"[DEBUG] Matched topic '{topic}' to '{matched_topic}'")
-            break
-    
-    if not matched_topic:
-        print(f"[ERROR] Topic '{topic}' not found in APTITUDE_TOPICS")
-        print(f"[ERROR] Available topics: {list(APTITUDE_TOPICS.keys())}")
-        return None
-    
-    prompt = f"""
-    Generate {num_questions} multiple-choice aptitude questions on the topic: {matched_topic}.
+        if key.lower() == (topic or '').lower():
+            return key
+    return None
+
+def _aptitude_prompt(topic, difficulty, num_questions, focus=None):
+    focus_line = f"Focus on {focus}." if focus else ""
+    return f"""
+    Generate {num_questions} multiple-choice aptitude questions on the topic: {topic}.
     
     Difficulty level: {difficulty}
+    {focus_line}
     
-    Each question should be unique and test different aspects of {matched_topic}.
+    Each question should be unique and test different aspects of {topic}.
     
     Return a JSON object with this exact structure:
     {{
@@ -49,29 +61,106 @@ def generate_aptitude_questions(topic, difficulty="medium", num_questions=50):
     IMPORTANT: Do NOT use markdown formatting like ** for bold or * for italics.
     Use plain text only. The text should be readable without any markdown syntax.
     """
-    
-    result = get_ai_response(prompt)
+
+def _generate_shard(topic, difficulty, num_questions, focus=None):
+    result = get_ai_response(_aptitude_prompt(topic, difficulty, num_questions, focus),
+                             schema='aptitude_questions', call_site='aptitude_questions',
+                             expected={'questions': num_questions})
     
     # Post-process to remove any markdown formatting
     if result and isinstance(result, dict):
         result = _remove_markdown_formatting(result)
     
-    return result
+    return (result or {}).get('questions', [])
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """Thread pool for shards, recreated after a fork"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=max(1, APTITUDE_SHARD_WORKERS),
+                                           thread_name_prefix='aptitude-shard')
+            _executor_pid = os.getpid()
+        return _executor
+
+def _question_marker(question):
+    return re.sub(r'[^a-z0-9]+', ' ', str(question.get('question', '')).lower()).strip()
+
+def shard_sizes(num_questions, shard_size=None):
+    shard_size = max(1, shard_size or APTITUDE_SHARD_SIZE)
+    sizes = [shard_size] * (num_questions // shard_size)
+    if num_questions % shard_size:
+        sizes.append(num_questions % shard_size)
+    return sizes
+
+def iter_aptitude_questions(topic, difficulty="medium", num_questions=50):
+    """
+    Generate questions in parallel shards, each with its own sub-focus.
+
+    Yields:
+        lists of new questions, in the order shards finish, with questions already
+        yielded by an earlier shard removed; at most num_questions in total.
+        Nothing is yielded for an unknown topic or if every shard fails.
+    """
+    matched_topic = match_topic(topic)
+    if not matched_topic:
+        print(f"[ERROR] Topic '{topic}' not found in APTITUDE_TOPICS")
+        print(f"[ERROR] Available topics: {list(APTITUDE_TOPICS.keys())}")
+        return
+    
+    sizes = shard_sizes(num_questions)
+    focuses = random.sample(SHARD_FOCUSES, len(SHARD_FOCUSES))
+    executor = _get_executor()
+    futures = [
+        executor.submit(_generate_shard, matched_topic, difficulty, size,
+                        focuses[i % len(focuses)] if len(sizes) > 1 else None)
+        for i, size in enumerate(sizes)
+    ]
+    seen = set()
+    remaining = num_questions
+    try:
+        for future in as_completed(futures):
+            try:
+                questions = future.result()
+            except Exception as e:
+                print(f"Aptitude shard failed: {e}")
+                continue
+            fresh = []
+            for question in questions:
+                marker = _question_marker(question)
+                if marker and marker not in seen:
+                    seen.add(marker)
+                    fresh.append(question)
+            fresh = fresh[:remaining]
+            remaining -= len(fresh)
+            if fresh:
+                yield fresh
+            if remaining <= 0:
+                break
+    finally:
+        # The client went away or we have enough: don't start shards nobody will read
+        for future in futures:
+            future.cancel()
+    
+    if remaining > 0:
+        print(f"Aptitude generation for '{matched_topic}' came back {remaining} of {num_questions} questions short")
+
+def generate_aptitude_questions(topic, difficulty="medium", num_questions=50):
+    """Generate aptitude questions using AI based on topic and difficulty"""
+    if not match_topic(topic):
+        print(f"[ERROR] Topic '{topic}' not found in APTITUDE_TOPICS")
+        return None
+    questions = [q for shard in iter_aptitude_questions(topic, difficulty, num_questions) for q in shard]
+    return {'questions': questions} if questions else None
 
 def generate_practice_questions(topic, num_questions=10):
     """Generate practice questions with detailed solutions"""
     
-    print(f"[DEBUG] generate_practice_questions called with topic: '{topic}'")
-    print(f"[DEBUG] Available topics: {list(APTITUDE_TOPICS.keys())}")
-    
-    # Normalize topic name for matching
-    matched_topic = None
-    for key in APTITUDE_TOPICS.keys():
-        if key.lower() == topic.lower():
-            matched_topic = key
-            print(f"[DEBUG] Matched topic '{topic}' to '{matched_topic}'")
-            break
-    
+    matched_topic = match_topic(topic)
     if not matched_topic:
         print(f"[ERROR] Topic '{topic}' not found in APTITUDE_TOPICS")
         print(f"[ERROR] Available topics: {list(APTITUDE_TOPICS.keys())}")
@@ -100,7 +189,8 @@ def generate_practice_questions(topic, num_questions=10):
     Use plain text only. The text should be readable without any markdown syntax.
     """
     
-    result = get_ai_response(prompt)
+    result = get_ai_response(prompt, schema='practice_questions', call_site='practice_questions',
+                             expected={'practice_questions': num_questions})
     
     # Post-process to remove any markdown formatting
     if result and isinstance(result, dict):
@@ -157,6 +247,13 @@ def evaluate_aptitude_test(questions, user_answers):
         "performance": get_performance_analysis(score)
     }
 
+def public_questions(questions):
+    """Questions as sent to the student: the answer key, explanations and bank fields stay on the server"""
+    return [
+        {key: q[key] for key in ('question', 'options', 'difficulty') if key in q}
+        for q in questions
+    ]
+
 def get_performance_analysis(score):
     """Provide performance analysis based on score"""
     if score >= 90:
@@ -193,17 +290,7 @@ def get_performance_analysis(score):
 def get_topic_concepts(topic):
     """Get learning concepts and tricks for a topic"""
     
-    print(f"[DEBUG] get_topic_concepts called with topic: '{topic}'")
-    print(f"[DEBUG] Available topics: {list(APTITUDE_TOPICS.keys())}")
-    
-    # Normalize topic name for matching
-    matched_topic = None
-    for key in APTITUDE_TOPICS.keys():
-        if key.lower() == topic.lower():
-            matched_topic = key
-            print(f"[DEBUG] Matched topic '{topic}' to '{matched_topic}'")
-            break
-    
+    matched_topic = match_topic(topic)
     if not matched_topic:
         print(f"[ERROR] Topic '{topic}' not found in APTITUDE_TOPICS")
         print(f"[ERROR] Available topics: {list(APTITUDE_TOPICS.keys())}")
@@ -240,7 +327,7 @@ def get_topic_concepts(topic):
     Use plain text only. The text should be readable without any markdown syntax.
     """
     
-    result = get_ai_response(prompt)
+    result = get_ai_response(prompt, schema='topic_concepts', call_site='topic_concepts')
     
     # Post-process to remove any markdown formatting that might still appear
     if result and isinstance(result, dict):
@@ -0,0 +1,118 @@
+# aptitude_stats.py - Per-student aptitude statistics
+#
+# One aptitude_stats document per student, updated with $inc/$max on every submit,
+# so the progress endpoint reads a single document instead of every submission:
+#
+#   {_id: student_id, total_tests, total_score, best_score, complete,
+#    topics: {<topic key>: {attempts, total_score, best_score}}}
+#
+# Students whose submissions predate the stats document are backfilled from an
+# aggregation over their submissions on the first progress request.
+
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+from ..database import submissions_collection, aptitude_stats_collection
+
+def topic_key(topic):
+    """Topics are user-supplied; escape the characters Mongo field names can't hold"""
+    return topic.replace('%', '%25').replace('.', '%2E').replace('$', '%24')
+
+def topic_name(key):
+    return key.replace('%24', '$').replace('%2E', '.').replace('%25', '%')
+
+def record_attempt(student_id, topic, score):
+    """Fold one graded test into the student's stats document"""
+    key = topic_key(topic)
+    result = aptitude_stats_collection.update_one(
+        {'_id': student_id},
+        {
+            '$inc': {
+                'total_tests': 1,
+                'total_score': score,
+                f'topics.{key}.attempts': 1,
+                f'topics.{key}.total_score': score
+            },
+            '$max': {'best_score': score, f'topics.{key}.best_score': score},
+            '$set': {'updated_at': datetime.utcnow()}
+        },
+        upsert=True
+    )
+    if result.upserted_id is not None:
+        # A new document is only complete if this is the student's first attempt
+        first = submissions_collection.count_documents(
+            {'student_id': student_id, 'type': 'aptitude'}, limit=2
+        ) <= 1
+        if first:
+            aptitude_stats_collection.update_one({'_id': student_id}, {'$set': {'complete': True}})
+
+def aggregate_stats(student_id):
+    """Compute the stats document from the student's submissions in Mongo"""
+    pipeline = [
+        {'$match': {'student_id': student_id, 'type': 'aptitude'}},
+        {'$project': {'_id': 0, 'topic': 1, 'score': 1}},
+        {'$group': {
+            '_id': '$topic',
+            'attempts': {'$sum': 1},
+            'total_score': {'$sum': '$score'},
+            'best_score': {'$max': '$score'}
+        }}
+    ]
+    topics = {}
+    for row in submissions_collection.aggregate(pipeline):
+        topics[topic_key(row['_id'] or '')] = {
+            'attempts': row['attempts'],
+            'total_score': row['total_score'],
+            'best_score': row['best_score']
+        }
+    return {
+        '_id': student_id,
+        'total_tests': sum(t['attempts'] for t in topics.values()),
+        'total_score': sum(t['total_score'] for t in topics.values()),
+        'best_score': max((t['best_score'] for t in topics.values()), default=0),
+        'topics': topics,
+        'complete': True,
+        'updated_at': datetime.utcnow()
+    }
+
+def get_student_stats(student_id):
+    """The stats document, backfilling it from submissions if it is missing or partial"""
+    stats = aptitude_stats_collection.find_one({'_id': student_id})
+    if stats and stats.get('complete'):
+        return stats
+
+    fresh = aggregate_stats(student_id)
+    if not fresh['total_tests']:
+        return fresh
+
+    if stats is None:
+        try:
+            aptitude_stats_collection.insert_one(fresh)
+        except DuplicateKeyError:
+            pass  # a concurrent submit or request created it; the next read picks it up
+    else:
+        # Only replace if no submit landed between the read and the aggregation
+        aptitude_stats_collection.replace_one(
+            {'_id': student_id, 'total_tests': stats.get('total_tests', 0)}, fresh
+        )
+    return fresh
+
+def format_statistics(stats):
+    """Shape a stats document the way the progress endpoint has always returned it"""
+    total_tests = stats.get('total_tests', 0)
+    if not total_tests:
+        return {'total_tests': 0, 'average_score': 0, 'best_score': 0, 'topic_performance': {}}
+
+    return {
+        'total_tests': total_tests,
+        'average_score': round(stats['total_score'] / total_tests, 2),
+        'best_score': round(stats['best_score'], 2),
+        'topic_performance': {
+            topic_name(key): {
+                'avg_score': topic['total_score'] / topic['attempts'],
+                'attempts': topic['attempts'],
+                'best_score': topic['best_score']
+            }
+            for key, topic in stats.get('topics', {}).items()
+            if topic.get('attempts')
+        }
+    }
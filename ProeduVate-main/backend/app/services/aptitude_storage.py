@@ -0,0 +1,103 @@
+# aptitude_storage.py - Compact storage for aptitude tests and submissions
+#
+# Question text lives once in the aptitude_questions bank, keyed by a content hash.
+# Tests and submissions reference questions by id; a submission stores the chosen
+# option per question as one byte and correctness as a bitset:
+#
+#   question_ids: ["3f9a...", ...]
+#   choices:      Binary, byte i = option index chosen for question i (0xFF = unanswered)
+#   correct:      Binary, bit i (little-endian within each byte) set if question i was right
+
+import hashlib
+import os
+from bson import Binary
+from pymongo import UpdateOne
+from ..database import aptitude_questions_collection
+
+UNANSWERED = 0xFF
+
+# Starting Elo-style difficulty rating for bank questions, by the label the model gave them
+DEFAULT_RATING = 1200
+DIFFICULTY_RATINGS = {'easy': 1000, 'medium': 1200, 'hard': 1400}
+
+# Entries kept in users.aptitude_history; older ones are dropped by $slice on push
+APTITUDE_HISTORY_LIMIT = int(os.getenv('APTITUDE_HISTORY_LIMIT', 50))
+
+def question_id(question):
+    """Stable id from the question content, so identical questions share one bank entry"""
+    key = "\x1f".join([question.get('question') or '', *(question.get('options') or []),
+                       question.get('correct_answer') or ''])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:24]
+
+def initial_rating(difficulty):
+    return DIFFICULTY_RATINGS.get((difficulty or '').lower(), DEFAULT_RATING)
+
+def store_questions(questions, topic=None, rating=None):
+    """
+    Upsert questions into the bank and return their ids in order.
+    New questions start at `rating`, or at the rating for their difficulty label.
+    """
+    ids = []
+    operations = []
+    for q in questions:
+        qid = question_id(q)
+        ids.append(qid)
+        operations.append(UpdateOne({'_id': qid}, {'$setOnInsert': {
+            'topic': topic,
+            'question': q.get('question'),
+            'options': q.get('options') or [],
+            'correct_answer': q.get('correct_answer'),
+            'explanation': q.get('explanation'),
+            'difficulty': q.get('difficulty'),
+            'rating': rating if rating is not None else initial_rating(q.get('difficulty')),
+            'attempts': 0
+        }}, upsert=True))
+    if operations:
+        aptitude_questions_collection.bulk_write(operations, ordered=False)
+    return ids
+
+def load_questions(ids):
+    """Fetch bank questions in the order of ids (missing ids are skipped)"""
+    by_id = {q['_id']: q for q in aptitude_questions_collection.find({'_id': {'$in': list(set(ids))}})}
+    return [by_id[qid] for qid in ids if qid in by_id]
+
+def pack_choices(indexes):
+    return Binary(bytes(UNANSWERED if i is None or i < 0 or i >= UNANSWERED else i for i in indexes))
+
+def unpack_choices(blob, count=None):
+    values = [None if b == UNANSWERED else b for b in bytes(blob or b'')]
+    return values if count is None else values[:count]
+
+def pack_bits(flags):
+    flags = list(flags)
+    value = 0
+    for i, flag in enumerate(flags):
+        if flag:
+            value |= 1 << i
+    return Binary(value.to_bytes((len(flags) + 7) // 8, 'little'))
+
+def unpack_bits(blob, count):
+    value = int.from_bytes(bytes(blob or b''), 'little')
+    return [bool(value >> i & 1) for i in range(count)]
+
+def compact_submission_fields(question_ids, evaluation):
+    """The per-question part of a submission, built from evaluate_aptitude_test output"""
+    choices = []
+    correct = []
+    for result in evaluation['results']:
+        options = result.get('options') or []
+        answer = result.get('user_answer')
+        choices.append(options.index(answer) if answer in options else None)
+        correct.append(result['status'] == 'correct')
+    return {
+        'question_ids': question_ids,
+        'choices': pack_choices(choices),
+        'correct': pack_bits(correct)
+    }
+
+def history_push(topic, score, date):
+    """$push clause appending to aptitude_history while keeping only the newest entries"""
+    return {'aptitude_history': {
+        '$each': [{'topic': topic, 'score': score, 'date': date}],
+        '$slice': -APTITUDE_HISTORY_LIMIT
+    }}
@@ -0,0 +1,188 @@
+# export_service.py - Streamed ZIP export of assignment submissions
+#
+# The archive is produced while it is being sent: each file is read from storage
+# in 1 MB chunks and written through zipfile into a buffer that is emptied after
+# every chunk. Nothing is staged in a temp file, and memory stays at a few MB
+# whatever the archive size (only the per-submission manifest rows are kept).
+# zipfile writes to a non-seekable stream with data descriptors and Zip64 as
+# needed, so archives over 4 GB or with over 65535 entries are fine.
+#
+# Layout:
+#   <student name>_<student id>/<filename>   one folder per student
+#   manifest.csv                             one row per submission, incl. missing files
+
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from bson import ObjectId
+from ..database import submissions_collection, users_collection, teacher_assignments_collection
+from .storage_service import get_storage
+from .upload_service import object_key
+
+CHUNK_SIZE = 1024 * 1024
+
+# Already compressed: deflating them again costs CPU for ~0% gain
+STORED_EXTENSIONS = {'pdf', 'zip', 'rar', 'docx', 'pptx', 'xlsx', 'png', 'jpg', 'jpeg', 'gif', 'mp4'}
+
+MANIFEST_FIELDS = [
+    'student_id', 'student_name', 'student_email', 'filename', 'archive_path', 'status',
+    'submitted_at', 'file_size', 'file_sha256', 'quiz_score', 'notes'
+]
+
+class _ChunkBuffer:
+    """Write-only, non-seekable sink for zipfile; take() hands over what was written"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+def _zip_info(arcname, when, size):
+    info = zipfile.ZipInfo(arcname, (when or datetime.now()).timetuple()[:6])
+    extension = arcname.rsplit('.', 1)[-1].lower() if '.' in arcname else ''
+    info.compress_type = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+    info.file_size = size or 0
+    return info
+
+def stream_zip(entries):
+    """
+    Yield a ZIP archive as byte chunks.
+
+    Args:
+        entries: iterable of (arcname, file object, size or None, datetime or None),
+            or (arcname, bytes, None, datetime) for small generated files.
+            File objects are closed once written.
+    """
+    sink = _ChunkBuffer()
+    archive = zipfile.ZipFile(sink, 'w', allowZip64=True)
+    for arcname, source, size, when in entries:
+        info = _zip_info(arcname, when, size)
+        if isinstance(source, bytes):
+            archive.writestr(info, source)
+        else:
+            try:
+                with archive.open(info, 'w', force_zip64=size is None) as target:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                        target.write(chunk)
+                        data = sink.take()
+                        if data:
+                            yield data
+            finally:
+                source.close()
+        yield sink.take()
+    archive.close()
+    yield sink.take()
+
+def storage_key(submission):
+    """Where a submission's file is stored, for both content-addressed and legacy records"""
+    if submission.get('file_sha256'):
+        return object_key(submission['file_sha256'])
+    path = submission.get('file_path') or ''
+    prefix = '/uploads/submissions/'
+    if path.startswith(prefix):
+        return 'resumes/submissions/' + path[len(prefix):]
+    return None
+
+def _safe_name(value):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', str(value or '')).strip('_') or 'unknown'
+
+def export_filename(assignment_id):
+    assignment = None
+    try:
+        assignment = teacher_assignments_collection.find_one({'_id': ObjectId(assignment_id)}, {'title': 1})
+    except Exception:
+        pass
+    title = (assignment or {}).get('title') or assignment_id
+    return f"{_safe_name(title)}_submissions.zip"
+
+def find_submissions(assignment_id, student_ids=None):
+    """Submission metadata (no file bytes) for the export, oldest first"""
+    query = {'assignment_id': assignment_id, 'file_path': {'$exists': True}}
+    if student_ids:
+        query['student_id'] = {'$in': list(student_ids)}
+    projection = {'student_id': 1, 'filename': 1, 'file_path': 1, 'file_sha256': 1, 'file_size': 1,
+                  'submitted_at': 1, 'quiz_score': 1, 'notes': 1}
+    return list(submissions_collection.find(query, projection).sort('submitted_at', 1))
+
+def _students(student_ids):
+    object_ids = []
+    for sid in set(student_ids):
+        try:
+            object_ids.append(ObjectId(sid))
+        except Exception:
+            continue
+    return {
+        str(u['_id']): u
+        for u in users_collection.find({'_id': {'$in': object_ids}}, {'name': 1, 'email': 1})
+    }
+
+def submission_entries(submissions):
+    """ZIP entries for each submission's file, then manifest.csv describing them all"""
+    storage = get_storage()
+    students = _students(s.get('student_id') for s in submissions)
+    used_names = set()
+    rows = []
+
+    for submission in submissions:
+        student_id = submission.get('student_id')
+        student = students.get(student_id, {})
+        filename = submission.get('filename') or 'submission'
+        arcname = f"{_safe_name(student.get('name'))}_{_safe_name(student_id)}/{_safe_name(filename)}"
+        base, dot, ext = arcname.rpartition('.')
+        n = 1
+        while arcname in used_names:
+            n += 1
+            arcname = f"{base} ({n}).{ext}" if dot else f"{ext} ({n})"
+        used_names.add(arcname)
+
+        key = storage_key(submission)
+        source = None
+        status = 'missing'
+        if key:
+            try:
+                source = storage.open(key)
+                status = 'included'
+            except Exception as e:
+                print(f"Export: could not open {key}: {e}")
+
+        rows.append({
+            'student_id': student_id,
+            'student_name': student.get('name', ''),
+            'student_email': student.get('email', ''),
+            'filename': filename,
+            'archive_path': arcname if source else '',
+            'status': status,
+            'submitted_at': submission['submitted_at'].isoformat() if submission.get('submitted_at') else '',
+            'file_size': submission.get('file_size', ''),
+            'file_sha256': submission.get('file_sha256', ''),
+            'quiz_score': submission.get('quiz_score', ''),
+            'notes': submission.get('notes', '')
+        })
+        if source:
+            yield arcname, source, submission.get('file_size'), submission.get('submitted_at')
+
+    manifest = io.StringIO()
+    writer = csv.DictWriter(manifest, fieldnames=MANIFEST_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    yield 'manifest.csv', manifest.getvalue().encode('utf-8-sig'), None, None
+
+def export_submissions(assignment_id, student_ids=None):
+    """
+    Returns:
+        (zip filename, number of submissions, generator of ZIP bytes)
+    """
+    submissions = find_submissions(assignment_id, student_ids)
+    return export_filename(assignment_id), len(submissions), stream_zip(submission_entries(submissions))
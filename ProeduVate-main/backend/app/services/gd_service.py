@@ -1,18 +1,41 @@
 # gd_service.py - Group Discussion Service with AI Integration
 
-import openai
 import os
 from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
 import random
+import threading
+from .prompt_builder import build_gd_context, estimate_tokens, record_prompt_size, truncate_to_tokens
+from ..instrumentation import track_call
+
+# Batched evaluation settings
+GD_EVAL_CHUNK_TOKENS = int(os.getenv('GD_EVAL_CHUNK_TOKENS', 2500))  # transcript budget per prompt
+GD_EVAL_MAX_WORKERS = int(os.getenv('GD_EVAL_MAX_WORKERS', 4))
+GD_EVAL_CACHE_SIZE = int(os.getenv('GD_EVAL_CACHE_SIZE', 256))
+
+# Batched evaluation results keyed by transcript hash (shared by all GDService instances)
+_batch_eval_cache = OrderedDict()
+_batch_eval_cache_lock = threading.Lock()
+
+_openai = None
+
+def get_openai():
+    """Import the OpenAI SDK on first use so GD routes that don't call it stay light"""
+    global _openai
+    if _openai is None:
+        import openai
+        openai.api_key = os.getenv('OPENAI_API_KEY')
+        _openai = openai
+    return _openai
 
 class GDService:
     """Service for handling GD Round AI operations"""
     
     def __init__(self):
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
-        if self.openai_api_key:
-            openai.api_key = self.openai_api_key
     
     def generate_ai_agent_response(self, topic, context, agent_personality, agent_gender):
         """
@@ -20,7 +43,7 @@ class GDService:
         
         Args:
             topic: GD topic
-            context: Previous conversation context
+            context: Previous conversation context (list of turns or a string)
             agent_personality: Personality trait (e.g., 'analytical', 'creative', 'diplomatic')
             agent_gender: 'male' or 'female'
         
@@ -43,7 +66,7 @@ class GDService:
 {personality}
 
 Previous discussion context:
-{context}
+{build_gd_context(context)}
 
 Provide a thoughtful contribution (2-3 sentences) that:
 1. Addresses the topic directly
@@ -52,9 +75,10 @@ Provide a thoughtful contribution (2-3 sentences) that:
 4. Stays within 30-40 words
 
 Your response:"""
+            record_prompt_size('gd_agent_response', prompt)
             
             if self.openai_api_key:
-                response = openai.ChatCompletion.create(
+                response = self._chat_completion(
                     model="gpt-3.5-turbo",
                     messages=[
                         {"role": "system", "content": "You are a professional participant in a group discussion."},
@@ -72,6 +96,13 @@ Your response:"""
             print(f"Error generating AI response: {e}")
             return self._generate_mock_response(topic, agent_personality)
     
+    def _chat_completion(self, **kwargs):
+        """Call the OpenAI chat API, recording latency, token usage and errors"""
+        with track_call('llm', kwargs.get('model', 'openai')) as call:
+            response = get_openai().ChatCompletion.create(**kwargs)
+            call.tokens = response.get('usage', {}).get('total_tokens', 0)
+        return response
+    
     def _generate_mock_response(self, topic, personality):
         """Generate mock response when OpenAI is not available"""
         responses = {
@@ -142,8 +173,9 @@ Provide a JSON response with scores (0-100) for each criterion. Example:
 }}
 
 Evaluation:"""
+            record_prompt_size('gd_evaluate_response', prompt)
             
-            response = openai.ChatCompletion.create(
+            response = self._chat_completion(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are an expert evaluator for group discussions."},
@@ -162,6 +194,164 @@ Evaluation:"""
             print(f"Error evaluating response: {e}")
             return self._generate_mock_evaluation(evaluation_criteria)
     
+    def evaluate_round_batch(self, topic, responses, evaluation_criteria):
+        """
+        Evaluate every participant of a GD round with as few AI calls as possible
+        
+        Args:
+            topic: GD topic
+            responses: List of responses ({'participant', 'name', 'text'})
+            evaluation_criteria: Dict of criteria with weights
+        
+        Returns:
+            Dict mapping participant id to {criterion: score}
+        """
+        responses = [r for r in responses if r.get('text')]
+        if not responses:
+            return {}
+        
+        cache_key = self._transcript_hash(topic, responses, evaluation_criteria)
+        with _batch_eval_cache_lock:
+            if cache_key in _batch_eval_cache:
+                _batch_eval_cache.move_to_end(cache_key)
+                return _batch_eval_cache[cache_key]
+        
+        chunks = self._chunk_responses(responses, GD_EVAL_CHUNK_TOKENS)
+        
+        if self.openai_api_key and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(chunks), GD_EVAL_MAX_WORKERS)) as executor:
+                results = list(executor.map(
+                    lambda chunk: self._evaluate_chunk(topic, chunk, evaluation_criteria),
+                    chunks
+                ))
+        else:
+            results = [self._evaluate_chunk(topic, chunk, evaluation_criteria) for chunk in chunks]
+        
+        chunk_scores = [chunk_result for chunk_result, _ in results]
+        scores = self._merge_chunk_scores(chunks, chunk_scores, evaluation_criteria)
+        
+        # Random fallback scores must not be served again for the same transcript
+        if any(fell_back for _, fell_back in results):
+            return scores
+        
+        with _batch_eval_cache_lock:
+            _batch_eval_cache[cache_key] = scores
+            while len(_batch_eval_cache) > GD_EVAL_CACHE_SIZE:
+                _batch_eval_cache.popitem(last=False)
+        
+        return scores
+    
+    def _transcript_hash(self, topic, responses, evaluation_criteria):
+        """Stable hash of everything that influences a batched evaluation"""
+        payload = json.dumps({
+            'topic': topic,
+            'criteria': sorted(evaluation_criteria.keys()),
+            'responses': [[r.get('participant'), r.get('text')] for r in responses]
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _chunk_responses(self, responses, token_budget):
+        """Split responses into chunks whose estimated token count fits the budget"""
+        chunks = []
+        current = []
+        current_tokens = 0
+        
+        for response in responses:
+            # Allow a few extra tokens for the speaker label
+            tokens = estimate_tokens(response['text']) + 10
+            if current and current_tokens + tokens > token_budget:
+                chunks.append(current)
+                current = []
+                current_tokens = 0
+            current.append(response)
+            current_tokens += tokens
+        
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    def _evaluate_chunk(self, topic, chunk, evaluation_criteria):
+        """
+        Score all participants appearing in one transcript chunk with a single AI call
+        
+        Returns:
+            (scores keyed by participant id, True if they are mock fallback scores)
+        """
+        participant_ids = list(dict.fromkeys(r.get('participant') for r in chunk))
+        
+        if not self.openai_api_key:
+            return {pid: self._generate_mock_evaluation(evaluation_criteria) for pid in participant_ids}, True
+        
+        try:
+            criteria_descriptions = "\n".join([
+                f"- {key}: {value['description']} (Weight: {value['weight']}%)"
+                for key, value in evaluation_criteria.items()
+            ])
+            transcript = "\n".join([
+                f"[{r.get('participant')}] {r.get('name', r.get('participant'))}: {r['text']}"
+                for r in chunk
+            ])
+            
+            prompt = f"""Evaluate every participant in this Group Discussion excerpt on the topic "{topic}".
+
+Transcript (each line is prefixed with the participant id in brackets):
+{transcript}
+
+Evaluation Criteria:
+{criteria_descriptions}
+
+Provide a JSON object keyed by participant id, with scores (0-100) for each criterion. Example:
+{{
+    "{participant_ids[0]}": {{{", ".join(f'"{key}": 80' for key in evaluation_criteria.keys())}}}
+}}
+
+Evaluation:"""
+            record_prompt_size('gd_evaluate_batch', prompt)
+            
+            response = self._chat_completion(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": "You are an expert evaluator for group discussions."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=60 * len(participant_ids) + 100,
+                temperature=0.3
+            )
+            
+            result = json.loads(response.choices[0].message.content.strip())
+            
+            scores = {}
+            for pid in participant_ids:
+                participant_scores = result.get(pid) or {}
+                scores[pid] = {
+                    key: participant_scores.get(key, 0)
+                    for key in evaluation_criteria.keys()
+                }
+            return scores, False
+        
+        except Exception as e:
+            print(f"Error evaluating GD chunk: {e}")
+            return {pid: self._generate_mock_evaluation(evaluation_criteria) for pid in participant_ids}, True
+    
+    def _merge_chunk_scores(self, chunks, chunk_scores, evaluation_criteria):
+        """Combine per-chunk scores, weighting each chunk by the participant's utterances in it"""
+        totals = {}
+        weights = {}
+        
+        for chunk, scores in zip(chunks, chunk_scores):
+            for pid, participant_scores in scores.items():
+                utterances = sum(1 for r in chunk if r.get('participant') == pid)
+                totals.setdefault(pid, {key: 0 for key in evaluation_criteria.keys()})
+                weights[pid] = weights.get(pid, 0) + utterances
+                for key in evaluation_criteria.keys():
+                    totals[pid][key] += participant_scores.get(key, 0) * utterances
+        
+        return {
+            pid: {key: round(value / weights[pid]) for key, value in criterion_totals.items()}
+            for pid, criterion_totals in totals.items()
+            if weights[pid]
+        }
+    
     def _generate_mock_evaluation(self, criteria):
         """Generate mock evaluation scores"""
         scores = {}
@@ -185,10 +375,10 @@ Evaluation:"""
             if not self.openai_api_key:
                 return self._generate_mock_summary(topic, participants)
             
-            responses_text = "\n".join([
+            responses_text = truncate_to_tokens("\n".join([
                 f"{r['participant_name']}: {r['text']}"
                 for r in all_responses
-            ])
+            ]), GD_EVAL_CHUNK_TOKENS)
             
             prompt = f"""Summarize this Group Discussion on the topic: "{topic}"
 
@@ -202,8 +392,9 @@ Provide a concise summary (150-200 words) that:
 4. Mentions the quality of the discussion
 
 Summary:"""
+            record_prompt_size('gd_summary', prompt)
             
-            response = openai.ChatCompletion.create(
+            response = self._chat_completion(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are an expert at summarizing group discussions."},
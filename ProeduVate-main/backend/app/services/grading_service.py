@@ -0,0 +1,299 @@
+# grading_service.py - Bulk re-grading of aptitude and quiz submissions
+#
+# Answers are compared a whole submission at a time: the chosen option indexes
+# and the answer key are both byte strings (one byte per question, see
+# aptitude_storage), XORed as big integers, and the zero bytes - the matches -
+# are found with a SWAR mask. The correctness bitset and the count then come out
+# of C-level int/bytes operations instead of a Python loop per question.
+
+import time
+from datetime import datetime
+from pymongo import UpdateOne
+from ..database import (
+    submissions_collection, users_collection, teacher_assignments_collection,
+    aptitude_questions_collection, aptitude_stats_collection
+)
+from .aptitude_storage import UNANSWERED
+from .quiz_service import set_quiz_questions
+
+# Key byte for questions whose correct answer is not among the options; never matches
+NO_MATCH = 0xFE
+# Choice byte for a given answer that is none of the options; never equals a key byte
+WRONG_ANSWER = 0xFD
+# Key and choice byte of a free-text question, whose answers are compared as text
+TEXT_MATCH = 0
+
+BULK_BATCH_SIZE = 1000
+
+_LOW7 = {}
+_BIT_TABLE = bytes.maketrans(b'\x00\x80', b'01')
+
+def _low7(length):
+    mask = _LOW7.get(length)
+    if mask is None:
+        mask = _LOW7[length] = int.from_bytes(b'\x7f' * length, 'big')
+    return mask
+
+def grade_choices(choices, key):
+    """
+    Compare chosen option indexes with the answer key, both one byte per question.
+
+    Returns:
+        (correct_bitset_bytes, correct_count); bit i (little-endian) is question i
+    """
+    length = min(len(choices), len(key))
+    if not length:
+        return b'', 0
+    x = int.from_bytes(bytes(choices[:length]), 'big') ^ int.from_bytes(bytes(key[:length]), 'big')
+    low7 = _low7(length)
+    # High bit of each byte lane is set exactly where the lane of x is zero
+    zero_lanes = ~(((x & low7) + low7) | x | low7) & ~low7 & ((1 << (8 * length)) - 1)
+    # Lanes are 0x80/0x00; map them to '1'/'0' and read the bits back as a number
+    flags = zero_lanes.to_bytes(length, 'big').translate(_BIT_TABLE)
+    bits = int(flags[::-1], 2)
+    return bits.to_bytes((length + 7) // 8, 'little'), flags.count(b'1')
+
+def _key_index(question, answer):
+    """Option index for an answer given as option text or index"""
+    options = question.get('options') or []
+    if isinstance(answer, int):
+        return answer if 0 <= answer < len(options) else NO_MATCH
+    normalized = str(answer).strip().lower()
+    for i, option in enumerate(options):
+        if str(option).strip().lower() == normalized:
+            return i
+    return NO_MATCH
+
+def _normalize(text):
+    return str(text or '').strip().lower()
+
+def _quiz_key_byte(question):
+    """Key byte of a quiz question: the correct option, or TEXT_MATCH for free text"""
+    if not isinstance(question, dict):
+        return NO_MATCH
+    if question.get('options'):
+        return _key_index(question, question.get('correct_answer'))
+    return TEXT_MATCH if _normalize(question.get('correct_answer')) else NO_MATCH
+
+def _quiz_choice_byte(question, answer):
+    """
+    Choice byte of a stored quiz answer, graded like the quiz page does: options by
+    index, free text by case-insensitive comparison with the correct answer
+    """
+    if not answer or not isinstance(question, dict):
+        return UNANSWERED
+    if question.get('options'):
+        index = _key_index(question, answer)
+        return WRONG_ANSWER if index == NO_MATCH else index
+    correct = _normalize(question.get('correct_answer'))
+    return TEXT_MATCH if correct and _normalize(answer) == correct else WRONG_ANSWER
+
+def _flush(collection, operations):
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    return []
+
+# --- Aptitude ---------------------------------------------------------------
+
+def regrade_aptitude(answer_key):
+    """
+    Fix answer keys in the question bank and re-grade every aptitude submission
+    that contains one of those questions.
+
+    Args:
+        answer_key: {question_id: correct answer as option text or index}
+
+    Returns:
+        summary dict (questions updated, submissions scanned / changed, seconds)
+    """
+    start = time.perf_counter()
+    questions = {q['_id']: q for q in aptitude_questions_collection.find({'_id': {'$in': list(answer_key)}})}
+    updates = []
+    for qid, answer in answer_key.items():
+        question = questions.get(qid)
+        if question is None:
+            continue
+        index = _key_index(question, answer)
+        if index == NO_MATCH:
+            raise ValueError(f"Answer for question {qid} is not one of its options")
+        question['correct_answer'] = question['options'][index]
+        updates.append(UpdateOne({'_id': qid}, {'$set': {'correct_answer': question['correct_answer']}}))
+    _flush(aptitude_questions_collection, updates)
+
+    key_bytes = {}
+    for qid, question in questions.items():
+        key_bytes[qid] = _key_index(question, question.get('correct_answer'))
+
+    def load_missing(ids):
+        missing = [qid for qid in ids if qid not in key_bytes]
+        if missing:
+            for q in aptitude_questions_collection.find({'_id': {'$in': missing}},
+                                                        {'options': 1, 'correct_answer': 1}):
+                key_bytes[q['_id']] = _key_index(q, q.get('correct_answer'))
+            for qid in missing:
+                key_bytes.setdefault(qid, NO_MATCH)
+
+    scanned = 0
+    changed = 0
+    affected_students = set()
+    keys_by_test = {}
+    operations = []
+    now = datetime.utcnow()
+    cursor = submissions_collection.find(
+        {'type': 'aptitude', 'question_ids': {'$in': list(questions)}},
+        {'question_ids': 1, 'choices': 1, 'correct': 1, 'correct_answers': 1, 'student_id': 1, 'test_id': 1},
+        batch_size=BULK_BATCH_SIZE
+    )
+    for submission in cursor:
+        scanned += 1
+        ids = submission.get('question_ids') or []
+        cache_key = submission.get('test_id') or tuple(ids)
+        key = keys_by_test.get(cache_key)
+        if key is None:
+            load_missing(ids)
+            key = keys_by_test[cache_key] = bytes(key_bytes[qid] for qid in ids)
+
+        choices = bytes(submission.get('choices') or b'')
+        correct_bits, correct_count = grade_choices(choices, key)
+        if correct_bits == bytes(submission.get('correct') or b'') and correct_count == submission.get('correct_answers'):
+            continue
+
+        total = len(ids)
+        unanswered = choices.count(UNANSWERED)
+        operations.append(UpdateOne({'_id': submission['_id']}, {'$set': {
+            'correct': correct_bits,
+            'correct_answers': correct_count,
+            'incorrect_answers': total - correct_count - unanswered,
+            'unanswered': unanswered,
+            'score': round(correct_count / total * 100, 2) if total else 0,
+            'regraded_at': now
+        }}))
+        changed += 1
+        affected_students.add(submission.get('student_id'))
+        if len(operations) >= BULK_BATCH_SIZE:
+            operations = _flush(submissions_collection, operations)
+    _flush(submissions_collection, operations)
+
+    # Stats documents are rebuilt from submissions on the next progress read
+    if affected_students:
+        aptitude_stats_collection.update_many(
+            {'_id': {'$in': list(affected_students)}}, {'$set': {'complete': False}}
+        )
+
+    return {
+        'questions_updated': len(updates),
+        'submissions_scanned': scanned,
+        'submissions_changed': changed,
+        'students_affected': len(affected_students),
+        'seconds': round(time.perf_counter() - start, 3)
+    }
+
+def aptitude_answer_key(question_ids, answers):
+    """Map a positional answer key (list, None = unchanged) onto a test's question ids"""
+    return {qid: answer for qid, answer in zip(question_ids, answers) if answer is not None}
+
+# --- Quizzes ----------------------------------------------------------------
+
+def quiz_score(correct_count, total):
+    """Same rule the quiz page grades with: floor(100 / n) points per correct answer"""
+    return (100 // total) * correct_count if total else 0
+
+def regrade_quiz(assignment_id, answers):
+    """
+    Update a quiz assignment's answer key and re-grade its stored submissions.
+
+    Args:
+        answers: list aligned with the quiz questions; each entry is the correct
+            option text or index, or None to keep the current answer
+
+    Returns:
+        summary dict, as regrade_aptitude, plus submissions_skipped_no_answers:
+        quiz submissions stored without their answers, which keep their old score
+    """
+    from bson import ObjectId
+
+    start = time.perf_counter()
+    # Older assignments keep their questions under 'questions', as quiz_service reads them
+    assignment = teacher_assignments_collection.find_one({'_id': ObjectId(assignment_id)},
+                                                         {'quizQuestions': 1, 'questions': 1})
+    questions = (assignment or {}).get('quizQuestions') or (assignment or {}).get('questions') or []
+    if not questions:
+        raise LookupError("Quiz not found")
+
+    updated = 0
+    for question, answer in zip(questions, answers):
+        if answer is None or not isinstance(question, dict):
+            continue
+        if not question.get('options'):
+            question['correct_answer'] = str(answer)
+            updated += 1
+            continue
+        index = _key_index(question, answer)
+        if index == NO_MATCH:
+            raise ValueError(f"Answer {answer!r} is not one of the options for: {question.get('question')}")
+        question['correct_answer'] = question['options'][index]
+        updated += 1
+    set_quiz_questions(assignment_id, questions)
+
+    key = bytes(_quiz_key_byte(q) for q in questions)
+    total = len(questions)
+
+    scanned = 0
+    changed = 0
+    affected_students = set()
+    operations = []
+    now = datetime.utcnow()
+    cursor = submissions_collection.find(
+        {'assignment_id': assignment_id, 'quiz_answers': {'$exists': True}},
+        {'quiz_answers': 1, 'quiz_score': 1, 'student_id': 1},
+        batch_size=BULK_BATCH_SIZE
+    )
+    for submission in cursor:
+        scanned += 1
+        given = submission.get('quiz_answers') or []
+        choices = bytes(
+            _quiz_choice_byte(q, given[i] if i < len(given) else None) for i, q in enumerate(questions)
+        )
+        _, correct_count = grade_choices(choices, key)
+        score = quiz_score(correct_count, total)
+        if score == submission.get('quiz_score'):
+            continue
+        operations.append(UpdateOne({'_id': submission['_id']}, {'$set': {'quiz_score': float(score), 'regraded_at': now}}))
+        changed += 1
+        affected_students.add(submission.get('student_id'))
+        if len(operations) >= BULK_BATCH_SIZE:
+            operations = _flush(submissions_collection, operations)
+    _flush(submissions_collection, operations)
+
+    # Quizzes submitted before answers were stored keep their score: report how many
+    skipped = submissions_collection.count_documents(
+        {'assignment_id': assignment_id, 'quiz_score': {'$exists': True}, 'quiz_answers': {'$exists': False}}
+    )
+    if skipped:
+        print(f"Regrade of quiz {assignment_id}: {skipped} submissions have no stored answers and were not re-graded")
+
+    # Refresh each affected student's average quiz score in one aggregation
+    user_updates = []
+    if affected_students:
+        pipeline = [
+            {'$match': {'student_id': {'$in': list(affected_students)}, 'quiz_score': {'$exists': True}}},
+            {'$group': {'_id': '$student_id', 'average': {'$avg': '$quiz_score'}}}
+        ]
+        for row in submissions_collection.aggregate(pipeline):
+            try:
+                user_id = ObjectId(row['_id'])
+            except Exception:
+                continue
+            user_updates.append(UpdateOne({'_id': user_id}, {'$set': {
+                'quizScore': row['average'], 'averageQuizScore': row['average']
+            }}))
+        _flush(users_collection, user_updates)
+
+    return {
+        'questions_updated': updated,
+        'submissions_scanned': scanned,
+        'submissions_changed': changed,
+        'submissions_skipped_no_answers': skipped,
+        'students_affected': len(affected_students),
+        'seconds': round(time.perf_counter() - start, 3)
+    }
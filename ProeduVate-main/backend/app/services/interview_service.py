@@ -0,0 +1,426 @@
+# interview_service.py - Mock interview sessions
+#
+# Starting an interview no longer sends the resume to the model:
+#   - a compact skill profile (role, seniority, skills, ...) is derived once per
+#     resume, in the background when it is uploaded, and kept on the user;
+#   - question pools are generated per (profile, difficulty) and reused by every
+#     interview with that profile for INTERVIEW_POOL_DAYS; each session samples
+#     its 10 questions from the pool following QUESTION_PLAN.
+# Each answer is evaluated in the background as soon as it is submitted, so
+# finishing only waits for the last answer's evaluation and then aggregates.
+#
+# Session state lives in interview_sessions, so any worker can take the next
+# answer or finish the session; evaluations lost with a dead worker are re-run
+# when the session is finished.
+
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from bson import ObjectId
+from ..auth import invalidate_user_cache
+from ..cache import LRUCache
+from ..database import users_collection, interview_sessions_collection, interview_question_pools_collection
+from .ai_service import extract_text_from_pdf, get_ai_response
+from .prompt_builder import compact_resume, truncate_to_tokens, record_prompt_size
+from .storage_service import get_storage
+
+INTERVIEW_POOL_DAYS = float(os.getenv('INTERVIEW_POOL_DAYS', 14))
+INTERVIEW_SESSION_TTL_HOURS = float(os.getenv('INTERVIEW_SESSION_TTL_HOURS', 24))
+INTERVIEW_EVAL_WORKERS = int(os.getenv('INTERVIEW_EVAL_WORKERS', 4))
+# How long finishing waits for evaluations still running elsewhere; later ones are left out of the report
+INTERVIEW_FINISH_WAIT_SECONDS = float(os.getenv('INTERVIEW_FINISH_WAIT_SECONDS', 20))
+INTERVIEW_EVAL_TIMEOUT_SECONDS = int(os.getenv('INTERVIEW_EVAL_TIMEOUT_SECONDS', 60))
+ANSWER_TOKEN_BUDGET = int(os.getenv('INTERVIEW_ANSWER_TOKEN_BUDGET', 600))
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+# Questions per session, in interview order, and how many of each the pool holds
+QUESTION_PLAN = [('opening', 1), ('personality', 2), ('problem_solving', 2), ('skills', 3), ('behavioral', 2)]
+POOL_SIZES = {'opening': 3, 'personality': 5, 'problem_solving': 5, 'skills': 8, 'behavioral': 5}
+
+# Used when the pool is short or couldn't be generated
+FALLBACK_QUESTIONS = {
+    'opening': ["How has your day been so far?", "Tell me a bit about yourself."],
+    'personality': ["How do you handle working under pressure?", "What are your greatest strengths?",
+                    "Tell me about a time you worked in a team."],
+    'problem_solving': ["Can you tell me about a time you faced a challenge at work and how you overcame it?",
+                        "How do you approach learning new skills?"],
+    'skills': ["What motivated you to apply for this position?", "What interests you most about this role?",
+               "Walk me through a project you are proud of."],
+    'behavioral': ["Where do you see yourself in 5 years?", "Do you have any questions for me?"]
+}
+
+class InterviewError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+_pools = LRUCache(256)
+
+# --- Resume profile ---------------------------------------------------------
+
+def derive_profile(resume_text):
+    """Compact skill profile of a resume, or None if the model didn't give one"""
+    prompt = f"""
+    Read the resume below and summarise the candidate as a compact profile.
+
+    Return a single, raw JSON object with these exact keys:
+    - "role": the role they are best suited for, e.g. "Backend Developer"
+    - "seniority": one of "student", "junior", "mid", "senior"
+    - "skills": up to 8 key technical skills, most important first
+    - "domains": up to 3 industries or domains they have worked in
+    - "highlights": up to 3 short phrases naming notable projects or achievements
+
+    Resume:
+    ---
+    {compact_resume(resume_text)}
+    ---
+    """
+    record_prompt_size('interview_profile', prompt)
+    profile = get_ai_response(prompt, schema='resume_profile', call_site='interview_profile')
+    if not profile:
+        return None
+    profile['skills'] = profile['skills'][:8]
+    profile['domains'] = profile.get('domains', [])[:3]
+    profile['highlights'] = profile.get('highlights', [])[:3]
+    return profile
+
+def _store_profile(user_id, filename, profile):
+    # Only if the resume hasn't been replaced meanwhile
+    users_collection.update_one(
+        {'_id': ObjectId(user_id), 'resume_filename': filename},
+        {'$set': {'resumeProfile': dict(profile, resume_filename=filename)}}
+    )
+
+def refresh_profile_async(user_id, filename, resume_text):
+    """Derive the profile for a newly uploaded resume in the background"""
+    def run():
+        try:
+            profile = derive_profile(resume_text)
+            if profile:
+                _store_profile(user_id, filename, profile)
+        except Exception as e:
+            print(f"Error deriving interview profile for {user_id}: {e}")
+    _get_executor().submit(run)
+
+def get_profile(user):
+    """The user's profile for their current resume, derived now if it isn't there yet"""
+    filename = user.get('resume_filename')
+    profile = user.get('resumeProfile')
+    if profile and profile.get('resume_filename') == filename:
+        return profile
+
+    with get_storage().local_copy(f"resumes/{filename}") as resume_path:
+        resume_text = extract_text_from_pdf(resume_path)
+    if not resume_text:
+        raise InterviewError("Could not read resume file.", 500)
+    profile = derive_profile(resume_text)
+    if not profile:
+        raise InterviewError("Failed to generate questions from AI model.", 500)
+    _store_profile(user['_id'], filename, profile)
+    return profile
+
+# --- Question pools ---------------------------------------------------------
+
+def _normalize(value):
+    return re.sub(r'\s+', ' ', str(value or '')).strip().lower()
+
+def pool_key(profile, difficulty):
+    """Same role, seniority and main skills -> same pool, whoever the candidate is"""
+    skills = sorted({_normalize(skill) for skill in profile.get('skills', [])[:6]})
+    raw = '\x1f'.join([_normalize(profile.get('role')), _normalize(profile.get('seniority')), *skills, difficulty])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:24]
+
+def _pool_prompt(profile, difficulty):
+    counts = '\n'.join(f'    - "{category}": {size} questions' for category, size in POOL_SIZES.items())
+    return f"""
+    You are a friendly, professional HR interviewer preparing questions for a real job interview.
+
+    Candidate profile:
+    - Role: {profile.get('role')}
+    - Seniority: {profile.get('seniority')}
+    - Skills: {', '.join(profile.get('skills', []))}
+    - Domains: {', '.join(profile.get('domains', [])) or 'not specified'}
+    Difficulty level: {difficulty}
+
+    Return a single, raw JSON object whose keys are question categories, each holding a list of question strings:
+{counts}
+
+    Guidelines:
+    - "opening": warm, conversational openers like "How has your day been?" or "Tell me about yourself"
+    - "personality": soft skills such as teamwork, communication and handling pressure
+    - "problem_solving": how they handle challenges, conflicts and difficult situations
+    - "skills": experience and technical depth in the listed skills, suited to the role and seniority
+    - "behavioral": "Tell me about a time when..." questions
+    - Make questions sound natural and conversational, not robotic; be polite, warm and encouraging
+    """
+
+def get_pool(profile, difficulty):
+    """Question pool for a profile, or None if none could be generated"""
+    key = pool_key(profile, difficulty)
+    pool = _pools.get(key)
+    if pool:
+        return pool
+    doc = interview_question_pools_collection.find_one({'_id': key}, {'questions': 1})
+    if doc:
+        pool = doc['questions']
+    else:
+        prompt = _pool_prompt(profile, difficulty)
+        record_prompt_size('interview_pool', prompt)
+        pool = get_ai_response(prompt, schema='interview_pool', call_site='interview_pool', expected=POOL_SIZES)
+        if not pool:
+            return None
+        now = datetime.utcnow()
+        interview_question_pools_collection.update_one({'_id': key}, {'$set': {
+            'questions': pool, 'role': profile.get('role'), 'difficulty': difficulty,
+            'generated_at': now, 'expires_at': now + timedelta(days=INTERVIEW_POOL_DAYS)
+        }}, upsert=True)
+    _pools.set(key, pool, time.time() + 600)
+    return pool
+
+def pick_questions(pool):
+    """One interview's questions drawn from a pool along QUESTION_PLAN"""
+    questions = []
+    for category, count in QUESTION_PLAN:
+        available = list((pool or {}).get(category) or [])
+        picked = random.sample(available, min(count, len(available)))
+        spares = [q for q in FALLBACK_QUESTIONS[category] if q not in picked and q not in questions]
+        picked += spares[:count - len(picked)]
+        questions.extend(picked)
+    return questions
+
+# --- Sessions ---------------------------------------------------------------
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """Thread pool for evaluations and profiles, recreated after a fork"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=max(1, INTERVIEW_EVAL_WORKERS),
+                                           thread_name_prefix='interview-eval')
+            _executor_pid = os.getpid()
+        return _executor
+
+def start_session(user_id, difficulty='medium'):
+    """Create a session for a user with an uploaded resume; returns the session document"""
+    difficulty = difficulty if difficulty in DIFFICULTIES else 'medium'
+    try:
+        user = users_collection.find_one({'_id': ObjectId(user_id)}, {'resume_filename': 1, 'resumeProfile': 1})
+    except Exception:
+        user = None
+    if not user or not user.get('resume_filename'):
+        raise InterviewError("Resume not found. Please upload a resume first.", 404)
+
+    profile = get_profile(user)
+    pool = get_pool(profile, difficulty)
+    if not pool:
+        print(f"No question pool for {profile.get('role')} ({difficulty}); using fallback questions")
+
+    now = datetime.utcnow()
+    session = {
+        '_id': uuid.uuid4().hex,
+        'user_id': str(user_id),
+        'difficulty': difficulty,
+        'role': profile.get('role'),
+        'questions': pick_questions(pool),
+        'answers': {},
+        'status': 'active',
+        'created_at': now,
+        'expires_at': now + timedelta(hours=INTERVIEW_SESSION_TTL_HOURS)
+    }
+    interview_sessions_collection.insert_one(session)
+    return session
+
+def _get_session(session_id):
+    session = interview_sessions_collection.find_one({'_id': session_id})
+    if not session:
+        raise InterviewError("Interview session not found or expired.", 404)
+    return session
+
+def _evaluation_prompt(session, question, answer):
+    return f"""
+    You are a professional, empathetic HR interviewer assessing one answer from a
+    {session['difficulty']} interview for a {session.get('role') or 'job'} position.
+
+    Question: {question}
+    Answer: {truncate_to_tokens(answer, ANSWER_TOKEN_BUDGET)}
+
+    Return a single, raw JSON object with these exact keys:
+    - "score": an integer from 0 to 100 for this answer (be fair and encouraging)
+    - "feedback": one or two warm, specific sentences about this answer
+    - "strengths": a list of 0-2 short strengths shown in this answer
+    - "mistakes": a list of 0-2 short areas for improvement, phrased positively
+    """
+
+def _evaluate_answer(session_id, index):
+    session = interview_sessions_collection.find_one({'_id': session_id})
+    entry = (session or {}).get('answers', {}).get(str(index))
+    if not entry:
+        return
+    prompt = _evaluation_prompt(session, entry['question'], entry['answer'])
+    record_prompt_size('interview_answer', prompt)
+    try:
+        evaluation = get_ai_response(prompt, schema='interview_answer_eval', call_site='interview_answer')
+    except Exception as e:
+        print(f"Error evaluating interview answer {session_id}/{index}: {e}")
+        evaluation = None
+    fields = {f'answers.{index}.status': 'done' if evaluation else 'failed'}
+    if evaluation:
+        fields[f'answers.{index}.evaluation'] = evaluation
+    # A newer answer to the same question replaces this one; leave its evaluation alone
+    interview_sessions_collection.update_one(
+        {'_id': session_id, f'answers.{index}.submitted_at': entry['submitted_at']},
+        {'$set': fields}
+    )
+
+def submit_answer(session_id, index, answer):
+    """Record the answer to question `index` and start evaluating it in the background"""
+    session = _get_session(session_id)
+    if session['status'] != 'active':
+        raise InterviewError("This interview has already been finished.", 409)
+    try:
+        index = int(index)
+    except (TypeError, ValueError):
+        raise InterviewError("index must be a number")
+    if not 0 <= index < len(session['questions']):
+        raise InterviewError("No such question in this interview")
+    answer = str(answer or '').strip()
+    if not answer:
+        raise InterviewError("No answer provided.")
+
+    interview_sessions_collection.update_one({'_id': session_id, 'status': 'active'}, {'$set': {
+        f'answers.{index}': {
+            'question': session['questions'][index], 'answer': answer,
+            'status': 'pending', 'submitted_at': datetime.utcnow()
+        }
+    }})
+    _get_executor().submit(_evaluate_answer, session_id, index)
+    return {'session_id': session_id, 'index': index, 'status': 'evaluating'}
+
+def submit_missing_answers(session_id, answers):
+    """Submit the answers (a list in question order) that weren't sent one by one"""
+    session = _get_session(session_id)
+    if session['status'] != 'active':
+        return
+    for index, answer in enumerate((answers or [])[:len(session['questions'])]):
+        if str(index) not in session.get('answers', {}) and str(answer or '').strip():
+            submit_answer(session_id, index, answer)
+
+def _unfinished(session):
+    """Indexes whose evaluation is still worth waiting for, and those that must be redone"""
+    waiting, redo = [], []
+    stale_before = datetime.utcnow() - timedelta(seconds=INTERVIEW_EVAL_TIMEOUT_SECONDS)
+    for index, entry in session.get('answers', {}).items():
+        if entry['status'] == 'failed' or (entry['status'] == 'pending' and entry['submitted_at'] < stale_before):
+            redo.append(int(index))
+        elif entry['status'] == 'pending':
+            waiting.append(int(index))
+    return waiting, redo
+
+def _unique(items, limit):
+    seen = set()
+    result = []
+    for item in items:
+        if _normalize(item) not in seen:
+            seen.add(_normalize(item))
+            result.append(item)
+    return result[:limit]
+
+def _sentence(text):
+    text = str(text).strip()
+    return text if text.endswith(('.', '!', '?')) else text + '.'
+
+def build_report(session):
+    """Overall score and feedback from the per-answer evaluations"""
+    evaluated = sorted(
+        (entry for entry in session.get('answers', {}).values() if entry.get('evaluation')),
+        key=lambda entry: entry['evaluation']['score'], reverse=True
+    )
+    per_question = [
+        {'index': int(index), 'question': entry['question'], **(entry.get('evaluation') or {})}
+        for index, entry in sorted(session.get('answers', {}).items(), key=lambda item: int(item[0]))
+    ]
+    if not evaluated:
+        return None
+
+    score = round(sum(entry['evaluation']['score'] for entry in evaluated) / len(evaluated))
+    if score >= 80:
+        opening = "You interviewed very well overall."
+    elif score >= 60:
+        opening = "Good interview overall, with a few areas to strengthen."
+    else:
+        opening = "Thank you for completing the interview - there is clear room to grow, and the notes below show where to start."
+    best, weakest = evaluated[0], evaluated[-1]
+    feedback = [opening, f"Your strongest answer was to \"{best['question']}\": {_sentence(best['evaluation']['feedback'])}"]
+    if weakest is not best:
+        feedback.append(f"On \"{weakest['question']}\": {_sentence(weakest['evaluation']['feedback'])}")
+
+    return {
+        'score': score,
+        'feedback': ' '.join(feedback),
+        'strengths': _unique((s for entry in evaluated for s in entry['evaluation'].get('strengths', [])), 5),
+        'mistakes': _unique((m for entry in reversed(evaluated) for m in entry['evaluation'].get('mistakes', [])), 4),
+        'answered': len(session.get('answers', {})),
+        'total_questions': len(session['questions']),
+        'per_question': per_question
+    }
+
+def finish_session(session_id):
+    """
+    Wait for outstanding evaluations, build the report and save the score.
+    Finishing again returns the same report.
+    """
+    session = _get_session(session_id)
+    if session['status'] == 'completed':
+        return session['report']
+    if not session.get('answers'):
+        raise InterviewError("No answers have been submitted for this interview.")
+
+    deadline = time.monotonic() + INTERVIEW_FINISH_WAIT_SECONDS
+    waiting, redo = _unfinished(session)
+    while waiting and time.monotonic() < deadline:
+        time.sleep(0.25)
+        session = _get_session(session_id)
+        waiting, redo = _unfinished(session)
+    # Failed and stale evaluations (a worker died, the model failed) are redone now, in parallel.
+    # Ones still running past the deadline are left to their worker and skipped in the report.
+    if redo:
+        wait([_get_executor().submit(_evaluate_answer, session_id, index) for index in redo])
+        session = _get_session(session_id)
+
+    report = build_report(session)
+    if not report and waiting:
+        raise InterviewError("Evaluations are still running; try finishing again shortly.", 503)
+    if not report:
+        raise InterviewError("Failed to get evaluation from AI model.", 500)
+    interview_sessions_collection.update_one({'_id': session_id}, {'$set': {
+        'status': 'completed', 'report': report, 'completed_at': datetime.utcnow()
+    }})
+    users_collection.update_one({'_id': ObjectId(session['user_id'])}, {'$set': {'interviewScore': report['score']}})
+    invalidate_user_cache(session['user_id'])
+    return report
+
+def session_view(session_id):
+    """Progress of a session, with the report once it is finished"""
+    session = _get_session(session_id)
+    answers = session.get('answers', {})
+    return {
+        'session_id': session['_id'],
+        'status': session['status'],
+        'difficulty': session['difficulty'],
+        'questions': session['questions'],
+        'answered': len(answers),
+        'evaluated': sum(1 for entry in answers.values() if entry['status'] == 'done'),
+        'report': session.get('report')
+    }
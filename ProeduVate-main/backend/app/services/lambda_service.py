@@ -3,23 +3,39 @@ AWS Lambda service for Python code execution
 This service integrates with AWS Lambda to execute Python code securely
 """
 
-import boto3
 import json
 import base64
-from botocore.exceptions import ClientError
 import os
+import threading
+from ..instrumentation import track_call, mark_call_failed
+
+_lambda_client = None
+_lambda_client_lock = threading.Lock()
+
+def get_lambda_client():
+    """
+    Create the boto3 Lambda client on first use and reuse it afterwards.
+    boto3 is imported here so only the code execution route pays its import cost.
+    """
+    global _lambda_client
+    if _lambda_client is None:
+        with _lambda_client_lock:
+            if _lambda_client is None:
+                import boto3
+                _lambda_client = boto3.client(
+                    'lambda',
+                    region_name=os.environ.get('AWS_REGION', 'us-east-1'),
+                    aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
+                    aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY')
+                )
+    return _lambda_client
 
 class LambdaCodeExecutor:
     """AWS Lambda code executor for Python"""
     
     def __init__(self):
         """Initialize AWS Lambda client"""
-        self.lambda_client = boto3.client(
-            'lambda',
-            region_name=os.environ.get('AWS_REGION', 'us-east-1'),
-            aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY')
-        )
+        self.lambda_client = get_lambda_client()
         self.function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'python-code-executor')
     
     def execute_code(self, source_code, stdin='', timeout=5):
@@ -34,6 +50,8 @@ class LambdaCodeExecutor:
         Returns:
             dict: Execution result with stdout, stderr, status, time, memory
         """
+        from botocore.exceptions import ClientError
+        
         try:
             # Prepare payload for Lambda function
             payload = {
@@ -42,24 +60,20 @@ class LambdaCodeExecutor:
                 'timeout': timeout
             }
             
-            # Debug: Print payload
-            print(f"Lambda Payload - stdin length: {len(stdin)}, stdin: {repr(stdin[:100])}")
-            
             # Invoke Lambda function
-            response = self.lambda_client.invoke(
-                FunctionName=self.function_name,
-                InvocationType='RequestResponse',
-                Payload=json.dumps(payload)
-            )
-            
-            # Parse response
-            response_payload = json.loads(response['Payload'].read())
-            
-            # Debug: Print what we got from Lambda
-            print(f"Lambda Response: {response_payload}")
+            with track_call('lambda', self.function_name):
+                response = self.lambda_client.invoke(
+                    FunctionName=self.function_name,
+                    InvocationType='RequestResponse',
+                    Payload=json.dumps(payload)
+                )
+                
+                # Parse response
+                response_payload = json.loads(response['Payload'].read())
             
             # Check if there was an error in Lambda execution
             if 'errorMessage' in response_payload:
+                mark_call_failed('lambda', self.function_name)
                 error_msg = response_payload.get('errorMessage', 'Lambda execution error')
                 return {
                     'stdout': None,
@@ -99,7 +113,6 @@ class LambdaCodeExecutor:
                 'token': None
             }
             
-            print(f"Returning to frontend - stdout (base64): {result['stdout'][:50] if result['stdout'] else 'None'}")
             return result
             
         except ClientError as e:
@@ -150,9 +163,6 @@ def execute_python_code_lambda(source_code, stdin='', base64_encoded=False):
                 'memory': None
             }
     
-    # Debug: Print what we're sending to Lambda
-    print(f"Sending to Lambda - stdin: {repr(stdin)}")
-    
     # Create executor and run code
     executor = LambdaCodeExecutor()
     result = executor.execute_code(source_code, stdin)
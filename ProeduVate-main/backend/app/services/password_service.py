@@ -0,0 +1,84 @@
+# password_service.py - Password hashing off the request thread
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+# Full werkzeug method spec, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+# Stored hashes using any other spec are upgraded on the next successful login.
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+# Number of hashing processes per app worker; 0 hashes inline on the request thread
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+
+# Requests allowed to wait for a hashing process before new ones block
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', PASSWORD_HASH_WORKERS * 8))
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_queue_slots = threading.BoundedSemaphore(max(1, PASSWORD_HASH_QUEUE_SIZE))
+
+def _get_executor():
+    """Create the process pool lazily, and again after a fork (pools can't cross forks)"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+            _executor_pid = os.getpid()
+        return _executor
+
+def _run(fn, *args):
+    """Run a CPU-bound hashing call in the pool, or inline when the pool is disabled"""
+    if PASSWORD_HASH_WORKERS <= 0:
+        return fn(*args)
+
+    with _queue_slots:
+        return _get_executor().submit(fn, *args).result()
+
+def hash_password(password, method=None):
+    """Hash a password with the configured algorithm and cost"""
+    return _run(generate_password_hash, password, method or PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    """Check a password against a stored werkzeug hash"""
+    if not password_hash:
+        return False
+    return _run(check_password_hash, password_hash, password)
+
+def _hash_params(method):
+    """
+    Parse a werkzeug method spec into comparable parameters, filling in the
+    defaults werkzeug uses for omitted ones, so "pbkdf2:sha256" equals
+    "pbkdf2:sha256:<DEFAULT_PBKDF2_ITERATIONS>" and "scrypt" equals "scrypt:32768:8:1".
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = args + [2 ** 15, 8, 1][len(args):]
+        return (name, int(n), int(r), int(p))
+    if name == 'pbkdf2':
+        hash_name, iterations = args + ['sha256', DEFAULT_PBKDF2_ITERATIONS][len(args):]
+        return (name, hash_name, int(iterations))
+    return (name, *args)
+
+def needs_rehash(password_hash):
+    """True if the stored hash was produced with different algorithm/cost parameters"""
+    try:
+        return _hash_params(password_hash.split('$', 1)[0]) != _hash_params(PASSWORD_HASH_METHOD)
+    except ValueError:
+        # Unparseable spec: replace it with a hash we understand
+        return True
+
+def verify_and_upgrade(password_hash, password):
+    """
+    Verify a password and, if the hash parameters are outdated, produce a new hash.
+
+    Returns:
+        (is_valid, new_hash) where new_hash is None unless the stored hash should be replaced
+    """
+    if not verify_password(password_hash, password):
+        return False, None
+    if needs_rehash(password_hash):
+        return True, hash_password(password)
+    return True, None
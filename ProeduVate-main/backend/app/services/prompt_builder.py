@@ -0,0 +1,142 @@
+# prompt_builder.py - Token-aware prompt construction shared by AI call sites
+
+import os
+import re
+import threading
+
+# Budgets are in estimated tokens
+GD_CONTEXT_RECENT_TURNS = int(os.getenv('GD_CONTEXT_RECENT_TURNS', 6))
+GD_CONTEXT_SUMMARY_TOKENS = int(os.getenv('GD_CONTEXT_SUMMARY_TOKENS', 200))
+RESUME_TOKEN_BUDGET = int(os.getenv('RESUME_TOKEN_BUDGET', 1500))
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv('TRANSCRIPT_TOKEN_BUDGET', 3000))
+
+TRUNCATION_MARKER = " [...]"
+
+# Prompt size statistics per call site
+_prompt_metrics = {}
+_prompt_metrics_lock = threading.Lock()
+
+def estimate_tokens(text):
+    """
+    Estimate the token count of a piece of text without calling the model.
+    Uses the common ~4 characters per token rule, bounded below by word count.
+    """
+    if not text:
+        return 0
+    return max(len(text) // 4, len(text.split()))
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text down to roughly max_tokens, preferring to break on a word boundary"""
+    if not text or estimate_tokens(text) <= max_tokens:
+        return text
+
+    max_chars = max_tokens * 4
+    cut = text[:max_chars]
+    last_space = cut.rfind(' ')
+    if last_space > max_chars // 2:
+        cut = cut[:last_space]
+    return cut.rstrip() + TRUNCATION_MARKER
+
+def _first_sentence(text):
+    """Return the first sentence of a turn, used for the rolling summary"""
+    match = re.match(r'(.+?[.!?])(\s|$)', text.strip())
+    return match.group(1) if match else text.strip()
+
+def build_gd_context(context, recent_turns=None, summary_tokens=None):
+    """
+    Bound the "previous discussion" context sent with every GD turn.
+
+    Older turns are condensed into a rolling summary (first sentence of each,
+    capped at summary_tokens); the last recent_turns turns are kept verbatim.
+
+    Args:
+        context: List of turns ({'name', 'text'} dicts or strings) or a newline separated string
+
+    Returns:
+        Context string ready to be placed in the prompt
+    """
+    recent_turns = GD_CONTEXT_RECENT_TURNS if recent_turns is None else recent_turns
+    summary_tokens = GD_CONTEXT_SUMMARY_TOKENS if summary_tokens is None else summary_tokens
+
+    if not context:
+        return "The discussion is just starting."
+
+    if isinstance(context, str):
+        turns = [line for line in context.splitlines() if line.strip()]
+    else:
+        turns = [
+            f"{t.get('name', t.get('participant', 'Participant'))}: {t.get('text', '')}" if isinstance(t, dict) else str(t)
+            for t in context
+        ]
+
+    older = turns[:-recent_turns] if recent_turns else turns
+    recent = turns[-recent_turns:] if recent_turns else []
+
+    parts = []
+    if older:
+        summary = " ".join(_first_sentence(turn) for turn in older)
+        parts.append("Summary of earlier discussion: " + truncate_to_tokens(summary, summary_tokens))
+    if recent:
+        parts.append("Most recent points:\n" + "\n".join(recent))
+
+    return "\n\n".join(parts)
+
+def compact_resume(resume_text, max_tokens=None):
+    """
+    Shrink resume text to fit the budget.
+    Whitespace is collapsed and repeated lines dropped before falling back to truncation.
+    """
+    max_tokens = RESUME_TOKEN_BUDGET if max_tokens is None else max_tokens
+
+    if not resume_text or estimate_tokens(resume_text) <= max_tokens:
+        return resume_text
+
+    seen = set()
+    lines = []
+    for line in resume_text.splitlines():
+        line = re.sub(r'\s+', ' ', line).strip()
+        if not line or line.lower() in seen:
+            continue
+        seen.add(line.lower())
+        lines.append(line)
+
+    return truncate_to_tokens("\n".join(lines), max_tokens)
+
+def format_interview_transcript(transcript, max_tokens=None):
+    """
+    Format an interview transcript, giving each answer an equal share of the budget.
+    Questions are always kept in full since they are short and anchor the evaluation.
+    """
+    max_tokens = TRANSCRIPT_TOKEN_BUDGET if max_tokens is None else max_tokens
+
+    if not transcript:
+        return ""
+
+    question_tokens = sum(estimate_tokens(item.get('question', '')) for item in transcript)
+    answer_budget = max(50, (max_tokens - question_tokens) // len(transcript))
+
+    return "\n".join([
+        f"Question: {item.get('question', '')}\nAnswer: {truncate_to_tokens(item.get('answer', ''), answer_budget)}\n---"
+        for item in transcript
+    ])
+
+def record_prompt_size(call_site, prompt):
+    """Record the estimated size of a prompt sent from a given call site"""
+    tokens = estimate_tokens(prompt)
+    with _prompt_metrics_lock:
+        stats = _prompt_metrics.setdefault(call_site, {"calls": 0, "total_tokens": 0, "max_tokens": 0})
+        stats["calls"] += 1
+        stats["total_tokens"] += tokens
+        stats["max_tokens"] = max(stats["max_tokens"], tokens)
+    return tokens
+
+def get_prompt_metrics():
+    """Snapshot of prompt size statistics per call site"""
+    with _prompt_metrics_lock:
+        return {
+            call_site: {
+                **stats,
+                "avg_tokens": round(stats["total_tokens"] / stats["calls"], 1) if stats["calls"] else 0
+            }
+            for call_site, stats in _prompt_metrics.items()
+        }
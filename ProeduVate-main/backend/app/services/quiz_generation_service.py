@@ -0,0 +1,259 @@
+# quiz_generation_service.py - One place that turns a topic into an AI-generated MCQ quiz
+#
+# Requests are keyed by the normalized (topic, question count, audience), so
+# "Python Loops", "python  loops" and "Python loops." share one result.
+# Lookups go: per-process LRU -> generated_quizzes collection -> the model. Good
+# results are stored for QUIZ_GENERATION_CACHE_DAYS and can be attached to any
+# number of assignments; the placeholder fallback is never stored, so the next
+# request retries the model.
+#
+# Teachers can also queue generation as a job (quiz_jobs collection) and poll for
+# the preview. Jobs run on a small thread pool in the worker that accepted them;
+# a second request for the same key while one is pending gets the same job.
+
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from ..cache import LRUCache
+from ..database import generated_quizzes_collection, quiz_jobs_collection
+from .ai_service import get_ai_response, get_quiz_fallback
+
+QUIZ_GENERATION_CACHE_DAYS = float(os.getenv('QUIZ_GENERATION_CACHE_DAYS', 30))
+QUIZ_GENERATION_MEMORY_TTL_SECONDS = int(os.getenv('QUIZ_GENERATION_MEMORY_TTL_SECONDS', 600))
+QUIZ_JOB_WORKERS = int(os.getenv('QUIZ_JOB_WORKERS', 2))
+# A job still "running" after this long died with its worker and may be retried
+QUIZ_JOB_TIMEOUT_SECONDS = int(os.getenv('QUIZ_JOB_TIMEOUT_SECONDS', 300))
+QUIZ_JOB_TTL_HOURS = float(os.getenv('QUIZ_JOB_TTL_HOURS', 24))
+
+MAX_QUESTIONS = 20
+
+# Who the quiz is for, as phrased in the prompt
+AUDIENCES = {
+    'practice': 'beginners to intermediate learners practising on their own',
+    'students': 'students taking a graded class assignment'
+}
+DEFAULT_AUDIENCE = 'students'
+
+_memory = LRUCache(256)
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def normalize_topic(topic):
+    return re.sub(r'\s+', ' ', str(topic or '')).strip(' .?!').lower()
+
+def quiz_key(topic, count, audience):
+    """Stable id for a generation request"""
+    raw = f"{normalize_topic(topic)}\x1f{count}\x1f{audience}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:24]
+
+def normalize_request(topic, count, audience=None):
+    """Validated (topic, count, audience); raises ValueError for bad input"""
+    topic = re.sub(r'\s+', ' ', str(topic or '')).strip()
+    if not topic:
+        raise ValueError("No topic provided.")
+    try:
+        count = max(1, min(int(count), MAX_QUESTIONS))
+    except (TypeError, ValueError):
+        raise ValueError("num_questions must be a number")
+    audience = audience if audience in AUDIENCES else DEFAULT_AUDIENCE
+    return topic, count, audience
+
+def build_prompt(topic, count, audience):
+    return f"""
+    You are an AI assistant creating a quiz for {AUDIENCES[audience]}.
+    Based on the topic "{topic}", generate exactly {count} multiple-choice questions (MCQs).
+
+    IMPORTANT: Your entire response must be a single, raw JSON object and nothing else.
+    The JSON object must have a single key "questions".
+    The value of "questions" must be a list of exactly {count} question objects.
+    Each question object must have these exact keys:
+    - "question": A string with the question text.
+    - "options": A list of exactly 4 strings representing the possible answers.
+    - "correct_answer": A string that is an exact match to one of the options.
+
+    Make the questions educational and distinct from each other.
+    Ensure all questions are related to {topic}.
+    """
+
+def valid_questions(ai_response, count):
+    """Well-formed, de-duplicated questions from a model response (at most count)"""
+    if not isinstance(ai_response, dict) or not isinstance(ai_response.get('questions'), list):
+        return []
+    questions = []
+    seen = set()
+    for q in ai_response['questions']:
+        if not (isinstance(q, dict) and isinstance(q.get('question'), str) and
+                isinstance(q.get('options'), list) and len(q['options']) >= 4 and
+                q.get('correct_answer') in q['options']):
+            continue
+        text = normalize_topic(q['question'])
+        if text in seen:
+            continue
+        seen.add(text)
+        questions.append({
+            'question': q['question'],
+            'options': q['options'],
+            'correct_answer': q['correct_answer']
+        })
+    return questions[:count]
+
+def _load(key):
+    doc = generated_quizzes_collection.find_one({'_id': key}, {'questions': 1})
+    return doc['questions'] if doc else None
+
+def _store(key, topic, count, audience, questions):
+    now = datetime.utcnow()
+    generated_quizzes_collection.update_one({'_id': key}, {
+        '$set': {'questions': questions, 'generated_at': now,
+                 'expires_at': now + timedelta(days=QUIZ_GENERATION_CACHE_DAYS)},
+        '$setOnInsert': {'topic': topic, 'topic_key': normalize_topic(topic),
+                         'count': count, 'audience': audience}
+    }, upsert=True)
+
+def _generate_and_store(key, topic, count, audience):
+    print(f"Generating quiz for topic: {topic}, questions: {count}")
+    ai_response = get_ai_response(build_prompt(topic, count, audience), schema='quiz', call_site='quiz_generation',
+                                  expected={'questions': count})
+    questions = valid_questions(ai_response, count)
+    if questions:
+        print(f"Successfully generated {len(questions)} valid questions")
+        _store(key, topic, count, audience, questions)
+    return questions
+
+def get_or_generate(topic, count, audience=DEFAULT_AUDIENCE):
+    """
+    Returns:
+        (quiz_id, questions, source) with source "memory", "stored", "ai" or
+        "fallback"; quiz_id is None for the fallback
+    """
+    key = quiz_key(topic, count, audience)
+    questions = _memory.get(key)
+    if questions:
+        return key, questions, 'memory'
+    questions = _load(key)
+    if questions:
+        _memory.set(key, questions, time.time() + QUIZ_GENERATION_MEMORY_TTL_SECONDS)
+        return key, questions, 'stored'
+
+    # Identical requests arriving together in this worker share one model call
+    with _inflight_lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+    if leader:
+        try:
+            questions = _generate_and_store(key, topic, count, audience)
+        except Exception as e:
+            print(f"Error in quiz generation: {e}")
+            questions = []
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+            event.set()
+    else:
+        event.wait()
+        questions = _load(key)
+
+    if questions:
+        _memory.set(key, questions, time.time() + QUIZ_GENERATION_MEMORY_TTL_SECONDS)
+        return key, questions, 'ai'
+    print("AI response invalid, using fallback quiz generation")
+    return None, get_quiz_fallback(topic, count)['questions'], 'fallback'
+
+def get_generated_quiz(quiz_id):
+    """Stored questions for a quiz id returned by get_or_generate or a job, or None"""
+    return _memory.get(quiz_id) or _load(quiz_id)
+
+# --- Background jobs --------------------------------------------------------
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """Thread pool for jobs, recreated after a fork"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=max(1, QUIZ_JOB_WORKERS), thread_name_prefix='quiz-job')
+            _executor_pid = os.getpid()
+        return _executor
+
+def _run_job(job_id, topic, count, audience):
+    quiz_jobs_collection.update_one({'_id': job_id}, {'$set': {'status': 'running', 'started_at': datetime.utcnow()}})
+    try:
+        quiz_id, questions, source = get_or_generate(topic, count, audience)
+        if source == 'fallback':
+            fields = {'status': 'failed', 'error': 'The AI service did not return a usable quiz'}
+        else:
+            fields = {'status': 'done', 'quiz_id': quiz_id, 'question_count': len(questions)}
+    except Exception as e:
+        print(f"Quiz job {job_id} failed: {e}")
+        fields = {'status': 'failed', 'error': 'Quiz generation failed'}
+    fields['finished_at'] = datetime.utcnow()
+    quiz_jobs_collection.update_one({'_id': job_id}, {'$set': fields})
+
+def submit_job(topic, count, audience=DEFAULT_AUDIENCE, requested_by=None):
+    """
+    Queue generation and return the job document. Already generated quizzes
+    complete immediately; a pending job for the same request is reused.
+    """
+    key = quiz_key(topic, count, audience)
+    now = datetime.utcnow()
+    job = {
+        '_id': uuid.uuid4().hex, 'key': key, 'topic': topic, 'count': count, 'audience': audience,
+        'requested_by': requested_by, 'created_at': now,
+        'expires_at': now + timedelta(hours=QUIZ_JOB_TTL_HOURS)
+    }
+
+    questions = _memory.get(key) or _load(key)
+    if questions:
+        job.update(status='done', quiz_id=key, question_count=len(questions), finished_at=now)
+        quiz_jobs_collection.insert_one(job)
+        return job
+
+    pending = quiz_jobs_collection.find_one({
+        'key': key,
+        '$or': [
+            {'status': 'queued', 'created_at': {'$gt': now - timedelta(seconds=QUIZ_JOB_TIMEOUT_SECONDS)}},
+            {'status': 'running', 'started_at': {'$gt': now - timedelta(seconds=QUIZ_JOB_TIMEOUT_SECONDS)}}
+        ]
+    })
+    if pending:
+        return pending
+
+    job['status'] = 'queued'
+    quiz_jobs_collection.insert_one(job)
+    _get_executor().submit(_run_job, job['_id'], topic, count, audience)
+    return job
+
+def get_job(job_id):
+    """Job status, with the generated questions once it is done"""
+    job = quiz_jobs_collection.find_one({'_id': job_id})
+    if not job:
+        return None
+    status = job['status']
+    if status in ('queued', 'running') and \
+            datetime.utcnow() - job.get('started_at', job['created_at']) > timedelta(seconds=QUIZ_JOB_TIMEOUT_SECONDS):
+        status = 'failed'
+        job['error'] = 'Timed out; submit the request again'
+    result = {
+        'job_id': job['_id'],
+        'status': status,
+        'topic': job['topic'],
+        'num_questions': job['count'],
+        'audience': job['audience'],
+        'created_at': job['created_at']
+    }
+    if status == 'done':
+        result['quiz_id'] = job['quiz_id']
+        result['questions'] = get_generated_quiz(job['quiz_id'])
+    if status == 'failed':
+        result['error'] = job.get('error')
+    return result
@@ -0,0 +1,89 @@
+# quiz_service.py - Teacher quiz questions: stored in Mongo, cached per process
+#
+# The questions live only in the assignment document (teacher_assignments.quizQuestions).
+# Reads go through a small LRU cache in each worker. To keep workers consistent,
+# every write also bumps a shared version stamp (cache_versions._id = "quiz_questions");
+# each worker re-reads the stamp at most every QUIZ_STAMP_CHECK_SECONDS and drops
+# its cache when the stamp has moved. So a change is visible immediately on the
+# worker that made it and within QUIZ_STAMP_CHECK_SECONDS everywhere else, at the
+# cost of one tiny _id lookup per check interval, not one quiz read per request.
+
+import os
+import threading
+import time
+from bson import ObjectId
+from bson.errors import InvalidId
+from ..cache import LRUCache
+from ..database import teacher_assignments_collection, cache_versions_collection
+
+QUIZ_CACHE_SIZE = int(os.getenv('QUIZ_CACHE_SIZE', 1024))
+QUIZ_CACHE_TTL_SECONDS = int(os.getenv('QUIZ_CACHE_TTL_SECONDS', 300))
+QUIZ_STAMP_CHECK_SECONDS = float(os.getenv('QUIZ_STAMP_CHECK_SECONDS', 1))
+
+STAMP_ID = 'quiz_questions'
+
+# Cached for ids with no quiz, so repeated misses don't reach Mongo either
+_MISSING = object()
+
+_cache = LRUCache(QUIZ_CACHE_SIZE)
+_stamp_lock = threading.Lock()
+_stamp = {'version': None, 'checked_at': 0.0}
+
+def _read_stamp():
+    doc = cache_versions_collection.find_one({'_id': STAMP_ID}, {'version': 1})
+    return (doc or {}).get('version', 0)
+
+def _check_stamp():
+    """Drop this worker's cache if another worker has changed a quiz since the last check"""
+    now = time.monotonic()
+    if now - _stamp['checked_at'] < QUIZ_STAMP_CHECK_SECONDS:
+        return
+    with _stamp_lock:
+        if now - _stamp['checked_at'] < QUIZ_STAMP_CHECK_SECONDS:
+            return
+        version = _read_stamp()
+        if version != _stamp['version']:
+            _cache.clear()
+            _stamp['version'] = version
+        _stamp['checked_at'] = now
+
+def _object_id(assignment_id):
+    try:
+        return ObjectId(assignment_id)
+    except (InvalidId, TypeError):
+        return None
+
+def get_quiz_questions(assignment_id):
+    """
+    Quiz questions for an assignment, or None if it has none.
+    The list is shared with the cache: don't modify it.
+    """
+    _check_stamp()
+    assignment_id = str(assignment_id)
+    cached = _cache.get(assignment_id)
+    if cached is not None:
+        return None if cached is _MISSING else cached
+
+    oid = _object_id(assignment_id)
+    doc = teacher_assignments_collection.find_one({'_id': oid}, {'quizQuestions': 1, 'questions': 1}) if oid else None
+    # Older assignments kept the list under "questions"
+    questions = (doc or {}).get('quizQuestions') or (doc or {}).get('questions') or None
+    _cache.set(assignment_id, questions if questions else _MISSING, time.time() + QUIZ_CACHE_TTL_SECONDS)
+    return questions
+
+def invalidate(assignment_id=None):
+    """Forget cached questions here and tell the other workers to do the same"""
+    if assignment_id is None:
+        _cache.clear()
+    else:
+        _cache.delete(str(assignment_id))
+    cache_versions_collection.update_one({'_id': STAMP_ID}, {'$inc': {'version': 1}}, upsert=True)
+
+def set_quiz_questions(assignment_id, questions):
+    """Replace an assignment's questions; returns False if the assignment doesn't exist"""
+    oid = _object_id(assignment_id)
+    if oid is None:
+        return False
+    result = teacher_assignments_collection.update_one({'_id': oid}, {'$set': {'quizQuestions': questions}})
+    invalidate(assignment_id)
+    return result.matched_count == 1
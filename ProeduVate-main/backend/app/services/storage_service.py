@@ -0,0 +1,198 @@
+# storage_service.py - Where uploaded files live: local disk or an S3-compatible bucket
+#
+# Files are addressed by key, e.g.
+#   objects/<sha[:2]>/<sha>                       assignment submissions (see upload_service)
+#   resumes/<user_id>_<filename>                  student resumes
+#   resumes/submissions/<assignment_id>/<file>    submissions saved before content addressing
+# The local backend maps keys onto the uploads/ folder, so existing files keep working.
+#
+# STORAGE_BACKEND=s3 stores them in STORAGE_BUCKET instead (AWS, MinIO, ...), and
+# downloads are redirected to presigned URLs so file bytes never pass through the
+# app and every node can serve every file.
+
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local').lower()
+STORAGE_ROOT = os.getenv('UPLOAD_ROOT', os.path.join(BACKEND_ROOT, 'uploads'))
+# Scratch space for files being received; on the same disk as STORAGE_ROOT so moves are renames
+TEMP_DIR = os.path.join(STORAGE_ROOT, 'parts')
+STORAGE_BUCKET = os.getenv('STORAGE_BUCKET')
+STORAGE_PREFIX = os.getenv('STORAGE_PREFIX', '')
+STORAGE_ENDPOINT_URL = os.getenv('STORAGE_ENDPOINT_URL')  # e.g. http://localhost:9000 for MinIO
+STORAGE_REGION = os.getenv('STORAGE_REGION', os.getenv('AWS_REGION', 'us-east-1'))
+STORAGE_URL_EXPIRES = int(os.getenv('STORAGE_URL_EXPIRES', 3600))
+# Set when the bucket (or a CDN in front of it) is publicly readable: links skip signing
+STORAGE_PUBLIC_URL = os.getenv('STORAGE_PUBLIC_URL', '').rstrip('/')
+
+class LocalStorage:
+    """Keys are paths under a root folder on this machine"""
+
+    name = 'local'
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def save_file(self, key, source_path, content_type=None):
+        """Move a finished local file into storage under key"""
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # mkstemp files are 0600; the web server reads them directly in X-Accel/X-Sendfile mode
+        os.chmod(source_path, 0o644)
+        os.replace(source_path, target)
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    @contextmanager
+    def local_copy(self, key):
+        """A filesystem path to the file, for libraries that need one"""
+        yield self.path(key)
+
+    def download_url(self, key, filename=None):
+        """None: the app serves local files itself"""
+        return None
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+class S3Storage:
+    """Keys are objects in one bucket, optionally under a prefix"""
+
+    name = 's3'
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None):
+        if not bucket:
+            raise ValueError("STORAGE_BUCKET is required when STORAGE_BACKEND=s3")
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # boto3 is imported on first use, as in lambda_service
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import boto3
+                    self._client = boto3.client('s3', endpoint_url=self.endpoint_url, region_name=self.region)
+        return self._client
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def save_file(self, key, source_path, content_type=None):
+        """Upload a finished local file (multipart for large files) and remove the local copy"""
+        extra = {'ContentType': content_type} if content_type else None
+        self.client.upload_file(source_path, self.bucket, self._key(key), ExtraArgs=extra)
+        os.remove(source_path)
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body']
+
+    @contextmanager
+    def local_copy(self, key):
+        """Download to a temp file; like LocalStorage, a missing key yields a path that doesn't exist"""
+        from botocore.exceptions import ClientError
+        handle, path = tempfile.mkstemp(suffix=os.path.splitext(key)[1])
+        os.close(handle)
+        try:
+            try:
+                self.client.download_file(self.bucket, self._key(key), path)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+                    raise
+                os.remove(path)
+            yield path
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def download_url(self, key, filename=None):
+        if STORAGE_PUBLIC_URL:
+            return f"{STORAGE_PUBLIC_URL}/{quote(self._key(key))}"
+        params = {'Bucket': self.bucket, 'Key': self._key(key)}
+        if filename:
+            params['ResponseContentDisposition'] = f"inline; filename*=UTF-8''{quote(filename)}"
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=STORAGE_URL_EXPIRES)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """The configured storage backend (created on first use)"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == 's3':
+                    _storage = S3Storage(STORAGE_BUCKET, STORAGE_PREFIX, STORAGE_ENDPOINT_URL, STORAGE_REGION)
+                else:
+                    _storage = LocalStorage(STORAGE_ROOT)
+    return _storage
+
+def save_stream(key, stream, content_type=None):
+    """Store a file-like object under key (copied to a local temp file first)"""
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    handle, path = tempfile.mkstemp(dir=TEMP_DIR)
+    try:
+        with os.fdopen(handle, 'wb') as out:
+            shutil.copyfileobj(stream, out, 1024 * 1024)
+        get_storage().save_file(key, path, content_type)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+def send_stored(key, filename=None, sha256=None):
+    """
+    Response for downloading a stored file: a redirect to the bucket when the
+    backend provides URLs, otherwise the file itself (see file_serving).
+    Pass sha256 for content-addressed keys: it is the ETag, and the file can be
+    cached as immutable.
+    """
+    from flask import redirect, jsonify
+    from ..file_serving import send_path
+    storage = get_storage()
+    filename = filename or os.path.basename(key)
+    url = storage.download_url(key, filename)
+    if url:
+        return redirect(url, code=302)
+    try:
+        path = storage.path(key)
+    except ValueError:
+        return jsonify({"error": "File not found"}), 404
+    return send_path(path, filename, etag=sha256, immutable=sha256 is not None)
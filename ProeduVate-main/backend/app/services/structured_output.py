@@ -0,0 +1,426 @@
+# structured_output.py - Turning model output into the JSON a call site expects
+#
+# Each JSON call site names a schema (SCHEMAS below, a small JSON-Schema subset).
+# ai_service.get_ai_response asks the model for JSON mode with that schema where
+# the SDK supports it, and hands the text to request_json, which:
+#   1. parses it, repairing locally when needed: code fences, prose around the
+#      object, trailing commas, an answer cut off in the middle of a list;
+#   2. conforms it to the schema: list items that don't match are dropped,
+#      invalid optional fields are removed, bad required fields are collected;
+#   3. asks again for only the failing portion - "N more items for this list"
+#      or "just these fields" - and merges the answer in.
+# Outcomes are counted per call site and exposed as llm_json_parse_total on /metrics.
+
+import json
+import os
+import re
+import threading
+
+AI_JSON_MAX_REASKS = int(os.getenv('AI_JSON_MAX_REASKS', 1))
+
+# Items already received that are quoted back when asking for more, and their length
+REASK_LISTED_ITEMS = 30
+REASK_ITEM_CHARS = 120
+
+OUTCOMES = ('ok', 'repaired', 'reasked', 'failed')
+
+def _answer_in_options(item):
+    return item['correct_answer'] in item['options']
+
+def _string(min_length=1):
+    return {'type': 'string', 'minLength': min_length}
+
+def _string_list(min_items=0):
+    return {'type': 'array', 'items': _string(), 'minItems': min_items}
+
+def _mcq(key, extra_fields=(), required_extra=()):
+    properties = {
+        'question': _string(),
+        'options': _string_list(min_items=4),
+        'correct_answer': _string()
+    }
+    properties.update({name: _string() for name in extra_fields})
+    return {
+        'type': 'object',
+        'required': [key],
+        'properties': {
+            key: {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'required': ['question', 'options', 'correct_answer', *required_extra],
+                    'properties': properties,
+                    'check': _answer_in_options
+                }
+            }
+        }
+    }
+
+SCHEMAS = {
+    'quiz': _mcq('questions'),
+    'aptitude_questions': _mcq('questions', extra_fields=('explanation', 'difficulty')),
+    'practice_questions': _mcq('practice_questions',
+                               extra_fields=('step_by_step_solution', 'tips_and_tricks', 'difficulty')),
+    'topic_concepts': {
+        'type': 'object',
+        'required': ['concepts'],
+        'properties': {
+            'topic': _string(),
+            'concepts': {
+                'type': 'array',
+                'minItems': 1,
+                'items': {
+                    'type': 'object',
+                    'required': ['title', 'description'],
+                    'properties': {
+                        'title': _string(), 'description': _string(),
+                        'formula': _string(0), 'example': _string(0)
+                    }
+                }
+            },
+            'tips_and_tricks': _string_list(),
+            'key_points': _string_list()
+        }
+    },
+    'ats': {
+        'type': 'object',
+        'required': ['match_score', 'matching_keywords', 'missing_keywords', 'summary'],
+        'properties': {
+            'match_score': {'type': 'number', 'minimum': 0, 'maximum': 100},
+            'matching_keywords': _string_list(),
+            'missing_keywords': _string_list(),
+            'summary': _string()
+        }
+    },
+    'resume_profile': {
+        'type': 'object',
+        'required': ['role', 'seniority', 'skills'],
+        'properties': {
+            'role': _string(),
+            'seniority': _string(),
+            'skills': _string_list(min_items=1),
+            'domains': _string_list(),
+            'highlights': _string_list()
+        }
+    },
+    'interview_pool': {
+        'type': 'object',
+        'required': ['opening', 'personality', 'problem_solving', 'skills', 'behavioral'],
+        'properties': {
+            'opening': _string_list(),
+            'personality': _string_list(),
+            'problem_solving': _string_list(),
+            'skills': _string_list(),
+            'behavioral': _string_list()
+        }
+    },
+    'interview_answer_eval': {
+        'type': 'object',
+        'required': ['score', 'feedback'],
+        'properties': {
+            'score': {'type': 'integer', 'minimum': 0, 'maximum': 100},
+            'feedback': _string(),
+            'strengths': _string_list(),
+            'mistakes': _string_list()
+        }
+    },
+    'interview_eval': {
+        'type': 'object',
+        'required': ['score', 'feedback', 'strengths', 'mistakes'],
+        'properties': {
+            'score': {'type': 'integer', 'minimum': 0, 'maximum': 100},
+            'feedback': _string(),
+            'strengths': _string_list(),
+            'mistakes': _string_list()
+        }
+    }
+}
+
+# Parse outcomes per call site
+_parse_metrics = {}
+_parse_metrics_lock = threading.Lock()
+
+def record_parse(call_site, outcome):
+    with _parse_metrics_lock:
+        stats = _parse_metrics.setdefault(call_site, dict.fromkeys(OUTCOMES, 0))
+        stats[outcome] += 1
+
+def get_parse_metrics():
+    """Snapshot of parse outcome counts per call site"""
+    with _parse_metrics_lock:
+        return {call_site: dict(stats) for call_site, stats in _parse_metrics.items()}
+
+# --- Local repair -----------------------------------------------------------
+
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+def _strip_fences(text):
+    if "```json" in text:
+        start = text.find("```json") + 7
+        end = text.rfind("```")
+        return text[start:end if end >= start else len(text)].strip()
+    if "```" in text:
+        start = text.find("```") + 3
+        end = text.rfind("```")
+        return text[start:end if end >= start else len(text)].strip()
+    return text.strip()
+
+def _close_truncated(text):
+    """
+    Make a cut-off document parseable: go back to the last point where a value
+    was complete (a comma or closing bracket outside a string), drop the partial
+    value after it, and close every bracket still open there.
+    """
+    stack = []
+    in_string = escaped = False
+    cut = None  # (index, open brackets at that index)
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append(char)
+        elif char in '}]':
+            if stack:
+                stack.pop()
+            cut = (i + 1, list(stack))
+            if not stack:
+                return text[:i + 1]
+        elif char == ',':
+            cut = (i, list(stack))
+    if cut is None:
+        return text
+    index, still_open = cut
+    closers = ''.join('}' if bracket == '{' else ']' for bracket in reversed(still_open))
+    return text[:index].rstrip().rstrip(',') + closers
+
+def parse_json(text):
+    """
+    Returns:
+        (data, repaired) - repaired is True when the text needed local fixes
+    Raises:
+        ValueError if the text can't be turned into JSON
+    """
+    cleaned = _strip_fences(text or '')
+    starts = [i for i in (cleaned.find('{'), cleaned.find('[')) if i >= 0]
+    if not starts:
+        raise ValueError("No JSON object in response")
+    start = min(starts)
+    decoder = json.JSONDecoder()
+
+    attempts = [cleaned[start:]]
+    attempts.append(_TRAILING_COMMA.sub(r'\1', attempts[0]))
+    attempts.append(_TRAILING_COMMA.sub(r'\1', _close_truncated(attempts[1])))
+    for n, candidate in enumerate(attempts):
+        try:
+            data, end = decoder.raw_decode(candidate)
+        except json.JSONDecodeError:
+            continue
+        # Prose before or after the object counts as a repair too
+        return data, bool(n) or start > 0 or bool(candidate[end:].strip())
+    raise ValueError("Response is not valid JSON, even after repair")
+
+# --- Validation -------------------------------------------------------------
+
+def _coerce_number(value, integer):
+    if isinstance(value, str):
+        try:
+            value = float(value.strip().rstrip('%'))
+        except ValueError:
+            return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if integer:
+        return int(round(value))
+    return value
+
+def conform(value, schema, path=''):
+    """
+    Returns:
+        (value fitted to the schema or None if it can't be, list of (path, problem)).
+        Items that fail their schema are dropped from lists; the caller decides
+        whether a list ended up too short.
+    """
+    kind = schema['type']
+    if kind == 'string':
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str) or len(value.strip()) < schema.get('minLength', 0):
+            return None, [(path, 'expected a non-empty string')]
+        return value, []
+
+    if kind in ('integer', 'number'):
+        number = _coerce_number(value, kind == 'integer')
+        if number is None:
+            return None, [(path, f'expected {kind}')]
+        if not schema.get('minimum', number) <= number <= schema.get('maximum', number):
+            return None, [(path, f"expected {kind} from {schema.get('minimum')} to {schema.get('maximum')}")]
+        return number, []
+
+    if kind == 'array':
+        if not isinstance(value, list):
+            return None, [(path, 'expected a list')]
+        items = []
+        for item in value:
+            fitted, problems = conform(item, schema['items'], path + '[]')
+            if not problems:
+                items.append(fitted)
+        if len(items) < schema.get('minItems', 0):
+            return None, [(path, f"expected at least {schema['minItems']} valid items")]
+        return items, []
+
+    # object
+    if not isinstance(value, dict):
+        return None, [(path, 'expected an object')]
+    result = {}
+    problems = []
+    for key, child in schema.get('properties', {}).items():
+        child_path = f"{path}.{key}" if path else key
+        if key not in value:
+            if key in schema.get('required', ()):
+                problems.append((child_path, 'missing'))
+            continue
+        fitted, child_problems = conform(value[key], child, child_path)
+        if not child_problems:
+            result[key] = fitted
+        elif key in schema.get('required', ()):
+            problems.extend(child_problems)
+    check = schema.get('check')
+    if not problems and check and not check(result):
+        problems.append((path, 'failed consistency check'))
+    return result, problems
+
+def gemini_schema(schema):
+    """The schema in the OpenAPI subset Gemini's response_schema takes"""
+    converted = {'type': schema['type'].upper()}
+    if schema['type'] == 'object':
+        converted['properties'] = {key: gemini_schema(child) for key, child in schema['properties'].items()}
+        converted['required'] = list(schema.get('required', ()))
+    elif schema['type'] == 'array':
+        converted['items'] = gemini_schema(schema['items'])
+    return converted
+
+# --- Re-asking for the failing portion --------------------------------------
+
+def _summarize(item):
+    if isinstance(item, dict):
+        item = item.get('question') or item.get('title') or json.dumps(item)
+    return str(item)[:REASK_ITEM_CHARS]
+
+def _more_items_prompt(prompt, key, items, missing):
+    listed = '\n    '.join(f"- {_summarize(item)}" for item in items[:REASK_LISTED_ITEMS])
+    return f"""{prompt}
+
+    You already produced these items for "{key}" - do not repeat any of them:
+    {listed or '- (none)'}
+
+    Return a JSON object with a single key "{key}" holding exactly {missing} NEW items,
+    each with the same structure as described above.
+    """
+
+def _fields_prompt(prompt, keys):
+    names = ', '.join(f'"{key}"' for key in keys)
+    return f"""{prompt}
+
+    Your previous answer was missing these keys or had invalid values for them: {names}.
+    Return a JSON object with ONLY these keys, with corrected values.
+    """
+
+def _shortfall(data, expected):
+    """{list key: number of items still missing} for lists below their expected length"""
+    return {
+        key: count - len(data.get(key) or [])
+        for key, count in (expected or {}).items()
+        if len(data.get(key) or []) < count
+    }
+
+def _dedupe(items):
+    seen = set()
+    unique = []
+    for item in items:
+        marker = _summarize(item).strip().lower()
+        if marker not in seen:
+            seen.add(marker)
+            unique.append(item)
+    return unique
+
+def request_json(prompt, text, schema_name=None, call_site=None, expected=None, ask=None):
+    """
+    Parse a model response for a call site, repairing and re-asking as needed.
+
+    Args:
+        prompt: the prompt that produced text (re-asks extend it)
+        text: the model's response, or None if the call failed
+        schema_name: key in SCHEMAS, or None to only parse
+        expected: {list key: item count} the caller asked for
+        ask: function(prompt) -> response text, used for re-asks
+    Returns:
+        The conformed data, or None if nothing usable came back.
+    """
+    call_site = call_site or schema_name or 'unspecified'
+    schema = SCHEMAS.get(schema_name)
+    outcome = 'ok'
+
+    if not text:
+        # The call itself failed; that is counted in external_call_errors_total
+        return None
+    try:
+        data, repaired = parse_json(text)
+    except ValueError as e:
+        print(f"Failed to parse JSON response ({call_site}): {e}")
+        record_parse(call_site, 'failed')
+        return None
+    if repaired:
+        outcome = 'repaired'
+    if schema is None:
+        record_parse(call_site, outcome)
+        return data
+
+    data, problems = conform(data, schema)
+    if data is not None:
+        for key in (expected or {}):
+            data[key] = _dedupe(data.get(key) or [])[:expected[key]]
+
+    for _ in range(AI_JSON_MAX_REASKS if ask else 0):
+        if data is None:
+            break
+        # Short lists are topped up below rather than regenerated whole
+        bad_fields = sorted({path.split('.')[0].split('[')[0] for path, _ in problems if path} - set(expected or ()))
+        missing = _shortfall(data, expected)
+        if not bad_fields and not missing:
+            break
+        outcome = 'reasked'
+        if bad_fields:
+            print(f"AI response for {call_site} had invalid fields {bad_fields}; asking again for those")
+            patch = _reask(_fields_prompt(prompt, bad_fields), ask)
+            if isinstance(patch, dict):
+                data.update({key: patch[key] for key in bad_fields if key in patch})
+        for key, count in missing.items():
+            print(f"AI response for {call_site} was {count} {key} short; asking for the rest")
+            more = _reask(_more_items_prompt(prompt, key, data.get(key) or [], count), ask)
+            if isinstance(more, dict) and isinstance(more.get(key), list):
+                data[key] = (data.get(key) or []) + more[key]
+        data, problems = conform(data, schema)
+        if data is not None:
+            for key in (expected or {}):
+                data[key] = _dedupe(data.get(key) or [])[:expected[key]]
+
+    if data is None or problems or any(not data.get(key) for key in (expected or {})):
+        print(f"AI response for {call_site} did not match its schema: {problems}")
+        record_parse(call_site, 'failed')
+        return None
+    record_parse(call_site, outcome)
+    return data
+
+def _reask(prompt, ask):
+    try:
+        return parse_json(ask(prompt))[0]
+    except (ValueError, TypeError):
+        return None
@@ -0,0 +1,365 @@
+# upload_service.py - Streaming, size-capped, content-addressed file uploads
+#
+# Uploaded bytes are written to a temporary file while the request body is parsed
+# (parse_upload_form), with the SHA-256 and the per-type size cap applied as they
+# arrive, then stored under the key objects/<sha[:2]>/<sha> (see storage_service). Identical files therefore end up stored once, and a
+# re-submission never overwrites the file an earlier submission points to.
+#
+# Large files can also be sent in pieces (resumable upload):
+#   POST /api/student/uploads            {filename, size} -> {upload_id, chunk_size}
+#   PUT  /api/student/uploads/<id>?student_id=<owner>   raw bytes, Content-Range: bytes <start>-<end>/<size>
+#   GET  /api/student/uploads/<id>?student_id=<owner>   -> {received}, to resume after a dropped connection
+# and the finished upload_id is passed to the submit endpoint instead of a file.
+# Part files live on the local disk of the node that received them, so chunks of
+# one upload must reach the same node (or share the uploads/parts folder); the
+# finished file goes to the configured storage backend. Parts whose session has
+# expired are deleted by sweep_orphaned_parts.
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import g
+from werkzeug.formparser import parse_form_data
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: chunks for one upload are not expected concurrently
+    fcntl = None
+
+from ..database import upload_sessions_collection
+from .storage_service import get_storage, TEMP_DIR as PARTS_DIR
+
+MB = 1024 * 1024
+
+COPY_CHUNK_SIZE = 1 * MB
+RESUMABLE_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_MB', 8)) * MB
+UPLOAD_SESSION_TTL_HOURS = float(os.getenv('UPLOAD_SESSION_TTL_HOURS', 24))
+UPLOAD_SWEEP_INTERVAL_SECONDS = int(os.getenv('UPLOAD_SWEEP_INTERVAL_SECONDS', 3600))
+# Part and temp files younger than this are never swept (a session may be being created)
+ORPHAN_GRACE_SECONDS = 3600
+
+# Per-extension size caps; UPLOAD_MAX_<EXT>_MB overrides one (e.g. UPLOAD_MAX_ZIP_MB=500)
+_DEFAULT_LIMITS_MB = {
+    'pdf': 25, 'doc': 25, 'docx': 25, 'txt': 2, 'json': 2,
+    'ppt': 100, 'pptx': 100, 'zip': 250, 'rar': 250
+}
+UPLOAD_SIZE_LIMITS = {
+    ext: int(float(os.getenv(f'UPLOAD_MAX_{ext.upper()}_MB', mb)) * MB)
+    for ext, mb in _DEFAULT_LIMITS_MB.items()
+}
+
+# Whole-request cap for Flask's MAX_CONTENT_LENGTH: the largest file plus form fields
+MAX_REQUEST_BYTES = max(max(UPLOAD_SIZE_LIMITS.values()), RESUMABLE_CHUNK_SIZE) + MB
+
+class UploadError(Exception):
+    """Upload rejected; status is the HTTP status the route should return"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+def size_limit(filename):
+    """Byte cap for this file type, or None if the type isn't accepted"""
+    return UPLOAD_SIZE_LIMITS.get(extension(filename))
+
+def object_key(sha256):
+    return f"objects/{sha256[:2]}/{sha256}"
+
+def _commit(tmp_path, sha256):
+    """Move a fully written temp file into storage (dropping it if already there)"""
+    storage = get_storage()
+    key = object_key(sha256)
+    if storage.exists(key):
+        os.remove(tmp_path)
+    else:
+        storage.save_file(key, tmp_path)
+    return key
+
+class SpooledUpload:
+    """
+    Where werkzeug's form parser writes one multipart file part (its stream_factory).
+    The part is hashed and checked against its type's size cap as it is parsed, and
+    lands in a temp file in PARTS_DIR: the body is read once and written once.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename or ''
+        self.limit = size_limit(self.filename)
+        if self.limit is None:
+            raise UploadError("File type not allowed")
+        os.makedirs(PARTS_DIR, exist_ok=True)
+        self.path = os.path.join(PARTS_DIR, f"{uuid.uuid4().hex}.tmp")
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self._file = open(self.path, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.limit:
+            raise UploadError(f"File exceeds the {self.limit // MB} MB limit for .{extension(self.filename)} files", 413)
+        self.digest.update(data)
+        return self._file.write(data)
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def store(self):
+        """Move the received file into the object store; returns {"sha256", "size", "key"}"""
+        self._file.close()
+        sha256 = self.digest.hexdigest()
+        return {"sha256": sha256, "size": self.size, "key": _commit(self.path, sha256)}
+
+    def close(self):
+        """Drop the temp file unless store() already moved it"""
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def parse_upload_form(request, max_content_length):
+    """
+    Parse a multipart request body, streaming each file part through SpooledUpload.
+    Use the returned (form, files) instead of request.form / request.files, which
+    would spool the whole body first; temp files are removed when the request ends
+    (see init_app).
+
+    Raises:
+        UploadError: a file part of a type that isn't accepted, or over its size cap
+    """
+    spools = g.setdefault('upload_spools', [])
+
+    def stream_factory(total_content_length, content_type, filename=None, content_length=None):
+        spool = SpooledUpload(filename)
+        spools.append(spool)
+        return spool
+
+    _, form, files = parse_form_data(request.environ, stream_factory=stream_factory,
+                                     max_content_length=max_content_length)
+    return form, files
+
+def close_spools(exc=None):
+    """teardown_request hook: drop temp files of file parts that weren't stored"""
+    for spool in g.pop('upload_spools', []):
+        spool.close()
+
+def init_app(app):
+    app.teardown_request(close_spools)
+
+def store_upload(file):
+    """Store a file part from parse_upload_form (or any file-like object) in the object store"""
+    if isinstance(file.stream, SpooledUpload):
+        return file.stream.store()
+    return store_stream(file.stream, file.filename)
+
+def store_stream(stream, filename):
+    """
+    Copy a file-like object into the object store.
+
+    Returns:
+        {"sha256", "size", "key"}
+
+    Raises:
+        UploadError: unsupported type (400) or over the type's size cap (413)
+    """
+    limit = size_limit(filename)
+    if limit is None:
+        raise UploadError("File type not allowed")
+
+    os.makedirs(PARTS_DIR, exist_ok=True)
+    tmp_path = os.path.join(PARTS_DIR, f"{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as out:
+            while True:
+                chunk = stream.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise UploadError(f"File exceeds the {limit // MB} MB limit for .{extension(filename)} files", 413)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    sha256 = digest.hexdigest()
+    return {"sha256": sha256, "size": size, "key": _commit(tmp_path, sha256)}
+
+# --- Resumable uploads ------------------------------------------------------
+
+def _part_path(upload_id):
+    return os.path.join(PARTS_DIR, f"{upload_id}.part")
+
+_last_sweep = 0
+_sweep_lock = threading.Lock()
+
+def sweep_orphaned_parts(force=False):
+    """
+    Delete part files whose upload session is gone (the TTL index removes expired
+    sessions, not their bytes) and temp files left by interrupted requests.
+    Runs at most once per UPLOAD_SWEEP_INTERVAL_SECONDS unless forced.
+
+    Returns:
+        number of files removed
+    """
+    global _last_sweep
+    if not force and time.time() - _last_sweep < UPLOAD_SWEEP_INTERVAL_SECONDS:
+        return 0
+    if not _sweep_lock.acquire(blocking=False):
+        return 0
+    try:
+        _last_sweep = time.time()
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        try:
+            names = os.listdir(PARTS_DIR)
+        except FileNotFoundError:
+            return 0
+
+        old = {}
+        for name in names:
+            if not name.endswith(('.part', '.tmp')):
+                continue
+            path = os.path.join(PARTS_DIR, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    old[name] = path
+            except FileNotFoundError:
+                continue
+
+        part_ids = [name[:-len('.part')] for name in old if name.endswith('.part')]
+        live = {doc['_id'] for doc in upload_sessions_collection.find(
+            {'_id': {'$in': part_ids}, 'status': 'uploading'}, {'_id': 1})} if part_ids else set()
+
+        removed = 0
+        for name, path in old.items():
+            if name.endswith('.part') and name[:-len('.part')] in live:
+                continue
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            print(f"Removed {removed} orphaned upload files from {PARTS_DIR}")
+        return removed
+    finally:
+        _sweep_lock.release()
+
+def create_session(filename, size, owner_id):
+    """Start a resumable upload after checking type and declared size"""
+    sweep_orphaned_parts()
+    limit = size_limit(filename)
+    if limit is None:
+        raise UploadError("File type not allowed")
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError("size must be a positive integer")
+    if size > limit:
+        raise UploadError(f"File exceeds the {limit // MB} MB limit for .{extension(filename)} files", 413)
+
+    os.makedirs(PARTS_DIR, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    open(_part_path(upload_id), 'wb').close()
+    now = datetime.utcnow()
+    session = {
+        "_id": upload_id,
+        "filename": filename,
+        "size": size,
+        "owner_id": owner_id,
+        "received": 0,
+        "status": "uploading",
+        "created_at": now,
+        "expires_at": now + timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+    }
+    upload_sessions_collection.insert_one(session)
+    return session
+
+def get_session(upload_id):
+    return upload_sessions_collection.find_one({"_id": upload_id})
+
+def append_chunk(session, start, stream, length):
+    """
+    Append one chunk at byte offset `start`. The offset must equal the bytes
+    already received, so a retried chunk is rejected (409) rather than duplicated.
+    Completes the upload when the last byte arrives.
+    """
+    if session["status"] != "uploading":
+        raise UploadError("Upload already completed", 409)
+    if length is None or length <= 0 or length > RESUMABLE_CHUNK_SIZE:
+        raise UploadError(f"Chunks must be between 1 byte and {RESUMABLE_CHUNK_SIZE // MB} MB")
+    if start + length > session["size"]:
+        raise UploadError("Chunk extends past the declared file size")
+
+    path = _part_path(session["_id"])
+    if not os.path.exists(path):
+        raise UploadError("Upload not found on this server", 404)
+
+    with open(path, 'r+b') as part:
+        if fcntl is not None:
+            fcntl.flock(part, fcntl.LOCK_EX)
+        part.seek(0, os.SEEK_END)
+        received = part.tell()
+        if start != received:
+            raise UploadError(f"Expected offset {received}", 409)
+        remaining = length
+        while remaining:
+            chunk = stream.read(min(COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            part.write(chunk)
+            remaining -= len(chunk)
+        part.flush()
+        received = part.tell()
+        if remaining:
+            # Client disconnected mid-chunk: drop the partial chunk so it can be resent
+            part.truncate(start)
+            received = start
+
+    upload_sessions_collection.update_one({"_id": session["_id"]}, {"$set": {"received": received}})
+    session["received"] = received
+    if received == session["size"]:
+        return complete_session(session)
+    return session
+
+def complete_session(session):
+    """Hash the assembled part file and move it into the object store"""
+    path = _part_path(session["_id"])
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for chunk in iter(lambda: part.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+    _commit(path, sha256)
+
+    fields = {"status": "complete", "sha256": sha256, "received": session["size"]}
+    upload_sessions_collection.update_one({"_id": session["_id"]}, {"$set": fields})
+    session.update(fields)
+    return session
+
+def session_status(session):
+    return {
+        "upload_id": session["_id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "received": session["received"],
+        "status": session["status"],
+        "chunk_size": RESUMABLE_CHUNK_SIZE,
+        "sha256": session.get("sha256")
+    }
@@ -0,0 +1,30 @@
+# lms_portal_backend/app/warmup.py
+
+import time
+
+def warmup():
+    """
+    Import the heavy SDKs ahead of time.
+
+    Routes import these lazily on first use. Calling this in the gunicorn master
+    (see gunicorn.conf.py) moves the cost before the fork, so every worker starts
+    with the modules already loaded and shared copy-on-write. No network clients
+    are created here; those are not fork-safe.
+    """
+    from .services.ai_service import get_genai
+    from .services.gd_service import get_openai
+
+    steps = [
+        ("google.generativeai", get_genai),
+        ("fitz", lambda: __import__("fitz")),
+        ("boto3", lambda: __import__("boto3")),
+        ("openai", get_openai),
+    ]
+
+    for name, load in steps:
+        start = time.perf_counter()
+        try:
+            load()
+            print(f"Warmup: imported {name} in {(time.perf_counter() - start) * 1000:.0f} ms")
+        except ImportError as e:
+            print(f"Warmup: skipped {name} ({e})")
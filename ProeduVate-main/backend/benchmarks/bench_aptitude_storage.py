@@ -0,0 +1,153 @@
+"""
+Storage benchmark for aptitude submissions.
+
+Compares the old layout (answers dict + full evaluation with every question,
+option and explanation) against the compact one (question ids into the bank,
+one byte per chosen option, correctness bitset).
+
+By default a sample of documents is BSON-encoded/decoded in memory and the
+totals are extrapolated to --submissions. With --mongo-uri the documents are
+actually inserted into a scratch database and collStats plus a timed read of
+every submission are reported (the scratch database is dropped afterwards).
+
+Usage (from the backend folder):
+    python benchmarks/bench_aptitude_storage.py
+    python benchmarks/bench_aptitude_storage.py --mongo-uri mongodb://localhost:27017 --submissions 1000000
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+import bson
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017')
+from app.services.aptitude_service import evaluate_aptitude_test  # noqa: E402
+from app.services.aptitude_storage import question_id, compact_submission_fields  # noqa: E402
+
+QUESTIONS_PER_TEST = 50
+BANK_SIZE = 2000
+
+def make_bank(rng):
+    bank = []
+    for i in range(BANK_SIZE):
+        options = [f"{rng.randint(1, 999)} units" for _ in range(4)]
+        bank.append({
+            "question": f"A train covers {rng.randint(100, 900)} km in {rng.randint(2, 12)} hours. "
+                        f"Question {i}: what is its average speed in km/h, assuming constant speed?",
+            "options": options,
+            "correct_answer": options[rng.randrange(4)],
+            "explanation": "Average speed is total distance divided by total time taken. " * 2,
+            "difficulty": "medium"
+        })
+    return bank
+
+def make_pair(rng, bank, student_ids):
+    """One submission in the old and the compact layout"""
+    questions = rng.sample(bank, QUESTIONS_PER_TEST)
+    answers = {str(i): rng.choice(q['options']) for i, q in enumerate(questions) if rng.random() < 0.9}
+    evaluation = evaluate_aptitude_test(questions, answers)
+    common = {
+        "_id": ObjectId(),
+        "student_id": rng.choice(student_ids),
+        "test_id": str(ObjectId()),
+        "type": "aptitude",
+        "topic": "Time and Distance",
+        "total_questions": evaluation['total_questions'],
+        "correct_answers": evaluation['correct_answers'],
+        "incorrect_answers": evaluation['incorrect_answers'],
+        "unanswered": evaluation['unanswered'],
+        "score": evaluation['score'],
+        "time_taken": rng.randint(600, 3600),
+        "submitted_at": datetime.datetime.utcnow()
+    }
+    old = dict(common, answers=answers, evaluation=evaluation)
+    new = dict(common, **compact_submission_fields([question_id(q) for q in questions], evaluation))
+    return old, new
+
+def in_memory(args, rng, bank, student_ids):
+    old_sizes, new_sizes = 0, 0
+    old_blobs, new_blobs = [], []
+    for _ in range(args.sample):
+        old, new = make_pair(rng, bank, student_ids)
+        old_blobs.append(bson.encode(old))
+        new_blobs.append(bson.encode(new))
+        old_sizes += len(old_blobs[-1])
+        new_sizes += len(new_blobs[-1])
+
+    def decode_time(blobs):
+        start = time.perf_counter()
+        for blob in blobs:
+            bson.decode(blob)
+        return time.perf_counter() - start
+
+    scale = args.submissions / args.sample
+    bank_bytes = sum(len(bson.encode(dict(q, _id=question_id(q)))) for q in bank)
+    print(f"Extrapolated from {args.sample} sampled documents to {args.submissions:,} submissions")
+    print(f"  old layout:     {old_sizes * scale / 2**20:10.1f} MiB   ({old_sizes / args.sample:.0f} B/doc)")
+    print(f"  compact layout: {new_sizes * scale / 2**20:10.1f} MiB   ({new_sizes / args.sample:.0f} B/doc)"
+          f" + {bank_bytes / 2**20:.1f} MiB bank")
+    print(f"  reduction:      {old_sizes / new_sizes:.1f}x")
+    old_t, new_t = decode_time(old_blobs), decode_time(new_blobs)
+    print(f"  BSON decode:    {old_t * scale:.1f}s -> {new_t * scale:.1f}s for all submissions "
+          f"({old_t / new_t:.1f}x faster)")
+
+def against_mongo(args, rng, bank, student_ids):
+    from pymongo import MongoClient
+
+    client = MongoClient(args.mongo_uri)
+    db = client['lms_portal_storage_bench']
+    client.drop_database(db.name)
+    try:
+        for name in ('old', 'compact'):
+            db[name].create_index('student_id')
+        batch_old, batch_new = [], []
+        start = time.perf_counter()
+        for i in range(args.submissions):
+            old, new = make_pair(rng, bank, student_ids)
+            batch_old.append(old)
+            batch_new.append(new)
+            if len(batch_old) == 5000 or i == args.submissions - 1:
+                db.old.insert_many(batch_old)
+                db.compact.insert_many(batch_new)
+                batch_old, batch_new = [], []
+        print(f"Inserted {args.submissions:,} submissions per layout in {time.perf_counter() - start:.0f}s")
+
+        for name in ('old', 'compact'):
+            stats = db.command('collStats', name)
+            start = time.perf_counter()
+            for _ in db[name].find({}, batch_size=5000):
+                pass
+            scan = time.perf_counter() - start
+            start = time.perf_counter()
+            for student_id in student_ids[:200]:
+                list(db[name].find({'student_id': student_id}).sort('submitted_at', -1).limit(10))
+            recent = (time.perf_counter() - start) / 200
+            print(f"  {name:<8} size {stats['size'] / 2**20:9.1f} MiB  storage {stats['storageSize'] / 2**20:9.1f} MiB"
+                  f"  full scan {scan:6.1f}s  recent-10 per student {recent * 1000:.1f} ms")
+    finally:
+        client.drop_database(db.name)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--submissions', type=int, default=1_000_000)
+    parser.add_argument('--sample', type=int, default=10_000, help='Documents encoded in memory')
+    parser.add_argument('--students', type=int, default=20_000)
+    parser.add_argument('--mongo-uri', help='Insert into a scratch database on this server instead')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    bank = make_bank(rng)
+    student_ids = [str(ObjectId()) for _ in range(args.students)]
+    if args.mongo_uri:
+        against_mongo(args, rng, bank, student_ids)
+    else:
+        in_memory(args, rng, bank, student_ids)
+
+if __name__ == '__main__':
+    main()
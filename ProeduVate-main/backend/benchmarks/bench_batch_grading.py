@@ -0,0 +1,99 @@
+"""
+Batch re-grading benchmark.
+
+Seeds N compact aptitude submissions for one synthetic 50-question test, flips
+the answer key of a few questions and times grading_service.regrade_aptitude
+(read, compare, bulk_write). Also times the comparison alone against a
+per-question Python loop.
+
+Runs against mongomock by default; pass --mongo-uri to use a real server. Only
+the documents this script inserts are touched, and they are removed afterwards.
+mongomock scans the collection for every update in a bulk_write, so keep the
+default size there and measure 100k submissions against a real mongod.
+
+Usage (from the backend folder):
+    python benchmarks/bench_batch_grading.py
+    python benchmarks/bench_batch_grading.py --mongo-uri mongodb://localhost:27017 --submissions 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from bson import ObjectId
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_ROOT)
+
+QUESTIONS = 50
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--submissions', type=int, default=2000)
+    parser.add_argument('--flipped', type=int, default=5, help='Questions whose answer key changes')
+    parser.add_argument('--mongo-uri')
+    args = parser.parse_args()
+
+    if args.mongo_uri:
+        os.environ['MONGO_URI'] = args.mongo_uri
+    else:
+        import mongomock
+        import pymongo
+        from load_test import patch_mongomock_bulk
+        os.environ['MONGO_URI'] = 'mongodb://mongomock'
+        pymongo.MongoClient = mongomock.MongoClient
+        patch_mongomock_bulk(mongomock)
+
+    from app.database import submissions_collection, aptitude_questions_collection
+    from app.services.aptitude_storage import store_questions, pack_choices, UNANSWERED
+    from app.services.grading_service import regrade_aptitude, grade_choices
+
+    rng = random.Random(7)
+    run_tag = str(ObjectId())
+    questions = [{"question": f"Bench {run_tag} question {i}", "options": ["A", "B", "C", "D"],
+                  "correct_answer": "A", "difficulty": "medium"} for i in range(QUESTIONS)]
+    question_ids = store_questions(questions, topic='Benchmark')
+    key = bytes([0] * QUESTIONS)
+
+    start = time.perf_counter()
+    choice_blobs = []
+    batch = []
+    for i in range(args.submissions):
+        choices = bytes(rng.choice([0, 0, 1, 2, 3, UNANSWERED]) for _ in range(QUESTIONS))
+        choice_blobs.append(choices)
+        bits, correct = grade_choices(choices, key)
+        batch.append({"student_id": f"bench-{i % 5000}", "test_id": run_tag, "type": "aptitude",
+                      "topic": "Benchmark", "question_ids": question_ids, "choices": pack_choices(list(choices)),
+                      "correct": bits, "correct_answers": correct, "score": correct / QUESTIONS * 100})
+        if len(batch) == 5000:
+            submissions_collection.insert_many(batch)
+            batch = []
+    if batch:
+        submissions_collection.insert_many(batch)
+    print(f"Seeded {args.submissions:,} submissions in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    for choices in choice_blobs:
+        grade_choices(choices, key)
+    vector = time.perf_counter() - start
+    start = time.perf_counter()
+    for choices in choice_blobs:
+        [a == b for a, b in zip(choices, key)]
+    loop = time.perf_counter() - start
+    print(f"Compare only: {vector * 1000:.0f} ms with grade_choices (count + bitset), "
+          f"{loop * 1000:.0f} ms for a per-question loop (flags only)")
+
+    try:
+        answer_key = {qid: rng.randrange(1, 4) for qid in rng.sample(question_ids, args.flipped)}
+        summary = regrade_aptitude(answer_key)
+        print(f"regrade_aptitude: {summary['submissions_scanned']:,} scanned, "
+              f"{summary['submissions_changed']:,} rewritten in {summary['seconds']:.2f}s "
+              f"({summary['submissions_scanned'] / max(summary['seconds'], 1e-9):,.0f} submissions/s)")
+    finally:
+        submissions_collection.delete_many({"test_id": run_tag})
+        aptitude_questions_collection.delete_many({"_id": {"$in": question_ids}})
+
+if __name__ == '__main__':
+    main()
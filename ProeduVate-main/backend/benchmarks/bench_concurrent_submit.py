@@ -0,0 +1,133 @@
+"""
+Concurrent assignment submits: no duplicates, one write per request.
+
+Fires --clients simultaneous submits of the same assignment by the same student
+through the app (a double-click storm), in two rounds: every request carrying
+the same Idempotency-Key, then none carrying one. After each round it checks
+that exactly one submission exists for the pair and that users.submittedAssignments
+matches the real count, and reports the Mongo operations per request on the
+submissions collection. Exits non-zero if a check fails.
+
+Runs against mongomock by default; pass --mongo-uri to use a real server, where
+the unique index and the server's upsert retry are what's being proven. Only the
+documents this script inserts are touched, and they are removed afterwards.
+
+Usage (from the backend folder):
+    python benchmarks/bench_concurrent_submit.py
+    python benchmarks/bench_concurrent_submit.py --mongo-uri mongodb://localhost:27017 --clients 50
+"""
+
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from bson import ObjectId
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_ROOT)
+
+# find is left out: mongomock's find_one calls it
+SUBMISSION_OPERATIONS = ('find_one', 'insert_one', 'update_one', 'find_one_and_update', 'count_documents')
+
+def count_mongomock_operations(mongomock, counts):
+    """mongomock has no command monitoring: count calls on the submissions collection instead"""
+    for name in SUBMISSION_OPERATIONS:
+        original = getattr(mongomock.collection.Collection, name)
+
+        def counted(self, *args, _original=original, _name=name, **kwargs):
+            if self.name == 'submissions':
+                counts[_name] += 1
+            return _original(self, *args, **kwargs)
+        setattr(mongomock.collection.Collection, name, counted)
+
+def mongo_operations():
+    """Commands on the submissions collection recorded by the app's command listener"""
+    from app.instrumentation import registry
+    with registry._lock:
+        return Counter({command: stats[0] for (collection, command), stats in registry.db_commands.items()
+                        if collection == 'submissions'})
+
+def storm(client, assignment_id, student_id, clients, idempotency_key):
+    barrier = threading.Barrier(clients)
+    statuses = Counter()
+    replays = Counter()
+    lock = threading.Lock()
+
+    def submit(n):
+        headers = {'Idempotency-Key': idempotency_key} if idempotency_key else {}
+        data = {'student_id': student_id, 'assignment_file': (io.BytesIO(f"attempt {n}".encode()), 'work.txt')}
+        barrier.wait()
+        response = client.post(f'/api/student/assignments/{assignment_id}/submit', data=data, headers=headers,
+                               content_type='multipart/form-data')
+        with lock:
+            statuses[response.status_code] += 1
+            replays[response.headers.get('Idempotent-Replayed') == 'true'] += 1
+
+    threads = [threading.Thread(target=submit, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses, replays[True], time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=20, help='Simultaneous submits per round')
+    parser.add_argument('--mongo-uri')
+    args = parser.parse_args()
+
+    mock_counts = None
+    if args.mongo_uri:
+        os.environ['MONGO_URI'] = args.mongo_uri
+    else:
+        import mongomock
+        import pymongo
+        from load_test import patch_mongomock_bulk
+        os.environ['MONGO_URI'] = 'mongodb://mongomock'
+        pymongo.MongoClient = mongomock.MongoClient
+        patch_mongomock_bulk(mongomock)
+        mock_counts = Counter()
+        count_mongomock_operations(mongomock, mock_counts)
+
+    from app import create_app
+    from app.database import get_db, submissions_collection, users_collection
+
+    app = create_app()
+    client = app.test_client()
+    get_db()  # creates the indexes, including the unique (assignment_id, student_id) one
+
+    student_id = str(users_collection.insert_one({'name': 'Bench student', 'role': 'student'}).inserted_id)
+    assignment_id = f"bench-{ObjectId()}"
+    failed = False
+    try:
+        for label, key in (('same Idempotency-Key', str(ObjectId())), ('no Idempotency-Key', None)):
+            before = Counter(mock_counts) if mock_counts is not None else mongo_operations()
+            statuses, replayed, seconds = storm(client, assignment_id, student_id, args.clients, key)
+            after = Counter(mock_counts) if mock_counts is not None else mongo_operations()
+            operations = after - before
+
+            stored = submissions_collection.count_documents({'assignment_id': assignment_id, 'student_id': student_id})
+            total = submissions_collection.count_documents({'student_id': student_id})
+            recorded = users_collection.find_one({'_id': ObjectId(student_id)}).get('submittedAssignments')
+            ok = stored == 1 and recorded == total and set(statuses) == {200}
+
+            print(f"{label}: {args.clients} concurrent submits in {seconds * 1000:.0f} ms, "
+                  f"statuses {dict(statuses)}, {replayed} replayed")
+            print(f"  submissions for the pair: {stored}, submittedAssignments {recorded} (actual {total}) "
+                  f"-> {'OK' if ok else 'FAILED'}")
+            print("  submissions operations per request: " + ', '.join(
+                f"{name} {count / args.clients:.2f}" for name, count in sorted(operations.items()) if count))
+            failed = failed or not ok
+    finally:
+        submissions_collection.delete_many({'assignment_id': assignment_id})
+        users_collection.delete_one({'_id': ObjectId(student_id)})
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Start-up time benchmark.
+
+Runs `python -X importtime` on app creation in a fresh interpreter, prints the
+slowest imports, and fails if the total exceeds the budget or if any of the
+heavy SDKs were imported eagerly.
+
+Usage (from the backend folder):
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --budget-ms 800 --top 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# SDKs that must only be imported on first use
+LAZY_MODULES = ['google.generativeai', 'fitz', 'boto3', 'botocore', 'openai']
+
+STARTUP_CODE = "from app import create_app; create_app()"
+
+def run_importtime(code):
+    """Return [(module, depth, cumulative_us)] for a fresh interpreter running code"""
+    env = dict(os.environ)
+    env.setdefault('MONGO_URI', 'mongodb://localhost:27017')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, env=env,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        sys.exit(proc.returncode)
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name[1:]  # drop the separator space; remaining indentation is the nesting depth
+        rows.append((name.strip(), (len(name) - len(name.lstrip())) // 2, int(cumulative_us)))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('IMPORT_TIME_BUDGET_MS', 1000)))
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    rows = run_importtime(STARTUP_CODE)
+    total_ms = sum(cumulative for _, depth, cumulative in rows if depth == 0) / 1000
+
+    print(f"{'module':<50}{'cumulative ms':>15}")
+    for name, _, cumulative in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{name:<50}{cumulative / 1000:>15.1f}")
+    print(f"\nTotal import time: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    imported = {name for name, _, _ in rows}
+    eager = [m for m in LAZY_MODULES if m in imported]
+
+    failed = False
+    if eager:
+        print(f"FAIL: imported eagerly at start-up: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("FAIL: import time over budget")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+JSON encoding benchmark for Mongo documents.
+
+Compares the old route pattern (convert _id/datetime in a Python loop, then
+jsonify with Flask's default provider) against BSONJSONProvider, which encodes
+BSON types directly, for a 10k-document response.
+
+Usage (from the backend folder):
+    python benchmarks/bench_json_encode.py
+    python benchmarks/bench_json_encode.py --docs 50000 --repeat 5
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.serialization import BSONJSONProvider, iter_json_array, orjson  # noqa: E402
+
+def make_docs(n):
+    now = datetime.datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(),
+            "assignment_id": str(ObjectId()),
+            "student_id": str(ObjectId()),
+            "filename": f"submission_{i}.pdf",
+            "file_path": f"/uploads/submissions/a/{i}.pdf",
+            "notes": "Submitted on time" if i % 2 else "",
+            "quiz_score": float(i % 100),
+            "submitted_at": now - datetime.timedelta(minutes=i)
+        }
+        for i in range(n)
+    ]
+
+def best_of(repeat, fn):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    docs = make_docs(args.docs)
+
+    default_app = Flask('default')
+    default_app.json = DefaultJSONProvider(default_app)
+    bson_app = Flask('bson')
+    bson_app.json = BSONJSONProvider(bson_app)
+
+    def manual_loop():
+        converted = []
+        for d in docs:
+            d = dict(d)
+            d['_id'] = str(d['_id'])
+            d['submitted_at'] = d['submitted_at'].isoformat()
+            converted.append(d)
+        with default_app.app_context():
+            default_app.json.response(converted).get_data()
+
+    def provider():
+        with bson_app.app_context():
+            bson_app.json.response(docs).get_data()
+
+    def streamed():
+        for _ in iter_json_array(docs):
+            pass
+
+    print(f"{args.docs} documents, encoder: {'orjson' if orjson else 'stdlib json'}\n")
+    results = [
+        ("manual conversion + default jsonify", best_of(args.repeat, manual_loop)),
+        ("BSONJSONProvider", best_of(args.repeat, provider)),
+        ("stream_json_array", best_of(args.repeat, streamed)),
+    ]
+    baseline = results[0][1]
+    for name, ms in results:
+        print(f"{name:<38}{ms:>9.1f} ms{baseline / ms:>8.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Password hashing benchmark.
+
+Measures how many logins/sec a single core can verify for each hashing
+configuration, and the throughput of the bounded process pool used by
+app.services.password_service.
+
+Usage (from the backend folder):
+    python benchmarks/bench_password_hashing.py
+    python benchmarks/bench_password_hashing.py --methods scrypt:16384:8:1 pbkdf2:sha256:600000 --seconds 5
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHODS = [
+    'scrypt:32768:8:1',
+    'scrypt:16384:8:1',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:260000',
+]
+
+PASSWORD = 'correct horse battery staple'
+
+def _verify_n(password_hash, n):
+    for _ in range(n):
+        check_password_hash(password_hash, PASSWORD)
+    return n
+
+def single_core_rate(password_hash, seconds):
+    """Logins/sec verified on the current thread"""
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        check_password_hash(password_hash, PASSWORD)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+def pool_rate(password_hash, workers, total):
+    """Logins/sec verified by a pool of worker processes"""
+    batch = max(1, total // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pool.submit(_verify_n, password_hash, 1).result()  # warm up the workers
+        start = time.perf_counter()
+        done = sum(pool.map(_verify_n, [password_hash] * (total // batch), [batch] * (total // batch)))
+        return done / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS)
+    parser.add_argument('--seconds', type=float, default=3.0, help='Duration of each single-core run')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"Python {sys.version.split()[0]}, {os.cpu_count()} CPUs, pool of {args.workers} workers\n")
+    print(f"{'method':<26}{'ms/login':>10}{'logins/s/core':>16}{'pool logins/s':>16}")
+
+    for method in args.methods:
+        password_hash = generate_password_hash(PASSWORD, method)
+        per_core = single_core_rate(password_hash, args.seconds)
+        pooled = pool_rate(password_hash, args.workers, max(args.workers, int(per_core * args.seconds)))
+        print(f"{method:<26}{1000 / per_core:>10.1f}{per_core:>16.1f}{pooled:>16.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+"""
+Load test for the hot API endpoints.
+
+Runs the Flask app in-process against mongomock (default) or a local mongod,
+seeds synthetic cohorts, replaces Gemini, OpenAI and AWS Lambda with
+deterministic stubs that inject a fixed latency, then drives the endpoints
+from a thread pool and reports p50/p99 latency and throughput.
+
+Results are written as JSON so runs can be diffed; pass --baseline to print
+the change against an earlier run.
+
+Usage (from the backend folder):
+    python benchmarks/load_test.py --cohorts 1000
+    python benchmarks/load_test.py --mongo-uri mongodb://localhost:27017/?directConnection=true \\
+        --cohorts 1000 10000 50000 --output results/load.json
+    python benchmarks/load_test.py --cohorts 1000 --baseline results/load.json
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import platform
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_ROOT)
+
+NUM_ASSIGNMENTS = 20
+APTITUDE_ATTEMPTS = 3000  # aptitude submissions seeded for one heavy student
+SUBMIT_REQUESTS = 100
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+# --- Stubs -----------------------------------------------------------------
+
+def _dict_to_attr(value):
+    """openai<1.0 responses allow attribute access; mimic that for the stub"""
+    class AttrDict(dict):
+        __getattr__ = dict.__getitem__
+    if isinstance(value, dict):
+        return AttrDict({k: _dict_to_attr(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_dict_to_attr(v) for v in value]
+    return value
+
+class StubLatency:
+    seconds = 0.05
+
+def stub_model_response(prompt, is_json=False, schema_name=None, **kwargs):
+    """Deterministic stand-in for get_working_model_response"""
+    time.sleep(StubLatency.seconds)
+    seed = int(hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+
+    if not is_json:
+        return "Stub answer."
+
+    match = re.search(r'(\d+) (?:multiple-choice|practice|interview)? ?questions', prompt)
+    count = int(match.group(1)) if match else 10
+    questions = []
+    for i in range(count):
+        options = [f"Option {j}" for j in range(4)]
+        questions.append({
+            "question": f"Stub question {i} ({seed % 1000})",
+            "options": options,
+            "correct_answer": options[rng.randrange(4)],
+            "explanation": "Stub explanation",
+            "difficulty": "medium"
+        })
+    return json.dumps({
+        "questions": questions,
+        "score": rng.randint(50, 95),
+        "feedback": "Stub feedback",
+        "strengths": [],
+        "mistakes": [],
+        "match_score": rng.randint(50, 95),
+        "matching_keywords": [],
+        "missing_keywords": [],
+        "summary": "Stub summary"
+    })
+
+class StubChatCompletion:
+    @staticmethod
+    def create(model, messages, **kwargs):
+        time.sleep(StubLatency.seconds)
+        prompt = messages[-1]["content"]
+        criteria = re.findall(r'^- (\w+):', prompt, re.MULTILINE)
+        participants = list(dict.fromkeys(re.findall(r'^\[([^\]]+)\]', prompt, re.MULTILINE)))
+        rng = random.Random(len(prompt))
+        content = json.dumps({p: {c: rng.randint(60, 95) for c in criteria} for p in participants})
+        return _dict_to_attr({"choices": [{"message": {"content": content}}], "usage": {"total_tokens": len(prompt) // 4}})
+
+class StubOpenAI:
+    ChatCompletion = StubChatCompletion
+
+class StubPayload:
+    def __init__(self, body):
+        self._body = body
+
+    def read(self):
+        return self._body
+
+class StubLambdaClient:
+    def invoke(self, FunctionName, InvocationType, Payload):
+        time.sleep(StubLatency.seconds)
+        return {"Payload": StubPayload(json.dumps({"stdout": "ok\n", "stderr": None}).encode())}
+
+def install_stubs():
+    from app.services import ai_service, gd_service, lambda_service
+    from app.routes import gd_routes
+
+    ai_service.get_working_model_response = stub_model_response
+    gd_service.get_openai = lambda: StubOpenAI
+    gd_routes.gd_service.openai_api_key = 'stub'
+    lambda_service.get_lambda_client = lambda: StubLambdaClient()
+
+def patch_mongomock_bulk(mongomock):
+    """pymongo>=4.11 passes sort= to bulk update builders, which mongomock 4.x rejects"""
+    builder = mongomock.collection.BulkOperationBuilder
+    for name in ('add_update', 'add_replace'):
+        original = getattr(builder, name)
+
+        def patched(self, *args, _original=original, sort=None, **kwargs):
+            return _original(self, *args, **kwargs)
+        setattr(builder, name, patched)
+
+MONGOMOCK_WRITES = ('insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+                    'find_one_and_update', 'delete_one', 'delete_many', 'bulk_write')
+
+def serialize_mongomock_writes(mongomock):
+    """mongomock isn't thread-safe: two concurrent updates of one document can fail
+    with 'dictionary changed size during iteration'. A real server needs no lock."""
+    lock = threading.RLock()
+    for name in MONGOMOCK_WRITES:
+        original = getattr(mongomock.collection.Collection, name)
+
+        def locked(self, *args, _original=original, **kwargs):
+            with lock:
+                return _original(self, *args, **kwargs)
+        setattr(mongomock.collection.Collection, name, locked)
+
+# --- Data ------------------------------------------------------------------
+
+def seed(db, num_students, submissions_per_student):
+    from bson import ObjectId
+
+    for name in ('users', 'teacher_assignments', 'submissions', 'gd_rounds', 'gd_results', 'aptitude_tests',
+                 'aptitude_stats'):
+        db[name].delete_many({})
+
+    now = datetime.datetime.utcnow()
+    assignment_ids = db.teacher_assignments.insert_many([
+        {"title": f"Assignment {i}", "description": "Synthetic", "dueDate": now.isoformat(),
+         "type": "Quiz" if i % 4 == 0 else "Assignment", "createdBy": "teacher", "createdAt": now.isoformat()}
+        for i in range(NUM_ASSIGNMENTS)
+    ]).inserted_ids
+
+    batch = []
+    student_ids = []
+    for i in range(num_students):
+        student_id = ObjectId()
+        student_ids.append(student_id)
+        batch.append({"_id": student_id, "name": f"Student {i}", "role": "student", "email": f"s{i}@example.com",
+                      "department": "CSE", "rollNo": str(i), "attendance": 90, "average_score": 70})
+        if len(batch) == 5000:
+            db.users.insert_many(batch)
+            batch = []
+    if batch:
+        db.users.insert_many(batch)
+
+    rng = random.Random(num_students)
+    batch = []
+    for student_id in student_ids:
+        for assignment_id in rng.sample(assignment_ids, min(submissions_per_student, len(assignment_ids))):
+            batch.append({"assignment_id": str(assignment_id), "student_id": str(student_id),
+                          "filename": "work.pdf", "file_path": f"/uploads/submissions/{assignment_id}/{student_id}_work.pdf",
+                          "notes": "", "submitted_at": now, "quiz_score": float(rng.randint(0, 100))})
+            if len(batch) == 5000:
+                db.submissions.insert_many(batch)
+                batch = []
+    if batch:
+        db.submissions.insert_many(batch)
+
+    topics = ['Percentage', 'Time & Work', 'Probability', 'Ages']
+    db.submissions.insert_many([
+        {"student_id": str(student_ids[0]), "type": "aptitude", "topic": topics[i % len(topics)],
+         "score": float(rng.randint(0, 100)), "time_taken": 600, "submitted_at": now - datetime.timedelta(hours=i)}
+        for i in range(APTITUDE_ATTEMPTS)
+    ])
+
+    round_id = db.gd_rounds.insert_one({"title": "Load test round", "topic": "Remote Work vs Office Work",
+                                         "duration": 20, "num_ai_agents": 7, "status": "scheduled",
+                                         "assigned_students": [str(s) for s in student_ids[:10]]}).inserted_id
+    return [str(s) for s in student_ids], str(round_id)
+
+# --- Scenarios -------------------------------------------------------------
+
+def build_scenarios(client, student_ids, round_id):
+    """Each scenario is (name, number_of_requests, callable returning a response)"""
+    rng = random.Random(0)
+
+    def aptitude_generate():
+        return client.post('/api/aptitude/test/generate',
+                           json={"topic": "Percentage", "difficulty": "medium", "num_questions": 50})
+
+    generated = aptitude_generate().get_json()
+
+    # A test can only be submitted once: copy the generated one so each submit grades its own
+    from bson import ObjectId
+    from app.database import aptitude_tests_collection
+    template = aptitude_tests_collection.find_one({'_id': ObjectId(generated['test_id'])}, {'_id': 0})
+    test_ids = iter([str(aptitude_tests_collection.insert_one(dict(template)).inserted_id)
+                     for _ in range(SUBMIT_REQUESTS)])
+
+    def aptitude_submit():
+        questions = generated.get('questions', [])
+        answers = {str(i): rng.choice(q['options']) for i, q in enumerate(questions)}
+        return client.post('/api/aptitude/test/submit', json={
+            "student_id": rng.choice(student_ids), "test_id": next(test_ids),
+            "answers": answers, "time_taken": 600
+        })
+
+    responses = []
+    for turn in range(40):
+        speaker = 'user' if turn % 3 == 0 else f"ai_agent_{turn % 7 + 1}"
+        responses.append({"participant": speaker, "name": speaker, "text": f"Turn {turn}: " + "point " * 30})
+
+    def gd_evaluate():
+        # Vary the transcript so the evaluation cache doesn't hide the AI latency
+        transcript = responses + [{"participant": "user", "name": "You", "text": f"Closing {rng.random()}"}]
+        return client.post(f'/api/gd/round/{round_id}/evaluate', json={
+            "student_id": student_ids[0], "responses": transcript, "num_ai_agents": 7
+        })
+
+    return [
+        ("GET /api/teacher/students/progress", 5, lambda: client.get('/api/teacher/students/progress')),
+        ("GET /api/hr/candidates", 5, lambda: client.get('/api/hr/candidates')),
+        ("GET /api/teacher/submissions", 5, lambda: client.get('/api/teacher/submissions')),
+        ("GET /api/student/<id>/assignments", 50, lambda: client.get(f'/api/student/{rng.choice(student_ids)}/assignments')),
+        ("POST /api/aptitude/test/generate", 20, aptitude_generate),
+        ("POST /api/aptitude/test/submit", SUBMIT_REQUESTS, aptitude_submit),
+        ("POST /api/gd/round/<id>/evaluate", 20, gd_evaluate),
+        ("GET /api/aptitude/progress/<id>", 100, lambda: client.get(f'/api/aptitude/progress/{student_ids[0]}')),
+    ]
+
+def run_scenario(fn, requests, concurrency):
+    latencies = []
+    errors = 0
+
+    def one():
+        start = time.perf_counter()
+        response = fn()
+        response.get_data()
+        return time.perf_counter() - start, response.status_code
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for seconds, status in pool.map(lambda _: one(), range(requests)):
+            latencies.append(seconds * 1000)
+            if status >= 400:
+                errors += 1
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0,
+        "throughput_rps": round(requests / wall, 2) if wall else 0
+    }
+
+def print_comparison(results, baseline):
+    print("\nChange vs baseline (p50 / p99 / throughput):")
+    for cohort, endpoints in results["cohorts"].items():
+        for endpoint, stats in endpoints.items():
+            old = baseline.get("cohorts", {}).get(cohort, {}).get(endpoint)
+            if not old:
+                continue
+
+            def pct(new, prev):
+                return f"{(new - prev) / prev * 100:+.0f}%" if prev else "n/a"
+
+            print(f"  [{cohort}] {endpoint:<40} {pct(stats['p50_ms'], old['p50_ms']):>7} "
+                  f"{pct(stats['p99_ms'], old['p99_ms']):>7} {pct(stats['throughput_rps'], old['throughput_rps']):>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cohorts', nargs='+', type=int, default=[1000])
+    parser.add_argument('--submissions-per-student', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--stub-latency-ms', type=float, default=50)
+    parser.add_argument('--mongo-uri', help='Use a real mongod instead of mongomock (data in lms_portal is wiped)')
+    parser.add_argument('--output', default=os.path.join(BACKEND_ROOT, 'benchmarks', 'results', 'load_test.json'))
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    StubLatency.seconds = args.stub_latency_ms / 1000
+
+    if args.mongo_uri:
+        os.environ['MONGO_URI'] = args.mongo_uri
+    else:
+        import mongomock
+        import pymongo
+        os.environ['MONGO_URI'] = 'mongodb://mongomock'
+        pymongo.MongoClient = mongomock.MongoClient
+        patch_mongomock_bulk(mongomock)
+        serialize_mongomock_writes(mongomock)
+
+    from app import create_app
+    from app.database import get_db
+
+    app = create_app()
+    install_stubs()
+    client = app.test_client()
+    db = get_db()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": "mongod" if args.mongo_uri else "mongomock",
+            "concurrency": args.concurrency,
+            "stub_latency_ms": args.stub_latency_ms,
+            "submissions_per_student": args.submissions_per_student
+        },
+        "cohorts": {}
+    }
+
+    for cohort in args.cohorts:
+        start = time.perf_counter()
+        student_ids, round_id = seed(db, cohort, args.submissions_per_student)
+        print(f"\nCohort {cohort} students (seeded in {time.perf_counter() - start:.1f}s)")
+        print(f"  {'endpoint':<40}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+
+        cohort_results = {}
+        for name, requests, fn in build_scenarios(client, student_ids, round_id):
+            stats = run_scenario(fn, requests, args.concurrency)
+            cohort_results[name] = stats
+            print(f"  {name:<40}{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+                  f"{stats['throughput_rps']:>10.1f}{stats['errors']:>8}")
+        results["cohorts"][str(cohort)] = cohort_results
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(results, json.load(f))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+if __name__ == '__main__':
+    main()
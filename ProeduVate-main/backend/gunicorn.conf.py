@@ -0,0 +1,25 @@
+# gunicorn.conf.py - picked up automatically when gunicorn is started from the backend folder
+#
+#   gunicorn -w 4 run:app
+#
+# Set GUNICORN_WARMUP=1 to import the AI/PDF/AWS SDKs once in the master process
+# before workers are forked, instead of on each worker's first request.
+
+import os
+
+def on_starting(server):
+    if os.getenv('GUNICORN_WARMUP', '').lower() in ('1', 'true', 'yes'):
+        from app.warmup import warmup
+        warmup()
+
+    # Build the MongoDB indexes once, before any worker takes a request. If Mongo
+    # is unreachable this waits one server selection timeout and workers retry on use.
+    from app.database import get_client, get_db, reset_client
+    get_db()
+    get_client().close()
+    reset_client()
+
+def post_fork(server, worker):
+    # Each worker builds its own MongoClient (and pool) on first use
+    from app.database import reset_client
+    reset_client()
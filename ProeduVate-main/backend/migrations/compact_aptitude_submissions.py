@@ -0,0 +1,144 @@
+"""
+Rewrite aptitude submissions and user history into the compact format.
+
+- Submissions that embed the full `evaluation` (and an `answers` dict) get their
+  questions upserted into the aptitude_questions bank and are rewritten to
+  question_ids + choices + correct bitset (see app/services/aptitude_storage.py).
+- Submissions from the interim format (`answers` as option indexes plus a
+  `results` code list) are converted the same way, taking question ids from the
+  stored test when it still exists.
+- users.aptitude_history is trimmed to the newest APTITUDE_HISTORY_LIMIT entries.
+
+Safe to re-run: already compact documents are not matched.
+
+Usage (from the backend folder, MONGO_URI set as for the app):
+    python migrations/compact_aptitude_submissions.py --dry-run
+    python migrations/compact_aptitude_submissions.py --batch-size 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import bson
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.database import submissions_collection, users_collection, aptitude_tests_collection  # noqa: E402
+from app.services.aptitude_storage import (  # noqa: E402
+    APTITUDE_HISTORY_LIMIT, store_questions, pack_choices, pack_bits
+)
+
+LEGACY_FILTER = {'type': 'aptitude', '$or': [
+    {'evaluation': {'$exists': True}},
+    {'results': {'$exists': True}}
+]}
+
+def convert_legacy(doc):
+    """New fields for a submission that embeds its evaluation"""
+    results = doc['evaluation'].get('results', [])
+    questions = [{
+        'question': r.get('question'),
+        'options': r.get('options') or [],
+        'correct_answer': r.get('correct_answer'),
+        'explanation': r.get('explanation')
+    } for r in results]
+    choices = []
+    for r in results:
+        options = r.get('options') or []
+        answer = r.get('user_answer')
+        choices.append(options.index(answer) if answer in options else None)
+    return {
+        'question_ids': store_questions(questions, doc.get('topic')),
+        'choices': pack_choices(choices),
+        'correct': pack_bits(r.get('status') == 'correct' for r in results)
+    }
+
+def convert_interim(doc):
+    """New fields for a submission storing option indexes and result codes"""
+    question_ids = []
+    try:
+        test = aptitude_tests_collection.find_one({'_id': ObjectId(doc.get('test_id'))}, {'question_ids': 1})
+        question_ids = (test or {}).get('question_ids', [])
+    except (InvalidId, TypeError):
+        pass
+    return {
+        'question_ids': question_ids,
+        'choices': pack_choices(doc.get('answers') or []),
+        'correct': pack_bits(code == 1 for code in doc.get('results') or [])
+    }
+
+def migrate_submissions(batch_size, dry_run):
+    converted = 0
+    bytes_before = 0
+    bytes_after = 0
+    operations = []
+
+    # Paginate by _id so a rewrite never shows up twice in the same scan
+    last_id = None
+    while True:
+        query = dict(LEGACY_FILTER)
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        docs = list(submissions_collection.find(query).sort('_id', 1).limit(batch_size))
+        if not docs:
+            break
+        last_id = docs[-1]['_id']
+
+        for doc in docs:
+            if isinstance(doc.get('evaluation'), dict):
+                fields = convert_legacy(doc)
+            else:
+                fields = convert_interim(doc)
+
+            compact = {k: v for k, v in doc.items() if k not in ('answers', 'evaluation', 'results')}
+            compact.update(fields)
+            bytes_before += len(bson.encode(doc))
+            bytes_after += len(bson.encode(compact))
+            converted += 1
+
+            operations.append(UpdateOne(
+                {'_id': doc['_id']},
+                {'$set': fields, '$unset': {'answers': '', 'evaluation': '', 'results': ''}}
+            ))
+
+        if operations and not dry_run:
+            submissions_collection.bulk_write(operations, ordered=False)
+        operations = []
+        print(f"  {converted} submissions processed")
+
+    return converted, bytes_before, bytes_after
+
+def trim_histories(dry_run):
+    query = {f'aptitude_history.{APTITUDE_HISTORY_LIMIT}': {'$exists': True}}
+    if dry_run:
+        return users_collection.count_documents(query)
+    result = users_collection.update_many(
+        query, {'$push': {'aptitude_history': {'$each': [], '$slice': -APTITUDE_HISTORY_LIMIT}}}
+    )
+    return result.modified_count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    print("Compacting aptitude submissions" + (" (dry run)" if args.dry_run else ""))
+    converted, before, after = migrate_submissions(args.batch_size, args.dry_run)
+    if converted:
+        print(f"Submissions: {converted} rewritten, {before / 1024:.1f} KiB -> {after / 1024:.1f} KiB "
+              f"({before / max(after, 1):.1f}x smaller; bank entries not included)")
+    else:
+        print("Submissions: nothing to migrate")
+
+    trimmed = trim_histories(args.dry_run)
+    print(f"Users: {trimmed} aptitude histories trimmed to {APTITUDE_HISTORY_LIMIT} entries")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Copy files from the local uploads/ folder into the configured storage backend.
+
+Run once when switching STORAGE_BACKEND from local to s3, so resumes and
+submissions uploaded before the switch stay downloadable from every node. Keys
+are the paths relative to uploads/ (see app/services/storage_service.py);
+in-progress upload parts are skipped, and objects already in the bucket are left
+alone, so the script is safe to re-run.
+
+Usage (from the backend folder, STORAGE_* set as for the app):
+    python migrations/copy_uploads_to_storage.py --dry-run
+    python migrations/copy_uploads_to_storage.py --source /srv/proeduvate/uploads
+"""
+
+import argparse
+import mimetypes
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.storage_service import STORAGE_ROOT, get_storage  # noqa: E402
+
+SKIPPED_FOLDERS = {'parts'}
+
+def local_files(source):
+    """(key, path) for every file under source, skipping upload scratch space"""
+    for folder, dirs, files in os.walk(source):
+        if folder == source:
+            dirs[:] = [d for d in dirs if d not in SKIPPED_FOLDERS]
+        for name in files:
+            path = os.path.join(folder, name)
+            yield os.path.relpath(path, source).replace(os.sep, '/'), path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default=STORAGE_ROOT, help='Local uploads folder (default: %(default)s)')
+    parser.add_argument('--dry-run', action='store_true', help='List what would be copied without uploading')
+    args = parser.parse_args()
+
+    storage = get_storage()
+    if storage.name == 'local' and os.path.abspath(args.source) == storage.root:
+        print("Storage backend is the local uploads folder already; nothing to copy")
+        return
+
+    start = time.perf_counter()
+    copied = present = total_bytes = 0
+    for key, path in local_files(args.source):
+        if storage.exists(key):
+            present += 1
+            continue
+        size = os.path.getsize(path)
+        print(f"{'Would copy' if args.dry_run else 'Copying'} {key} ({size / 1024:.1f} KiB)")
+        if not args.dry_run:
+            # save_file moves its input, so hand it a copy and keep the original
+            handle, tmp_path = tempfile.mkstemp()
+            os.close(handle)
+            shutil.copyfile(path, tmp_path)
+            storage.save_file(key, tmp_path, mimetypes.guess_type(key)[0])
+        copied += 1
+        total_bytes += size
+
+    print(f"{copied} files ({total_bytes / 1024 / 1024:.1f} MiB) {'to copy' if args.dry_run else 'copied'}, "
+          f"{present} already in storage, in {time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
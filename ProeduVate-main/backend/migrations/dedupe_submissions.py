@@ -0,0 +1,96 @@
+"""
+Remove duplicate assignment submissions and create the unique index that prevents them.
+
+Before submits became a single upsert, a double-click could store two documents
+for the same (assignment_id, student_id), inflating users.submittedAssignments.
+This keeps the newest submission of each pair (by submitted_at, then _id),
+deletes the rest, recounts submittedAssignments for the students affected and
+then creates the unique index from app/database.py, which the app can't create
+while duplicates exist. Aptitude submissions (no assignment_id) are not touched.
+
+Safe to re-run: once there are no duplicates it only (re)creates the index.
+
+Usage (from the backend folder, MONGO_URI set as for the app):
+    python migrations/dedupe_submissions.py --dry-run
+    python migrations/dedupe_submissions.py --batch-size 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.database import INDEXES, submissions_collection, users_collection  # noqa: E402
+
+DUPLICATES_PIPELINE = [
+    {'$match': {'assignment_id': {'$exists': True}}},
+    {'$sort': {'submitted_at': -1, '_id': -1}},
+    {'$group': {
+        '_id': {'assignment_id': '$assignment_id', 'student_id': '$student_id'},
+        'ids': {'$push': '$_id'},
+        'count': {'$sum': 1}
+    }},
+    {'$match': {'count': {'$gt': 1}}}
+]
+
+def unique_index_specs():
+    return [(keys, options) for keys, options in INDEXES['submissions'] if options.get('unique')]
+
+def recount(student_ids):
+    """Set submittedAssignments to the real count for each student, as submit_assignment does"""
+    operations = []
+    for student_id in student_ids:
+        try:
+            oid = ObjectId(student_id)
+        except (InvalidId, TypeError):
+            continue
+        count = submissions_collection.count_documents({'student_id': student_id})
+        operations.append(UpdateOne({'_id': oid}, {'$set': {'submittedAssignments': count}}))
+    if operations:
+        users_collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='Report duplicates without deleting anything')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Documents deleted per request')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    groups = removed = 0
+    students = set()
+    batch = []
+    for group in submissions_collection.aggregate(DUPLICATES_PIPELINE, allowDiskUse=True):
+        groups += 1
+        extra = group['ids'][1:]
+        removed += len(extra)
+        students.add(group['_id']['student_id'])
+        if args.dry_run:
+            print(f"assignment {group['_id']['assignment_id']}, student {group['_id']['student_id']}: "
+                  f"keep {group['ids'][0]}, remove {len(extra)}")
+            continue
+        batch.extend(extra)
+        if len(batch) >= args.batch_size:
+            submissions_collection.delete_many({'_id': {'$in': batch}})
+            batch = []
+    if batch and not args.dry_run:
+        submissions_collection.delete_many({'_id': {'$in': batch}})
+
+    print(f"{groups} duplicated (assignment, student) pairs, {removed} submissions "
+          f"{'to remove' if args.dry_run else 'removed'}")
+    if args.dry_run:
+        return
+
+    print(f"Recounted submittedAssignments for {recount(students)} students")
+    for keys, options in unique_index_specs():
+        name = submissions_collection.create_index(keys, **options)
+        print(f"Unique index {name} is in place")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,28 @@
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
 from app import create_app
-from flask import render_template, request, jsonify, session, redirect, url_for, send_from_directory
+from app.services.ai_service import get_genai
+from app.instrumentation import track_call
+from flask import render_template, request, jsonify, session, redirect, url_for
 from flask_cors import CORS # Added to handle CORS errors
+from werkzeug.utils import secure_filename
+from app.services.storage_service import send_stored
+from app import file_serving
 
 # 1. Load the .env file to get the Google API Key
 load_dotenv()
 
-# 2. Configure Google AI
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# 2. Google AI is imported and configured lazily by get_genai() on the first /ask-ai call
 
 # Helper function to find a working model for the single /ask-ai route
 def generate_safe_response(prompt):
+    genai = get_genai()
     candidates = ['gemini-2.5-flash', 'gemini-flash-latest', 'gemini-2.5-pro', 'gemini-pro-latest']
     for model_name in candidates:
         try:
             model = genai.GenerativeModel(model_name)
-            response = model.generate_content(prompt)
+            with track_call('llm', model_name):
+                response = model.generate_content(prompt)
             return response.text
         except Exception as e:
             if "404" in str(e) or "not found" in str(e).lower():
@@ -88,19 +93,17 @@ def logout():
 
 @app.route('/resumes/<filename>')
 def serve_resume(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return send_stored(f"resumes/{secure_filename(filename)}")
 
 @app.route('/static/<path:filename>')
 def serve_static(filename):
-    """Serve static files like logo"""
-    static_folder = os.path.join(os.path.dirname(__file__), 'static')
-    return send_from_directory(static_folder, filename)
+    """Serve static files like logo (fingerprinted URLs are cached as immutable)"""
+    return file_serving.serve_static(filename)
 
 @app.route('/uploads/submissions/<assignment_id>/<filename>')
 def serve_submission(assignment_id, filename):
-    """Serve submitted assignment files"""
-    submission_path = os.path.join(app.config['UPLOAD_FOLDER'], 'submissions', assignment_id)
-    return send_from_directory(submission_path, filename)
+    """Serve assignment files submitted before content-addressed storage"""
+    return send_stored(f"resumes/submissions/{secure_filename(assignment_id)}/{secure_filename(filename)}")
 
 # --- UPDATED AI ROUTE ---
 @app.route('/ask-ai', methods=['POST'])
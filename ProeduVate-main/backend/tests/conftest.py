@@ -0,0 +1,42 @@
+"""
+Shared fixtures: the app against an in-memory MongoDB (mongomock).
+
+Needs pytest and mongomock. Run from the backend folder:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+
+import mongomock
+import pytest
+
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017')
+os.environ.setdefault('UPLOAD_ROOT', tempfile.mkdtemp(prefix='backend-test-'))
+
+from app import create_app  # noqa: E402
+from app import database  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from load_test import patch_mongomock_bulk  # noqa: E402
+
+patch_mongomock_bulk(mongomock)
+
+@pytest.fixture
+def db(monkeypatch):
+    """A fresh mongomock database behind app.database"""
+    monkeypatch.setattr(database, 'MongoClient', mongomock.MongoClient)
+    monkeypatch.setattr(database, '_client', None)
+    monkeypatch.setattr(database, '_indexes_ready', False)
+    monkeypatch.setattr(database, '_indexes_retry_at', 0)
+    monkeypatch.setattr(database, '_unique_indexes_verified', set())
+    return database.get_db()
+
+@pytest.fixture
+def client(db):
+    return create_app().test_client()
+
+@pytest.fixture
+def student_id(client):
+    return str(database.users_collection.insert_one({'name': 'Student', 'role': 'student'}).inserted_id)
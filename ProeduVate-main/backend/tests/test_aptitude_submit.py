@@ -0,0 +1,54 @@
+"""Aptitude test submits: a test that could not be graded can be submitted again"""
+
+import pytest
+from bson import ObjectId
+
+from app import database
+from app.routes import aptitude_routes
+from app.services.aptitude_storage import store_questions
+
+QUESTIONS = [
+    {'question': 'What is 2 + 2?', 'options': ['3', '4'], 'correct_answer': '4', 'difficulty': 'easy'},
+    {'question': 'What is 3 * 3?', 'options': ['6', '9'], 'correct_answer': '9', 'difficulty': 'easy'},
+]
+
+@pytest.fixture
+def test_id(db, student_id):
+    ids = store_questions(QUESTIONS, 'Arithmetic')
+    return str(database.aptitude_tests_collection.insert_one({
+        'topic': 'Arithmetic', 'difficulty': 'easy', 'adaptive': False,
+        'question_ids': ids, 'student_id': student_id, 'status': 'ready'
+    }).inserted_id)
+
+def submit(client, student_id, test_id):
+    return client.post('/api/aptitude/test/submit', json={
+        'student_id': student_id, 'test_id': test_id, 'answers': {'0': '4', '1': '9'}
+    })
+
+def claimed(test_id):
+    test = database.aptitude_tests_collection.find_one({'_id': ObjectId(test_id)}, {'submitted_at': 1})
+    return 'submitted_at' in test
+
+def test_missing_question_fails_submit_and_releases_claim(client, student_id, test_id):
+    database.aptitude_questions_collection.delete_one({'question': 'What is 2 + 2?'})
+
+    response = submit(client, student_id, test_id)
+
+    assert response.status_code == 410
+    assert database.submissions_collection.count_documents({'test_id': test_id}) == 0
+    assert not claimed(test_id)
+
+def test_failed_grading_releases_claim(client, student_id, test_id, monkeypatch):
+    evaluate = aptitude_routes.evaluate_aptitude_test
+    def broken(questions, answers):
+        monkeypatch.setattr(aptitude_routes, 'evaluate_aptitude_test', evaluate)
+        raise RuntimeError("grading failed")
+    monkeypatch.setattr(aptitude_routes, 'evaluate_aptitude_test', broken)
+
+    assert submit(client, student_id, test_id).status_code == 500
+    assert not claimed(test_id)
+
+    response = submit(client, student_id, test_id)
+    assert response.status_code == 200
+    assert response.get_json()['evaluation']['correct_answers'] == 2
+    assert submit(client, student_id, test_id).status_code == 409
@@ -0,0 +1,60 @@
+"""Quiz re-grading against stored answers"""
+
+import pytest
+
+from app import database
+from app.services.grading_service import regrade_quiz
+
+def make_quiz(questions, field='quizQuestions'):
+    return str(database.teacher_assignments_collection.insert_one({'title': 'Quiz', field: questions}).inserted_id)
+
+def stored_submission(assignment_id, answers, score=100.0, student_id='student'):
+    return database.submissions_collection.insert_one({
+        'assignment_id': assignment_id, 'student_id': student_id, 'quiz_answers': answers, 'quiz_score': score
+    }).inserted_id
+
+def score_of(submission_id):
+    return database.submissions_collection.find_one({'_id': submission_id})['quiz_score']
+
+def test_wrong_free_text_answer_scores_zero(db):
+    quiz = make_quiz([{'question': 'Capital of France?', 'correct_answer': 'Paris'}])
+    wrong = stored_submission(quiz, ['totally wrong text'])
+    right = stored_submission(quiz, ['  paris '], score=0.0, student_id='other')
+
+    regrade_quiz(quiz, [None])
+
+    assert score_of(wrong) == 0
+    assert score_of(right) == 100
+
+def test_answer_outside_options_is_wrong_even_if_key_is_not_an_option(db):
+    quiz = make_quiz([{'question': '2 + 2?', 'options': ['3', '5'], 'correct_answer': '4'}])
+    submission = stored_submission(quiz, ['something else'])
+
+    regrade_quiz(quiz, [None])
+
+    assert score_of(submission) == 0
+
+def test_regrade_with_new_key(db):
+    quiz = make_quiz([
+        {'question': 'A?', 'options': ['x', 'y'], 'correct_answer': 'x'},
+        {'question': 'B?', 'correct_answer': 'old'},
+    ])
+    submission = stored_submission(quiz, ['y', 'new'], score=50.0)
+
+    summary = regrade_quiz(quiz, ['y', 'New'])
+
+    assert summary['questions_updated'] == 2
+    assert score_of(submission) == 100
+
+def test_legacy_questions_field(db):
+    quiz = make_quiz([{'question': 'A?', 'options': ['x', 'y'], 'correct_answer': 'x'}], field='questions')
+    submission = stored_submission(quiz, ['y'])
+
+    regrade_quiz(quiz, [None])
+
+    assert score_of(submission) == 0
+
+def test_unknown_option_in_new_key_is_rejected(db):
+    quiz = make_quiz([{'question': 'A?', 'options': ['x', 'y'], 'correct_answer': 'x'}])
+    with pytest.raises(ValueError):
+        regrade_quiz(quiz, ['z'])
@@ -0,0 +1,63 @@
+"""Concurrent assignment submits: one stored document and a correct count"""
+
+import io
+import threading
+from collections import Counter
+
+import pytest
+from bson import ObjectId
+
+from app import database
+
+def submit(client, assignment_id, student_id, content=b'work', headers=None):
+    data = {'student_id': student_id, 'assignment_file': (io.BytesIO(content), 'work.txt')}
+    return client.post(f'/api/student/assignments/{assignment_id}/submit', data=data, headers=headers or {},
+                       content_type='multipart/form-data')
+
+def storm(client, assignment_id, student_id, clients, headers=None):
+    """Fire clients submits of the same pair at once and return the status codes"""
+    barrier = threading.Barrier(clients)
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def one(n):
+        barrier.wait()
+        response = submit(client, assignment_id, student_id, f'attempt {n}'.encode(), headers)
+        with lock:
+            statuses[response.status_code] += 1
+
+    threads = [threading.Thread(target=one, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+def submitted_assignments(student_id):
+    return database.users_collection.find_one({'_id': ObjectId(student_id)}).get('submittedAssignments')
+
+@pytest.mark.parametrize('headers', [None, {'Idempotency-Key': 'double-click'}])
+def test_concurrent_submits_store_one_submission(client, student_id, headers):
+    assert submit(client, 'earlier', student_id).status_code == 200
+
+    statuses = storm(client, 'a1', student_id, 20, headers)
+
+    assert statuses == Counter({200: 20})
+    assert database.submissions_collection.count_documents({'assignment_id': 'a1', 'student_id': student_id}) == 1
+    assert submitted_assignments(student_id) == 2
+
+def test_resubmit_replaces_without_counting_twice(client, student_id):
+    assert submit(client, 'a1', student_id, b'first').status_code == 200
+    assert submit(client, 'a1', student_id, b'second').status_code == 200
+
+    assert database.submissions_collection.count_documents({'assignment_id': 'a1', 'student_id': student_id}) == 1
+    assert submitted_assignments(student_id) == 1
+
+def test_submit_refused_without_unique_index(client, student_id):
+    database.get_db()
+    database.submissions_collection.drop_index('assignment_id_1_student_id_1')
+
+    response = submit(client, 'a1', student_id)
+
+    assert response.status_code == 503
+    assert database.submissions_collection.count_documents({'student_id': student_id}) == 0
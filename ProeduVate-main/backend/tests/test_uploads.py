@@ -0,0 +1,76 @@
+"""Streaming assignment uploads and resumable upload sessions"""
+
+import io
+import os
+import time
+
+from flask import Request
+
+from app import database
+from app.services import storage_service, upload_service
+
+def parts_files():
+    return sorted(os.listdir(upload_service.PARTS_DIR)) if os.path.isdir(upload_service.PARTS_DIR) else []
+
+def submit(client, student_id, content, filename='work.txt'):
+    data = {'student_id': student_id, 'assignment_file': (io.BytesIO(content), filename)}
+    return client.post('/api/student/assignments/a1/submit', data=data, content_type='multipart/form-data')
+
+def test_submit_streams_file_part_without_werkzeug_spooling(client, student_id, monkeypatch):
+    def spool(*args, **kwargs):
+        raise AssertionError("request.files spooled the body")
+    monkeypatch.setattr(Request, '_get_file_stream', spool)
+    before = parts_files()
+
+    response = submit(client, student_id, b'hello')
+
+    assert response.status_code == 200
+    stored = database.submissions_collection.find_one({'assignment_id': 'a1'})
+    assert stored['file_size'] == 5
+    assert stored['file_sha256'] == '2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824'
+    assert parts_files() == before
+
+def test_oversized_part_rejected_while_parsing(client, monkeypatch):
+    monkeypatch.setitem(upload_service.UPLOAD_SIZE_LIMITS, 'txt', 1024)
+    before = parts_files()
+
+    response = submit(client, 'student', b'x' * 5000)
+
+    assert response.status_code == 413
+    assert database.submissions_collection.count_documents({}) == 0
+    assert parts_files() == before
+
+def test_disallowed_type_rejected(client):
+    assert submit(client, 'student', b'MZ', filename='tool.exe').status_code == 400
+
+def test_only_owner_can_append_chunks(client):
+    created = client.post('/api/student/uploads', json={'student_id': 'owner', 'filename': 'big.zip', 'size': 4})
+    upload_id = created.get_json()['upload_id']
+    headers = {'Content-Range': 'bytes 0-3/4'}
+
+    assert client.put(f'/api/student/uploads/{upload_id}?student_id=intruder', data=b'evil',
+                      headers=headers).status_code == 404
+    assert client.get(f'/api/student/uploads/{upload_id}').status_code == 404
+
+    response = client.put(f'/api/student/uploads/{upload_id}?student_id=owner', data=b'data', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'complete'
+
+def test_sweep_removes_parts_of_expired_sessions(client):
+    live = upload_service.create_session('live.zip', 10, 'owner')['_id']
+    expired = upload_service.create_session('gone.zip', 10, 'owner')['_id']
+    database.upload_sessions_collection.delete_one({'_id': expired})  # what the TTL index does
+    stale = time.time() - upload_service.ORPHAN_GRACE_SECONDS - 60
+    for upload_id in (live, expired):
+        os.utime(os.path.join(upload_service.PARTS_DIR, f"{upload_id}.part"), (stale, stale))
+
+    assert upload_service.sweep_orphaned_parts(force=True) >= 1
+
+    assert f"{live}.part" in parts_files()
+    assert f"{expired}.part" not in parts_files()
+
+def test_stored_files_are_readable_by_the_web_server(db):
+    storage_service.save_stream('reports/r1.pdf', io.BytesIO(b'%PDF'))
+
+    path = storage_service.get_storage().path('reports/r1.pdf')
+    assert os.stat(path).st_mode & 0o777 == 0o644
@@ -10,6 +10,7 @@ const AptitudeTraining = ({ currentStudent }) => {
   const [practiceQuestions, setPracticeQuestions] = useState([]);
   const [testQuestions, setTestQuestions] = useState([]);
   const [testId, setTestId] = useState(null);
+  const [testDifficulty, setTestDifficulty] = useState('medium');
   const [currentQuestionIndex, setCurrentQuestionIndex] = useState(0);
   const [userAnswers, setUserAnswers] = useState({});
   const [timeRemaining, setTimeRemaining] = useState(3600); // 60 minutes in seconds
@@ -136,26 +137,61 @@ const AptitudeTraining = ({ currentStudent }) => {
 
   const handleStartTest = async (difficulty = 'medium') => {
     setLoading(true);
+    setTestDifficulty(difficulty);
     try {
-      const response = await fetch(`${API_URL}/aptitude/test/generate`, {
+      // Questions are streamed as NDJSON batches; the test opens with the first one
+      const response = await fetch(`${API_URL}/aptitude/test/generate?stream=1`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'Accept': 'application/x-ndjson' },
         body: JSON.stringify({
+          student_id: currentStudent.id,
           topic: selectedTopic.name,
           difficulty,
           num_questions: 50
         })
       });
-      const data = await response.json();
-      if (data.success) {
-        setTestId(data.test_id);
-        setTestQuestions(data.questions);
-        setCurrentQuestionIndex(0);
-        setUserAnswers({});
-        setTimeRemaining(3600);
-        setMode('test');
-        setTestStarted(true);
-        setCameraEnabled(true);
+      if (!response.ok) {
+        const data = await response.json();
+        console.error('Error generating test:', data.message);
+        setLoading(false);
+        return;
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let started = false;
+      const handleEvent = (event) => {
+        if (event.type === 'test') {
+          setTestId(event.test_id);
+          setTestQuestions([]);
+        } else if (event.type === 'questions') {
+          setTestQuestions(prev => prev.slice(0, event.offset).concat(event.questions));
+          if (!started) {
+            started = true;
+            setCurrentQuestionIndex(0);
+            setUserAnswers({});
+            setTimeRemaining(3600);
+            setMode('test');
+            setTestStarted(true);
+            setCameraEnabled(true);
+            setLoading(false);
+          }
+        } else if (event.type === 'error') {
+          console.error('Error generating test:', event.message);
+        }
+      };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)));
+      }
+      if (buffer.trim()) {
+        handleEvent(JSON.parse(buffer));
       }
     } catch (error) {
       console.error('Error generating test:', error);
@@ -184,8 +220,6 @@ const AptitudeTraining = ({ currentStudent }) => {
         body: JSON.stringify({
           student_id: currentStudent.id,
           test_id: testId,
-          topic: selectedTopic.name,
-          questions: testQuestions,
           answers: userAnswers,
           time_taken: timeTaken
         })
@@ -288,7 +322,7 @@ const AptitudeTraining = ({ currentStudent }) => {
         <h3 className="text-2xl font-bold text-gray-800">{selectedTopic.name}</h3>
         <p className="text-gray-600">{selectedTopic.description}</p>
 
-        <div className="grid grid-cols-1 md:grid-cols-3 gap-6">
+        <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
           <button
             onClick={handleLearnConcepts}
             className="p-8 bg-blue-50 border-2 border-blue-200 rounded-xl hover:border-blue-500 hover:shadow-lg transition-all disabled:opacity-50 disabled:cursor-not-allowed"
@@ -318,6 +352,16 @@ const AptitudeTraining = ({ currentStudent }) => {
             <h4 className="text-xl font-bold text-gray-800 mb-2">Take Test</h4>
             <p className="text-gray-600">50 questions • 60 minutes • AI proctored</p>
           </button>
+
+          <button
+            onClick={() => handleStartTest('adaptive')}
+            className="p-8 bg-orange-50 border-2 border-orange-200 rounded-xl hover:border-orange-500 hover:shadow-lg transition-all disabled:opacity-50 disabled:cursor-not-allowed"
+            disabled={loading}
+          >
+            <Brain size={48} className="text-orange-600 mb-4" />
+            <h4 className="text-xl font-bold text-gray-800 mb-2">Adaptive Test</h4>
+            <p className="text-gray-600">Questions matched to your rating on this topic</p>
+          </button>
         </div>
       </div>
     );
@@ -874,7 +918,7 @@ const AptitudeTraining = ({ currentStudent }) => {
             Back to Topics
           </button>
           <button
-            onClick={() => handleStartTest('medium')}
+            onClick={() => handleStartTest(testDifficulty)}
             className="flex-1 px-6 py-3 bg-purple-600 text-white rounded-lg hover:bg-purple-700 font-medium"
           >
             Retake Test
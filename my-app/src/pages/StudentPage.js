@@ -46,6 +46,7 @@ const StudentPage = () => {
   const [timeRemaining, setTimeRemaining] = useState(0);
   const [timerActive, setTimerActive] = useState(false);
   const [interviewResults, setInterviewResults] = useState(null);
+  const [interviewSessionId, setInterviewSessionId] = useState(null);
   
   // Quiz
   const [quizModalOpen, setQuizModalOpen] = useState(false);
@@ -108,6 +109,7 @@ const StudentPage = () => {
   // Speech recognition and synthesis
   const recognitionRef = useRef(null);
   const timerIntervalRef = useRef(null);
+  const answerPostsRef = useRef([]);
   const synthRef = useRef(window.speechSynthesis);
 
   useEffect(() => {
@@ -274,7 +276,7 @@ const StudentPage = () => {
       // Submit the quiz assignment
       const submissionData = new FormData();
       const quizBlob = new Blob([JSON.stringify({
-        answers: Object.values(quizAnswers),
+        answers: Array.from({ length: totalQuestions }, (_, i) => quizAnswers[i] || null),
         score: evaluationData.score,
         feedback: evaluationData
       })], { type: 'application/json' });
@@ -683,11 +685,14 @@ const StudentPage = () => {
     setCurrentQuestionIndex(0);
     setUserAnswers([]);
     setInterviewResults(null);
+    setInterviewSessionId(null);
+    answerPostsRef.current = [];
     
     try {
       const response = await interviewAPI.startInterview({ user_id: currentStudent.id });
       const questions = response.data.questions || [];
       setInterviewQuestions(questions);
+      setInterviewSessionId(response.data.session_id || null);
       setTimeRemaining(interviewDuration * 60);
       setTimerActive(true);
       
@@ -764,6 +769,15 @@ const StudentPage = () => {
     const newAnswers = [...userAnswers, answer || 'No answer provided'];
     setUserAnswers(newAnswers);
     setCurrentAnswer('');
+
+    // Send the answer now so it is evaluated while the interview goes on; one that
+    // fails to send is included again when the interview is finished
+    if (interviewSessionId && answer) {
+      answerPostsRef.current.push(
+        interviewAPI.submitAnswer(interviewSessionId, currentQuestionIndex, answer)
+          .catch((error) => console.error('Error sending interview answer:', error))
+      );
+    }
     
     if (isRecording) {
       recognitionRef.current.stop();
@@ -831,11 +845,23 @@ const StudentPage = () => {
     }
 
     try {
-      const response = await interviewAPI.submitAnswers({
-        questions: interviewQuestions,
-        answers: answers,
-        studentId: currentStudent.id,
-      });
+      let response;
+      if (interviewSessionId) {
+        // Answers were evaluated as they came in: let the last ones arrive, then
+        // the server adds any that didn't and builds the report
+        await Promise.all(answerPostsRef.current);
+        response = await interviewAPI.submitAnswers({
+          session_id: interviewSessionId,
+          answers: answers.map((answer) => (answer === 'No answer provided' ? '' : answer)),
+          studentId: currentStudent.id,
+        });
+      } else {
+        response = await interviewAPI.submitAnswers({
+          questions: interviewQuestions,
+          answers: answers,
+          studentId: currentStudent.id,
+        });
+      }
       
       setInterviewResults(response.data);
       await loadStudentData();
@@ -869,6 +895,8 @@ const StudentPage = () => {
     setUserAnswers([]);
     setCurrentAnswer('');
     setInterviewResults(null);
+    setInterviewSessionId(null);
+    answerPostsRef.current = [];
   };
 
   const formatTime = (seconds) => {
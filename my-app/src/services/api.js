@@ -74,6 +74,9 @@ export const studentAPI = {
 // Interview API calls
 export const interviewAPI = {
   startInterview: (data = {}) => api.post('/interview/start', data),
+  // Each answer is evaluated on the server as soon as it arrives
+  submitAnswer: (sessionId, index, answer) =>
+    api.post(`/interview/sessions/${sessionId}/answers`, { index, answer }),
   submitAnswers: (answersData) => api.post('/interview/evaluate', answersData),
 };
 